@@ -0,0 +1,102 @@
+import math
+import queue
+import threading
+
+from solver import best_guess, evaluate, partition_sizes
+
+# 开局局面（没有任何猜测）信息量最大的猜测，每个配置只需计算一次
+_opening_best = {}
+_opening_lock = threading.Lock()
+
+
+def expected_bits(guess, candidates, mode):
+    """猜测在当前候选集合上的期望信息量（反馈分布的熵，单位：位）"""
+    if len(candidates) <= 1:
+        return 0.0
+    return -evaluate(partition_sizes(tuple(guess), candidates, mode), len(candidates), 'entropy')
+
+
+def most_informative_guess(candidates, codes, mode, cancel=None):
+    """期望信息量最大的猜测（与评分使用同一个标准，不使用求解器的最坏情况或精确决策树）"""
+    if len(candidates) == len(codes):
+        key = (mode, len(codes), len(codes[0]))
+        with _opening_lock:
+            if key not in _opening_best:
+                guess = best_guess(candidates, codes, mode, 'entropy', cancel=cancel)
+                # 取消时的结果不完整，不缓存
+                if cancel is not None and cancel.is_set():
+                    return guess
+                _opening_best[key] = guess
+            return _opening_best[key]
+    return best_guess(candidates, codes, mode, 'entropy', cancel=cancel)
+
+
+class MoveAnalyzer:
+    """对局分析：记录每步猜测前后的候选数量和获得的信息量，并与信息量最大的猜测比较
+
+    每到达一个新局面就把该局面交给后台线程计算信息量最大的猜测（玩家思考时完成）；
+    玩家提交猜测时只需在当前线程计算一次反馈分布，游戏结束时分析已经就绪。
+    """
+
+    def __init__(self, solver):
+        self.solver = solver
+        self.mode = solver.mode
+        self.moves = []
+        # 局面序号 -> (信息量最大的猜测, 期望信息量)
+        self.best = {}
+        self._queue = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._worker_loop, name='move-analyzer', daemon=True)
+        self._thread.start()
+
+    def analyze_state(self, index, history, candidates):
+        """后台计算第 index 步之前局面信息量最大的猜测"""
+        self._queue.put((index, list(history), candidates))
+
+    def record_move(self, guess, before, after, prefilled=False):
+        """记录一步猜测，before/after 为猜测前后的候选密码"""
+        self.moves.append({
+            'guess': tuple(guess),
+            'before': len(before),
+            'after': len(after),
+            'bits': math.log2(len(before) / len(after)) if after else 0.0,
+            'expected': expected_bits(guess, before, self.mode),
+            'prefilled': prefilled,
+        })
+
+    def _worker_loop(self):
+        while not self._cancel.is_set():
+            job = self._queue.get()
+            if job is None:
+                break
+            index, history, candidates = job
+            if not candidates:
+                continue
+            guess = most_informative_guess(candidates, self.solver.codes, self.mode, self._cancel)
+            if guess is None or self._cancel.is_set():
+                continue
+            self.best[index] = (guess, expected_bits(guess, candidates, self.mode))
+
+    @property
+    def ready(self):
+        """玩家的每一步都已完成与信息量最大的猜测的比较"""
+        return all(i in self.best for i, move in enumerate(self.moves) if not move['prefilled'])
+
+    def summary(self):
+        """汇总玩家猜测和预填猜测的信息量"""
+        player = [(i, m) for i, m in enumerate(self.moves) if not m['prefilled']]
+        prefilled = [m for m in self.moves if m['prefilled']]
+        compared = [(m, self.best[i]) for i, m in player if i in self.best]
+        return {
+            'player_moves': len(player),
+            'player_bits': sum(m['bits'] for _, m in player),
+            'player_expected': sum(m['expected'] for _, m in player) / len(player) if player else 0.0,
+            'best_expected': sum(b[1] for _, b in compared) / len(compared) if compared else 0.0,
+            'optimal_moves': sum(1 for m, b in compared if m['expected'] >= b[1] - 1e-9),
+            'prefilled_moves': len(prefilled),
+            'prefilled_bits': sum(m['bits'] for m in prefilled),
+        }
+
+    def cancel(self):
+        self._cancel.set()
+        self._queue.put(None)
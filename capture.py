@@ -0,0 +1,145 @@
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import pygame
+
+# 录制输出目录（与游戏脚本同目录）
+CAPTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'captures')
+
+# 输出格式：编号的 PNG 序列，或连续的 RGB24 原始帧（可直接交给 ffmpeg）
+PNG = 'png'
+RAW = 'raw'
+FORMATS = (PNG, RAW)
+
+# 等待写入的最大帧数，800×700 的一帧约 1.6 MB
+QUEUE_SIZE = 16
+
+# 写线程停止后，等待队列空位时检查的间隔（秒）
+WRITER_POLL_INTERVAL = 0.1
+
+# PNG 压缩级别：写线程需要跟上 30 帧，压缩率让位于速度
+PNG_COMPRESSION = 1
+
+# pygame 2.1.3 起 tostring 改名为 tobytes
+_tobytes = getattr(pygame.image, 'tobytes', None) or pygame.image.tostring
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def encode_png(data, width, height, level=PNG_COMPRESSION):
+    """把 RGB24 像素编码为 PNG（zlib 压缩时释放 GIL，不阻塞主线程）"""
+    stride = width * 3
+    rows = b''.join(b'\x00' + data[y * stride:(y + 1) * stride] for y in range(height))
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        _png_chunk(b'IDAT', zlib.compress(rows, level)),
+        _png_chunk(b'IEND', b''),
+    ))
+
+
+class FrameRecorder:
+    """把每帧画面交给后台线程写入磁盘
+
+    主线程只把画面复制为字节串并放入有界队列；队列满时丢弃该帧并计数，不会阻塞游戏循环，
+    内存中最多只有 queue_size 帧。写入的帧连续编号，frames.txt 记录每帧的编号和时间（秒），
+    据此可以还原丢帧后的实际时间。block 为 True 时改为等待写入，用于离线导出（不丢帧）。
+    写入失败（磁盘已满、没有权限）时写线程记录错误后退出，之后 capture 返回 False，调用方应结束录制。
+    """
+
+    def __init__(self, output_dir=None, fmt=PNG, queue_size=QUEUE_SIZE, block=False):
+        self.output_dir = output_dir or os.path.join(CAPTURE_DIR, time.strftime('%Y%m%d-%H%M%S'))
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.format = fmt
+        self.block = block
+        self.size = None
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.error = None  # 写线程遇到的错误
+        self.start = time.monotonic()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = threading.Thread(target=self._writer_loop, name='frame-writer', daemon=True)
+        self._writer.start()
+        print(f"开始录制画面: {self.output_dir}")
+
+    @property
+    def failed(self):
+        """写线程已经停止，之后的画面不会再写入"""
+        return self.error is not None or not self._writer.is_alive()
+
+    def _put(self, item):
+        """等待队列空位放入 item，写线程停止（不再取出）时返回 False 而不是一直等待"""
+        while True:
+            try:
+                self._queue.put(item, timeout=WRITER_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                if self.failed:
+                    return False
+
+    def capture(self, surface):
+        """复制当前画面并放入写入队列，写线程已经停止时返回 False"""
+        if self.failed:
+            return False
+        self.size = surface.get_size()
+        frame = (time.monotonic() - self.start, self.size, _tobytes(surface, 'RGB'))
+        self.captured += 1
+        if self.block:
+            return self._put(frame)
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            self.dropped += 1
+        return True
+
+    def _writer_loop(self):
+        files = []
+        try:
+            index_file = open(os.path.join(self.output_dir, 'frames.txt'), 'w', encoding='utf-8')
+            files.append(index_file)
+            raw_file = None
+            if self.format == RAW:
+                raw_file = open(os.path.join(self.output_dir, 'frames.rgb'), 'wb')
+                files.append(raw_file)
+            while True:
+                frame = self._queue.get()
+                if frame is None:
+                    break
+                timestamp, (width, height), data = frame
+                if raw_file:
+                    raw_file.write(data)
+                else:
+                    path = os.path.join(self.output_dir, f'frame_{self.written:06d}.png')
+                    with open(path, 'wb') as f:
+                        f.write(encode_png(data, width, height))
+                index_file.write(f"{self.written} {timestamp:.4f}\n")
+                self.written += 1
+        except OSError as e:
+            self.error = e
+        finally:
+            # 关闭时写出缓冲区也可能失败（磁盘已满）
+            for f in files:
+                try:
+                    f.close()
+                except OSError as e:
+                    self.error = self.error or e
+        if self.error:
+            print(f"写入录制画面失败: {self.error}，停止录制")
+
+    def close(self):
+        """写完队列中剩余的帧后结束录制（写线程已经停止时不再等待）"""
+        if not self.failed:
+            self._put(None)
+        self._writer.join()
+        print(f"录制结束: 写入 {self.written} 帧，丢弃 {self.dropped} 帧，输出目录 {self.output_dir}")
+        if self.format == RAW and self.size and not self.error:
+            width, height = self.size
+            print(f"转换为视频: ffmpeg -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r 30 "
+                  f"-i {os.path.join(self.output_dir, 'frames.rgb')} output.mp4")
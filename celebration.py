@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import random
+import struct
+import zlib
+
+import pygame
+
+# 庆祝效果：live 为实时模拟烟花粒子，baked 为播放预先烘焙的烟花帧（低功耗）
+LIVE = 'live'
+BAKED = 'baked'
+CELEBRATION_MODES = (LIVE, BAKED)
+
+# 烘焙结果的缓存目录（与游戏脚本同目录）
+SPRITE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sprite_cache')
+
+# 修改烟花的模拟或绘制方式后需要增加版本号，旧的缓存会被忽略
+BAKE_VERSION = 1
+
+# 每种颜色烘焙的烟花数量，以及每隔几个模拟步长保存一帧（播放时每帧停留相同的步数）
+BURSTS_PER_COLOR = 2
+FRAME_STEP = 2
+
+# 精灵表的宽度，帧按行依次排列
+SHEET_WIDTH = 2048
+
+# 帧使用 8 位调色板，0 号颜色为透明色；同一帧内粒子的透明度相同，保存为整帧的透明度
+TRANSPARENT = 0
+
+# 缓存文件：魔数、头部长度、JSON 头部（调色板和帧的位置），之后是 zlib 压缩的精灵表像素
+CACHE_MAGIC = b'CCFW'
+CACHE_HEADER = struct.Struct('<4sI')
+
+# pygame 2.1.3 起 tostring/fromstring 改名为 tobytes/frombytes
+_tobytes = getattr(pygame.image, 'tobytes', None) or pygame.image.tostring
+_frombytes = getattr(pygame.image, 'frombytes', None) or pygame.image.fromstring
+
+
+class _RecordingCanvas:
+    """只记录粒子绘制调用的画布，用于烘焙 Firework.draw 的输出"""
+
+    def __init__(self):
+        self.particles = []
+
+    def particle(self, color, alpha, pos, size):
+        self.particles.append((tuple(color), alpha, int(pos[0]), int(pos[1]), size))
+
+
+def _cache_key(color, bursts, particle_range):
+    text = json.dumps([BAKE_VERSION, list(color), bursts, list(particle_range), FRAME_STEP])
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def cache_path(color, bursts=BURSTS_PER_COLOR, particle_range=(25, 40)):
+    return os.path.join(SPRITE_CACHE_DIR, f"firework_{_cache_key(color, bursts, particle_range)}.bin")
+
+
+def bake_sheet(make_firework, color, bursts=BURSTS_PER_COLOR, particle_range=(25, 40)):
+    """模拟 bursts 个某种颜色的烟花，把每一帧的所有粒子合成为一张图，排列到同一张精灵表上
+
+    make_firework(x, y, color, particle_range, rng) 创建烟花（main.Firework）。
+    随机数种子由烘焙参数决定，同样的参数总是得到同样的结果。
+    返回 (精灵表, 调色板, 每个烟花的帧列表)，帧为 [x, y, 宽, 高, 相对爆炸中心的偏移 dx, dy, 透明度]。
+    """
+    rng = random.Random(_cache_key(color, bursts, particle_range))
+    palette = {}
+    recorded = []
+    for _ in range(bursts):
+        # 与实时烟花一样随机调整亮度
+        brightness = rng.uniform(0.9, 1.2)
+        firework = make_firework(0, 0, tuple(min(255, int(c * brightness)) for c in color), particle_range, rng)
+        frames = []
+        while firework.alive:
+            canvas = _RecordingCanvas()
+            firework.draw(canvas)
+            if canvas.particles:
+                frames.append(canvas.particles)
+            for _ in range(FRAME_STEP):
+                firework.update()
+        for particles in frames:
+            for particle in particles:
+                palette.setdefault(particle[0], len(palette) + 1)
+        recorded.append(frames)
+    if len(palette) > 255:
+        raise ValueError(f"烟花颜色太多，无法放入 8 位调色板: {len(palette)}")
+
+    # 按行排列每一帧的包围盒
+    layout = []
+    x = y = row_height = 0
+    for frames in recorded:
+        burst = []
+        for particles in frames:
+            left = min(p[2] for p in particles)
+            top = min(p[3] for p in particles)
+            width = max(p[2] + p[4] for p in particles) - left
+            height = max(p[3] + p[4] for p in particles) - top
+            if x + width > SHEET_WIDTH:
+                x, y, row_height = 0, y + row_height, 0
+            burst.append([x, y, width, height, left, top, max(p[1] for p in particles)])
+            x += width
+            row_height = max(row_height, height)
+        layout.append(burst)
+
+    sheet = pygame.Surface((SHEET_WIDTH, y + row_height), depth=8)
+    sheet.set_palette(_palette_list(palette))
+    sheet.fill(TRANSPARENT)
+    for frames, burst in zip(recorded, layout):
+        for particles, (fx, fy, _, _, left, top, _) in zip(frames, burst):
+            for color, _, px, py, size in particles:
+                # 与 SurfaceCanvas.particle 相同：在 size×size 的范围内画半径 size//2 的圆
+                rect = pygame.Rect(fx + px - left, fy + py - top, size, size)
+                sheet.set_clip(rect)
+                pygame.draw.circle(sheet, palette[color], (rect.x + size//2, rect.y + size//2), size//2)
+    sheet.set_clip(None)
+    return sheet, _palette_list(palette), layout
+
+
+def _palette_list(palette):
+    colors = [(0, 0, 0)] * 256
+    for color, index in palette.items():
+        colors[index] = color
+    return colors
+
+
+def save_sheet(path, sheet, palette, layout):
+    header = json.dumps({'size': sheet.get_size(), 'palette': palette, 'bursts': layout}).encode('utf-8')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, len(header)))
+        f.write(header)
+        f.write(zlib.compress(_tobytes(sheet, 'P')))
+
+
+def load_sheet(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, header_size = CACHE_HEADER.unpack_from(data)
+    if magic != CACHE_MAGIC:
+        raise ValueError("不是烟花精灵表缓存文件")
+    start = CACHE_HEADER.size
+    header = json.loads(data[start:start + header_size].decode('utf-8'))
+    sheet = _frombytes(zlib.decompress(data[start + header_size:]), tuple(header['size']), 'P')
+    palette = [tuple(color) for color in header['palette']]
+    sheet.set_palette(palette)
+    return sheet, palette, header['bursts']
+
+
+def _split_frames(sheet, layout):
+    """把精灵表拆成独立的帧表面：透明色使用 RLE 编码，整帧的透明度固定，之后每次绘制只需一次 blit"""
+    bursts = []
+    for burst in layout:
+        frames = []
+        for x, y, width, height, dx, dy, alpha in burst:
+            frame = sheet.subsurface((x, y, width, height)).copy()
+            frame.set_colorkey(TRANSPARENT, pygame.RLEACCEL)
+            frame.set_alpha(alpha)
+            frames.append((frame, dx, dy))
+        bursts.append(frames)
+    return bursts
+
+
+def load_sprite_sheets(make_firework, colors, particle_range=(25, 40), bursts=BURSTS_PER_COLOR):
+    """返回 {颜色: [每个烟花的帧列表, ...]}，优先读取磁盘缓存，没有缓存时烘焙并写入缓存"""
+    sheets = {}
+    baked = 0
+    for color in colors:
+        path = cache_path(color, bursts, particle_range)
+        try:
+            sheet, _, layout = load_sheet(path)
+        except (OSError, ValueError, KeyError, struct.error, zlib.error, pygame.error):
+            sheet, palette, layout = bake_sheet(make_firework, color, bursts, particle_range)
+            baked += 1
+            try:
+                save_sheet(path, sheet, palette, layout)
+            except OSError as e:
+                print(f"写入烟花精灵表缓存失败: {e}")
+        sheets[tuple(color)] = _split_frames(sheet, layout)
+    if baked:
+        print(f"已烘焙 {baked} 种颜色的烟花精灵表，缓存在 {SPRITE_CACHE_DIR}")
+    return sheets
+
+
+class BakedBurst:
+    """播放预先烘焙的烟花，接口与 Firework 相同，每帧只需一次 blit"""
+
+    particles = ()  # 没有需要逐个模拟的粒子
+
+    def __init__(self, frames, x, y):
+        self.frames = frames
+        self.x = x
+        self.y = y
+        self.step = 0
+        self.alive = True
+
+    def update(self):
+        self.step += 1
+        self.alive = self.step // FRAME_STEP < len(self.frames)
+
+    def draw(self, screen, sprite='alpha', alpha=1.0):
+        frame, dx, dy = self.frames[min(self.step // FRAME_STEP, len(self.frames) - 1)]
+        screen.blit(frame, (self.x + dx, self.y + dy))
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='预先烘焙低功耗庆祝效果使用的烟花精灵表')
+    parser.add_argument('--rebake', action='store_true', help='忽略已有的缓存，重新烘焙')
+    args = parser.parse_args()
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    from main import COLORS, DEFAULT_QUALITY_LEVEL, QUALITY_LEVELS, Firework
+
+    particle_range = QUALITY_LEVELS[DEFAULT_QUALITY_LEVEL]['particles']
+    if args.rebake:
+        for color in COLORS:
+            path = cache_path(color, BURSTS_PER_COLOR, particle_range)
+            if os.path.exists(path):
+                os.remove(path)
+    start = time.perf_counter()
+    sheets = load_sprite_sheets(Firework, COLORS, particle_range)
+    elapsed = time.perf_counter() - start
+
+    frames = [frame for bursts in sheets.values() for burst in bursts for frame, _, _ in burst]
+    pixels = sum(frame.get_width() * frame.get_height() for frame in frames)
+    disk = sum(os.path.getsize(cache_path(color, BURSTS_PER_COLOR, particle_range)) for color in COLORS)
+    print(f"{len(sheets)} 种颜色，每种 {BURSTS_PER_COLOR} 个烟花，共 {len(frames)} 帧")
+    print(f"帧像素 {pixels / 1024 / 1024:.1f} MiB（8 位），磁盘缓存 {disk / 1024:.0f} KiB，用时 {elapsed * 1000:.0f} ms")
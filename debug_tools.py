@@ -0,0 +1,133 @@
+import cProfile
+import gc
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+# 调试输出目录（与游戏脚本同目录）
+DEBUG_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'debug_output')
+
+# 快照对比时输出的条目数
+TOP_STATS = 30
+
+# 快照时统计存活数量的对象（实时烟花和低功耗模式的预烘焙烟花）
+COUNTED_TYPES = ('Firework', 'BakedBurst')
+
+
+def find_surfaces():
+    """找出所有被引用的 pygame.Surface
+
+    Surface 不受 GC 跟踪，gc.get_objects() 中没有它，只能从引用它的对象中找；
+    只含不可跟踪内容的字典、元组（例如 文字 -> Surface 的缓存）也不受跟踪，需要继续向下查找。
+    """
+    surfaces = {}
+    seen = set()
+    pending = gc.get_objects()
+    while pending:
+        for ref in gc.get_referents(pending.pop()):
+            if type(ref).__name__ == 'Surface':
+                surfaces[id(ref)] = ref
+            elif (isinstance(ref, (dict, list, tuple, set, frozenset)) and not gc.is_tracked(ref)
+                  and id(ref) not in seen):
+                seen.add(id(ref))
+                pending.append(ref)
+    return list(surfaces.values())
+
+
+def debug_enabled():
+    """是否开启调试热键，通过环境变量 COLORCORTEX_DEBUG=1 开启"""
+    return os.environ.get('COLORCORTEX_DEBUG', '') not in ('', '0')
+
+
+class DebugTools:
+    """长时间运行时排查性能和内存问题的调试工具
+
+    只在开启调试时创建；cProfile 和 tracemalloc 都在第一次按下热键时才启动，
+    关闭状态下没有任何开销。
+    """
+
+    def __init__(self, output_dir=DEBUG_OUTPUT_DIR):
+        self.output_dir = output_dir
+        self.profiler = None
+        self.snapshot = None
+        self.snapshot_index = 0
+
+    def _output_path(self, prefix, suffix):
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}{suffix}")
+
+    def toggle_profiler(self):
+        """开始或结束一次 CPU 采样，结束时把按累计耗时排序的结果写入文件"""
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            print("开始CPU采样")
+            return
+
+        self.profiler.disable()
+        path = self._output_path('profile', '.txt')
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(60)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(30)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(stream.getvalue())
+        # 同时保存原始数据，便于用 snakeviz 等工具查看
+        self.profiler.dump_stats(path[:-4] + '.prof')
+        self.profiler = None
+        print(f"CPU采样结果已写入 {path}")
+
+    def take_snapshot(self, counters=None):
+        """拍摄内存快照并与上一次对比，counters 为需要一并记录的计数（例如缓存大小）"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            print("已开始跟踪内存分配，再次按下热键拍摄快照")
+
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        self.snapshot_index += 1
+
+        lines = [f"快照 #{self.snapshot_index}  已跟踪内存 {tracemalloc.get_traced_memory()[0] / 1024:.1f} KiB"]
+
+        # 统计可能泄漏的对象数量
+        type_counts = dict.fromkeys(COUNTED_TYPES, 0)
+        for obj in gc.get_objects():
+            name = type(obj).__name__
+            if name in type_counts:
+                type_counts[name] += 1
+        for name, count in type_counts.items():
+            lines.append(f"存活的 {name} 对象: {count}")
+        # 子表面与父表面共用像素，这里的像素内存只是估计值
+        surfaces = find_surfaces()
+        pixels = sum(surface.get_width() * surface.get_height() * surface.get_bytesize() for surface in surfaces)
+        lines.append(f"存活的 Surface 对象: {len(surfaces)}（像素约 {pixels / 1024 / 1024:.1f} MiB）")
+        for name, value in (counters or {}).items():
+            lines.append(f"{name}: {value}")
+
+        if self.snapshot is None:
+            lines.append("（第一次快照，作为对比基准）")
+            for stat in snapshot.statistics('lineno')[:TOP_STATS]:
+                lines.append(str(stat))
+        else:
+            lines.append("与上一次快照相比增长最多的位置:")
+            for stat in snapshot.compare_to(self.snapshot, 'lineno')[:TOP_STATS]:
+                lines.append(str(stat))
+        self.snapshot = snapshot
+
+        path = self._output_path(f'memory-{self.snapshot_index}', '.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        print('\n'.join(lines[:12]))
+        print(f"内存快照对比已写入 {path}")
+
+    def close(self):
+        """退出时写出未结束的采样并停止内存跟踪"""
+        if self.profiler is not None:
+            self.toggle_profiler()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
@@ -0,0 +1,584 @@
+import argparse
+import random
+import sqlite3
+import threading
+import time
+
+from opening_book import OpeningBook
+from optimal import load_optimal_strategy
+from puzzle import generate_puzzle, PREFILL_GUESSES, RANDOM_PUZZLE_LIMIT
+from solver import ColorDomains, Solver, feedback_mode, score_many, winning_outcome, COUNTS
+from stats import StatsStore, STATS_DB_PATH
+
+# 游戏规则常量
+CODE_LENGTH = 4
+MAX_GUESSES = 7  # 将最大猜测次数从10改为7
+MIN_GUESSES = PREFILL_GUESSES + 1  # 困难模式预填猜测之后至少还能猜一次
+DIFFICULTIES = ['easy', 'medium', 'hard']
+DIFFICULTY_NAMES = {'easy': "简单", 'medium': "中等", 'hard': "困难"}
+COLOR_OPTIONS = [4, 5, 6, 7]
+COLOR_NAMES = ["红", "绿", "蓝", "黄", "紫", "青", "橙"]
+MAX_BOARDS = 8
+BOARD_OPTIONS = [1, 2, 4, 8]  # 菜单中可选的棋盘数量，每多一个棋盘多给一次猜测机会
+
+# 反馈颜色（RGB，图形界面直接用于绘制，其他界面只用来区分反馈种类）
+GREEN = (80, 180, 80)      # 颜色和位置都正确 - 使用与绿色相同的颜色
+WHITE = (240, 240, 240)    # 颜色正确但位置错误 - 稍微柔和的白色
+GRAY = (60, 60, 60)        # 颜色错误 - 稍微亮一点的灰色
+
+# 后台预先准备的局数（当前配置下接下来的几局）
+PREFETCH_GAMES = 2
+
+
+# 多棋盘模式中的一个棋盘 - 所有棋盘共用同一串猜测，各自保存密码和反馈
+class Board:
+    def __init__(self, secret_code, domains):
+        self.secret_code = secret_code
+        self.domains = domains
+        self.outcomes = []  # 每次猜测的反馈编码，猜中后不再增加
+        self.solved_at = None  # 第几次猜测猜中
+        self.surface = None  # 界面缓存的画面，棋盘有变化时置为 None，下一帧重新渲染
+
+    @property
+    def solved(self):
+        return self.solved_at is not None
+
+
+def guess_count(text):
+    """命令行 --max-guesses 的参数类型：困难模式会预填猜测，次数太少时无法进行游戏"""
+    value = int(text)
+    if value < MIN_GUESSES:
+        raise argparse.ArgumentTypeError(f"每局最多猜测次数至少为 {MIN_GUESSES}（困难模式预填 {PREFILL_GUESSES} 次猜测）")
+    return value
+
+
+def check_feedback(guess, secret_code, difficulty):
+    """检查猜测结果，返回反馈列表"""
+    code_length = len(secret_code)
+    # 在简单模式下，反馈需要与位置对应
+    if difficulty == 'easy':
+        feedback = [GRAY] * code_length
+
+        # 创建临时列表以跟踪已匹配的位置
+        secret_copy = list(secret_code)
+        guess_copy = list(guess)
+
+        # 首先检查位置和颜色都正确的
+        for i in range(code_length):
+            if guess[i] == secret_code[i]:
+                feedback[i] = GREEN
+                secret_copy[i] = guess_copy[i] = -1
+
+        # 然后检查颜色正确但位置错误的
+        for i in range(code_length):
+            if guess_copy[i] != -1:
+                for j in range(code_length):
+                    if secret_copy[j] == guess_copy[i] and secret_copy[j] != -1:
+                        feedback[i] = WHITE
+                        secret_copy[j] = -1
+                        break
+
+        return feedback
+    else:  # 中等模式（原困难模式）
+        feedback = []
+        # 创建临时列表以跟踪已匹配的位置
+        secret_copy = list(secret_code)
+        guess_copy = list(guess)
+
+        # 首先检查位置和颜色都正确的
+        for i in range(code_length):
+            if guess[i] == secret_code[i]:
+                feedback.append(GREEN)
+                secret_copy[i] = guess_copy[i] = -1
+
+        # 然后检查颜色正确但位置错误的
+        for i in range(code_length):
+            if guess_copy[i] != -1:
+                for j in range(code_length):
+                    if secret_copy[j] == guess_copy[i] and secret_copy[j] != -1:
+                        feedback.append(WHITE)
+                        secret_copy[j] = -1
+                        break
+
+        # 添加灰色反馈，确保总数为4个
+        while len(feedback) < code_length:
+            feedback.append(GRAY)
+
+        return feedback
+
+
+def encode_feedback(feedback, difficulty, code_length):
+    """把反馈颜色列表转换为求解器使用的反馈编码"""
+    if feedback_mode(difficulty) == COUNTS:
+        black = feedback.count(GREEN)
+        return black * (code_length + 1) + feedback.count(WHITE)
+    outcome = 0
+    for color in reversed(feedback):
+        outcome = outcome * 3 + (2 if color == GREEN else 1 if color == WHITE else 0)
+    return outcome
+
+
+def score_boards(boards, guess, mode, code_length):
+    """一次批量计算猜测对所有未猜中棋盘的反馈，返回这次有变化的棋盘"""
+    unsolved = [board for board in boards if not board.solved]
+    outcomes = score_many(tuple(guess), [tuple(board.secret_code) for board in unsolved], mode)
+    win = winning_outcome(code_length, mode)
+    for board, outcome in zip(unsolved, outcomes):
+        board.outcomes.append(outcome)
+        board.domains.apply(guess, outcome)
+        if outcome == win:
+            board.solved_at = len(board.outcomes)
+    return unsolved
+
+
+# 开局前准备好的一局：密码、困难模式预填的猜测和反馈、候选集合（多棋盘模式为各棋盘）
+class PreparedGame:
+    def __init__(self, key, puzzle_id, secret_code):
+        self.key = key  # (难度, 颜色数量, 棋盘数量)
+        self.puzzle_id = puzzle_id
+        self.secret_code = secret_code
+        self.guesses = []
+        self.feedbacks = []
+        self.boards = []
+        self.color_domains = None
+        self.moves = []  # 单棋盘模式每个预填猜测的 (猜测, 之前的候选, 之后的候选)
+
+
+class GamePrefetcher:
+    """后台线程按预测的谜题编号提前准备接下来几局，开始新的一局时直接取用
+
+    只保留当前配置的结果，配置改变后丢弃旧的结果；prepare(谜题编号, 难度, 颜色数量, 棋盘数量)
+    只依赖参数，所以预先准备的一局与当场生成的完全相同。
+    """
+
+    def __init__(self, prepare):
+        self.prepare = prepare
+        self._cond = threading.Condition()
+        self._key = None
+        self._wanted = []  # 还需要准备的谜题编号
+        self._ready = []  # 已准备好的 PreparedGame
+        self._preparing = None  # 正在准备的 (配置, 谜题编号)
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self._thread = threading.Thread(target=self._run, name='game-prefetch', daemon=True)
+        self._thread.start()
+
+    def request(self, key, puzzle_ids):
+        """把要准备的局换成当前配置 key 下的 puzzle_ids（可以重复），不再需要的结果直接丢弃"""
+        with self._cond:
+            wanted = list(puzzle_ids)
+            ready = []
+            for game in self._ready:
+                if game.key == key and game.puzzle_id in wanted:
+                    wanted.remove(game.puzzle_id)
+                    ready.append(game)
+            if self._preparing is not None and self._preparing[0] == key and self._preparing[1] in wanted:
+                wanted.remove(self._preparing[1])
+            self._key = key
+            self._ready = ready
+            self._wanted = wanted
+            self._cond.notify_all()
+
+    def take(self, key, puzzle_id):
+        """取出准备好的一局，正在准备时等它完成（比重新生成快），没有准备则返回 None"""
+        with self._cond:
+            while self._preparing == (key, puzzle_id):
+                self._cond.wait()
+            for index, game in enumerate(self._ready):
+                if game.key == key and game.puzzle_id == puzzle_id:
+                    self.hits += 1
+                    return self._ready.pop(index)
+            self.misses += 1
+            return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._wanted:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                key = self._key
+                puzzle_id = self._wanted.pop(0)
+                self._preparing = (key, puzzle_id)
+            try:
+                game = self.prepare(puzzle_id, *key)
+            except Exception as e:
+                # 准备失败时开局会当场重新生成，这里只记录原因
+                print(f"后台准备下一局失败: {e}")
+                game = None
+            with self._cond:
+                self._preparing = None
+                if game is not None and key == self._key:
+                    self._ready.append(game)
+                self._cond.notify_all()
+
+    def close(self):
+        """停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+class GameEngine:
+    """与界面无关的游戏规则和状态，图形界面（main.py）和终端界面（terminal.py）共用
+
+    不导入 pygame。子类通过 _on_reset / _on_move / _on_start / _on_guess 在相应时机
+    加入界面相关的处理（动画、后台分析等），用 log 输出提示信息。
+    """
+
+    def __init__(self, stats_path=STATS_DB_PATH, max_guesses=MAX_GUESSES, puzzle_id=None):
+        # 每局最多猜测次数（超过历史面板的行数时可以滚动查看）
+        self.max_guesses = max_guesses
+        # 固定的谜题编号（每日谜题），None 表示每局随机
+        self.fixed_puzzle_id = puzzle_id
+        # 随机对局的谜题编号使用独立的随机数流，种子取自全局 random（录制输入时固定了种子，回放可以复现）；
+        # 只在游戏线程中使用，其他代码使用全局 random 不会影响编号序列
+        self.puzzle_rng = random.Random(random.getrandbits(64))
+        # 同时破解的棋盘数量，1 为普通模式
+        self.num_boards = 1
+        # 已经开始的局数，旁观广播据此区分新的一局
+        self.game_serial = 0
+        # 旁观服务（spectate.SpectatorServer），None 表示没有开启
+        self.broadcaster = None
+
+        # 打开本地战绩数据库，失败时不影响游戏
+        try:
+            self.stats_store = StatsStore(stats_path)
+        except sqlite3.Error as e:
+            self.log(f"打开战绩数据库失败: {e}")
+            self.stats_store = None
+
+        # 求解器按（反馈模式, 颜色数量, 密码长度）缓存，前几步直接查开局库
+        self.opening_book = OpeningBook.load()
+        self.optimal_strategy = load_optimal_strategy()
+        self.solvers = {}
+        self._solver_lock = threading.Lock()
+
+        # 后台预先准备下一局，点击“再来一局”时不用当场生成谜题和候选集合
+        self.prefetcher = GamePrefetcher(self.prepare_game)
+
+        # 初始化游戏
+        self.reset_game('easy', 4)
+
+    def log(self, message):
+        """输出提示信息"""
+        print(message)
+
+    def now(self):
+        """对局计时使用的时钟（秒），图形界面改用模拟时钟"""
+        return time.monotonic()
+
+    def broadcast_state(self):
+        """把状态变化发给旁观者，界面处理完输入后也应调用（光标移动、选择颜色）"""
+        if self.broadcaster:
+            try:
+                self.broadcaster.sync(self)
+            except Exception as e:
+                # 旁观只是附加功能，编码或发送出错时停止广播，不影响游戏本身
+                self.log(f"旁观广播出错，已停止旁观服务: {e}")
+                broadcaster, self.broadcaster = self.broadcaster, None
+                broadcaster.close()
+
+    def debug(self, message):
+        """输出调试信息（会暴露密码，界面上不应显示）"""
+        self.log(message)
+
+    def _on_reset(self):
+        """新的一局开始前调用，子类在这里停止上一局的动画和后台任务"""
+
+    def _on_move(self, guess, before, after, prefilled=False):
+        """单棋盘模式每加入一次猜测调用，before/after 为猜测前后的候选密码"""
+
+    def _on_start(self):
+        """新的一局准备完毕后调用"""
+
+    def _on_guess(self):
+        """玩家提交的猜测处理完毕后调用（已判定胜负）"""
+
+    def reset_game(self, difficulty='easy', num_colors=4):
+        """初始化游戏状态（优先使用后台预先准备好的一局）"""
+        self.difficulty = difficulty
+        self.num_colors = num_colors
+        self.code_length = CODE_LENGTH
+        self.game_serial += 1
+
+        # 谜题由编号和配置决定：指定了编号（--puzzle/--daily）时每局都是同一题，否则随机选一个编号
+        if self.fixed_puzzle_id is not None:
+            self.puzzle_id = self.fixed_puzzle_id
+        else:
+            self.puzzle_id = self.puzzle_rng.randrange(1, RANDOM_PUZZLE_LIMIT)
+        key = (difficulty, num_colors, self.num_boards)
+        prepared = self.prefetcher.take(key, self.puzzle_id) if self.prefetcher else None
+        if prepared is None:
+            prepared = self.prepare_game(self.puzzle_id, *key)
+        self.secret_code = prepared.secret_code
+
+        # 重置游戏状态
+        self.guesses = []
+        self.feedbacks = []
+        self.current_guess = [-1] * self.code_length
+        self.current_position = 0
+        self.game_over = False
+        self.win = False
+        self.boards = []
+        self.guess_limit = self.max_guesses + self.num_boards - 1
+        self._on_reset()
+
+        # 困难模式下，添加谜题自带的随机猜测
+        if difficulty == 'hard':
+            self.guesses = prepared.guesses
+            self.feedbacks = prepared.feedbacks
+            self.log(f"困难模式：已添加 {len(self.guesses)} 次随机猜测")
+        # 记录预填的猜测数量，统计时区分玩家自己的猜测
+        self.prefilled_count = len(self.guesses)
+
+        # 候选集合已经应用了预填的猜测，这里只补发每一步的回调
+        self.boards = prepared.boards
+        self.color_domains = prepared.color_domains
+        for guess, before, after in prepared.moves:
+            self._on_move(guess, before, after, prefilled=True)
+
+        # 记录开局时间，AI对战时用于比较谁先猜中
+        self.start_time = self.now()
+        self.finish_time = None
+        self._on_start()
+        self.broadcast_state()
+
+        # 调试信息
+        self.debug(f"谜题 #{self.puzzle_id}，生成的密码: {[COLOR_NAMES[i] for i in self.secret_code]}")
+
+        # 预测接下来的谜题编号，在后台准备好
+        if self.prefetcher:
+            self.prefetcher.request(key, self.upcoming_puzzle_ids(PREFETCH_GAMES))
+
+    def upcoming_puzzle_ids(self, count):
+        """接下来 count 局的谜题编号：在谜题随机数流的副本上抽取，不改变它的状态
+
+        编号只由 puzzle_rng 决定，预测是准确的；重新设置种子（例如回放重新开始）后
+        已准备的结果不再匹配，只是当场生成，结果不变。
+        """
+        if self.fixed_puzzle_id is not None:
+            return [self.fixed_puzzle_id] * count
+        rng = random.Random()
+        rng.setstate(self.puzzle_rng.getstate())
+        return [rng.randrange(1, RANDOM_PUZZLE_LIMIT) for _ in range(count)]
+
+    def prepare_game(self, puzzle_id, difficulty, num_colors, num_boards):
+        """生成一局的谜题并应用预填的猜测，只依赖参数，可以在后台线程中调用"""
+        mode = feedback_mode(difficulty)
+        secret, prefilled = generate_puzzle(puzzle_id, difficulty, num_colors, CODE_LENGTH)
+        game = PreparedGame((difficulty, num_colors, num_boards), puzzle_id, secret)
+        if difficulty == 'hard':
+            for guess in prefilled:
+                game.guesses.append(guess)
+                game.feedbacks.append(check_feedback(guess, secret, difficulty))
+
+        codes = self.solver_for(mode, num_colors).codes
+        if num_boards > 1:
+            # 多棋盘模式：棋盘 0 使用上面生成的密码，其余棋盘的密码由棋盘序号决定
+            for index in range(num_boards):
+                board_secret = secret if index == 0 else generate_puzzle(
+                    puzzle_id, difficulty, num_colors, CODE_LENGTH, index)[0]
+                game.boards.append(Board(board_secret, ColorDomains(codes, num_colors, CODE_LENGTH, mode)))
+            for guess in game.guesses:
+                score_boards(game.boards, guess, mode, CODE_LENGTH)
+        else:
+            # 每个位置仍然可能的颜色，之后每次提交猜测时增量收窄
+            game.color_domains = ColorDomains(codes, num_colors, CODE_LENGTH, mode)
+            for guess, feedback in zip(game.guesses, game.feedbacks):
+                before = game.color_domains.candidates
+                game.color_domains.apply(tuple(guess), encode_feedback(feedback, difficulty, CODE_LENGTH))
+                game.moves.append((tuple(guess), before, game.color_domains.candidates))
+        return game
+
+    def _is_playing(self):
+        """是否还可以继续猜测（显示当前猜测行）"""
+        return not self.game_over and len(self.guesses) < self.guess_limit
+
+    def _score_boards(self, guess):
+        """一次批量计算猜测对所有未猜中棋盘的反馈，并标记需要重新渲染的棋盘"""
+        for board in score_boards(self.boards, guess, feedback_mode(self.difficulty), self.code_length):
+            board.surface = None
+
+    def _handle_color_selection(self, color_idx):
+        """处理颜色选择"""
+        if color_idx < self.num_colors:
+            # 检查其他位置是否有相同颜色，如果有则清空
+            for i in range(self.code_length):
+                if i != self.current_position and self.current_guess[i] == color_idx:
+                    self.current_guess[i] = -1  # 清空其他位置的相同颜色
+            # 设置当前位置的颜色
+            self.current_guess[self.current_position] = color_idx
+
+    def _cycle_colors(self, position, reverse=False):
+        """循环选择颜色"""
+        # 获取当前已使用的颜色（排除当前位置的颜色）
+        used_colors = []
+        for j, color in enumerate(self.current_guess):
+            if j != position and color != -1:
+                used_colors.append(color)
+
+        # 获取所有可用颜色（包括空白色）
+        available_colors = [-1]  # 首先添加空白色
+        for color_idx in range(self.num_colors):
+            if color_idx not in used_colors:
+                available_colors.append(color_idx)
+
+        # 跳过根据已有反馈不可能出现在这个位置的颜色（全部不可能时不跳过）
+        domain = self._position_domain(position)
+        possible_colors = [c for c in available_colors if c == -1 or domain >> c & 1]
+        if len(possible_colors) > 1:
+            available_colors = possible_colors
+
+        # 找到当前颜色在可用颜色列表中的位置
+        current_color = self.current_guess[position]
+        try:
+            current_index = available_colors.index(current_color)
+        except ValueError:
+            current_index = -1
+
+        # 根据方向选择颜色滚动方向
+        if reverse:  # 向前滚动
+            next_index = (current_index - 1) % len(available_colors)
+        else:  # 向后滚动
+            next_index = (current_index + 1) % len(available_colors)
+
+        self.current_guess[position] = available_colors[next_index]
+
+    def get_solver(self):
+        """返回当前配置的求解器"""
+        return self.solver_for(feedback_mode(self.difficulty), self.num_colors)
+
+    def solver_for(self, mode, num_colors):
+        """按反馈模式和颜色数量返回求解器（后台准备下一局时也会调用，创建时加锁）"""
+        key = (mode, num_colors, CODE_LENGTH)
+        with self._solver_lock:
+            if key not in self.solvers:
+                # 游戏内的搜索规模很小，不启动进程池
+                self.solvers[key] = Solver(num_colors, CODE_LENGTH, mode,
+                                           workers=0, book=self.opening_book, exact_book=self.optimal_strategy)
+            return self.solvers[key]
+
+    def feedback_outcome(self, feedback):
+        """把反馈颜色列表转换为求解器使用的反馈编码"""
+        return encode_feedback(feedback, self.difficulty, self.code_length)
+
+    def outcome_feedback(self, outcome):
+        """把反馈编码转换回反馈颜色列表"""
+        if feedback_mode(self.difficulty) == COUNTS:
+            black, white = divmod(outcome, self.code_length + 1)
+            return [GREEN] * black + [WHITE] * white + [GRAY] * (self.code_length - black - white)
+        feedback = []
+        for _ in range(self.code_length):
+            outcome, digit = divmod(outcome, 3)
+            feedback.append(GREEN if digit == 2 else WHITE if digit == 1 else GRAY)
+        return feedback
+
+    def solver_history(self):
+        """把已有的猜测和反馈转换为求解器的历史记录"""
+        return [(tuple(guess), self.feedback_outcome(feedback))
+                for guess, feedback in zip(self.guesses, self.feedbacks)]
+
+    def _position_domain(self, position):
+        """当前输入下某个位置仍然可能的颜色位掩码（多棋盘模式取所有未猜中棋盘的并集）"""
+        if self.boards:
+            domain = 0
+            for board in self.boards:
+                if not board.solved:
+                    domain |= board.domains.allowed(self.current_guess)[position]
+            return domain
+        return self.color_domains.allowed(self.current_guess)[position]
+
+    def apply_hint(self):
+        """用求解器给出的猜测填充当前猜测"""
+        if self.boards:
+            # 多棋盘模式：针对剩余候选最少的未猜中棋盘给出提示
+            board = min((board for board in self.boards if not board.solved),
+                        key=lambda board: len(board.domains.candidates))
+            history = [(tuple(guess), outcome) for guess, outcome in zip(self.guesses, board.outcomes)]
+            guess = self.get_solver().next_guess(history, board.domains.candidates)
+        else:
+            guess = self.get_solver().next_guess(self.solver_history(), self.color_domains.candidates)
+        if guess is not None:
+            self.current_guess = list(guess)
+            self.current_position = 0
+            self.log(f"提示: {[COLOR_NAMES[i] for i in guess]}")
+
+    def process_guess(self):
+        """处理猜测结果的通用逻辑"""
+        if self.boards:
+            self._process_board_guess()
+            return
+
+        feedback = self.check_guess(self.current_guess)
+        self.guesses.append(self.current_guess.copy())
+        self.feedbacks.append(feedback)
+        before = self.color_domains.candidates
+        self.color_domains.apply(self.current_guess, self.feedback_outcome(feedback))
+        self._on_move(self.current_guess, before, self.color_domains.candidates)
+
+        # 检查胜利条件
+        if feedback.count(GREEN) == self.code_length:
+            self.win = True
+            self.game_over = True
+        elif len(self.guesses) >= self.guess_limit:
+            self.game_over = True
+
+        if self.game_over:
+            self.finish_time = self.now() - self.start_time
+        self._on_guess()
+
+        # 游戏结束时交给后台线程写入战绩，不阻塞当前帧
+        if self.game_over and self.stats_store:
+            self.stats_store.record_game(self.stats_difficulty(), self.num_colors, self.code_length,
+                                         self.win, len(self.guesses), self.prefilled_count)
+
+        # 重置当前猜测
+        self.current_guess = [-1] * self.code_length
+
+        # 在简单模式下，如果某个位置猜对了，自动填入该颜色
+        if self.difficulty == 'easy' and not self.game_over:
+            for i, color in enumerate(feedback):
+                if color == GREEN:  # 如果这个位置是绿色（完全正确）
+                    self.current_guess[i] = self.guesses[-1][i]  # 使用上一次猜测的颜色
+
+        self.current_position = 0
+        self.broadcast_state()
+
+    def _process_board_guess(self):
+        """多棋盘模式提交猜测：所有棋盘都猜中时胜利"""
+        self.guesses.append(self.current_guess.copy())
+        self._score_boards(self.current_guess)
+
+        if all(board.solved for board in self.boards):
+            self.win = True
+            self.game_over = True
+        elif len(self.guesses) >= self.guess_limit:
+            self.game_over = True
+            # 未猜中的棋盘需要重新渲染以显示密码
+            for board in self.boards:
+                board.surface = None
+
+        if self.game_over:
+            self.finish_time = self.now() - self.start_time
+            if self.stats_store:
+                self.stats_store.record_game(self.stats_difficulty(), self.num_colors, self.code_length,
+                                             self.win, len(self.guesses), self.prefilled_count)
+        self._on_guess()
+
+        self.current_guess = [-1] * self.code_length
+        self.current_position = 0
+        self.broadcast_state()
+
+    def stats_difficulty(self):
+        """战绩按难度分类保存，多棋盘模式单独统计（如 easy-x4）"""
+        if self.num_boards > 1:
+            return f"{self.difficulty}-x{self.num_boards}"
+        return self.difficulty
+
+    def check_guess(self, guess):
+        """检查猜测结果，返回反馈列表"""
+        return check_feedback(guess, self.secret_code, self.difficulty)
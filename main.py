@@ -3,8 +3,22 @@ import random
 import sys
 import ctypes
 import math
+import sqlite3
+from collections import OrderedDict
+import threading
+import time
 from pygame.locals import *
 
+from analysis import MoveAnalyzer
+from capture import FrameRecorder, PNG, FORMATS
+from celebration import BakedBurst, load_sprite_sheets, BAKED, CELEBRATION_MODES, LIVE
+from debug_tools import DebugTools, debug_enabled
+from engine import GameEngine, BOARD_OPTIONS, GRAY, GREEN, MAX_BOARDS, MAX_GUESSES, WHITE, guess_count
+from puzzle import daily_puzzle_id
+from renderer import SurfaceCanvas, create_renderer, BACKENDS, SOFTWARE
+from solver import filter_candidates, score, winning_outcome
+from stats import STATS_DB_PATH
+
 # 初始化pygame
 pygame.init()
 
@@ -13,7 +27,6 @@ SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 700
 BLOCK_SIZE = 40  # 减小色块大小
 MARGIN = 10
-MAX_GUESSES = 7  # 将最大猜测次数从10改为7
 COLORS = [
     (220, 60, 60),    # 红色 - 更柔和的红色
     (80, 180, 80),    # 绿色 - 更自然的绿色
@@ -23,12 +36,6 @@ COLORS = [
     (60, 190, 200),   # 青色 - 更自然的青色
     (240, 130, 40)    # 橙色 - 更自然的橙色
 ]
-COLOR_NAMES = ["红", "绿", "蓝", "黄", "紫", "青", "橙"]
-
-# 反馈颜色
-GREEN = (80, 180, 80)      # 颜色和位置都正确 - 使用与绿色相同的颜色
-WHITE = (240, 240, 240)    # 颜色正确但位置错误 - 稍微柔和的白色
-GRAY = (60, 60, 60)        # 颜色错误 - 稍微亮一点的灰色
 
 # 界面颜色
 BG_COLOR = (40, 44, 52)    # 更现代的深色背景
@@ -37,53 +44,130 @@ BUTTON_COLOR = (75, 111, 166)  # 更鲜艳的蓝色
 BUTTON_HOVER_COLOR = (95, 131, 196)
 BUTTON_TEXT_COLOR = (240, 240, 240)  # 稍微柔和的白色文字
 
+# 动态文本缓存的最大条目数
+TEXT_CACHE_SIZE = 256
+
+# 历史猜测面板：从 HISTORY_TOP 开始最多显示 HISTORY_ROWS 行，超出时滚动显示
+HISTORY_TOP = 100
+ROW_HEIGHT = BLOCK_SIZE + 20
+HISTORY_ROWS = 7
+HISTORY_CACHE_SIZE = 64  # 缓存的历史行表面数量（按最近使用淘汰）
+
+# 每帧的时间预算（毫秒），对应30帧
+FRAME_BUDGET_MS = 33
+
+# 固定步长模拟：动画参数按每秒30次更新调校，动画速度与渲染帧率无关
+SIM_STEP = 1 / 30
+MAX_SIM_STEPS = 5  # 每帧最多补算的步数，避免卡顿后越追越慢
+RENDER_FPS = 30  # 正常渲染帧率
+LOAD_FPS = 20  # 帧耗时超出预算时的渲染帧率
+IDLE_FPS = 10  # 空闲时的渲染帧率
+IDLE_TIMEOUT = 5.0  # 多少秒没有输入且没有动画时视为空闲
+
+# 烟花粒子质量等级，从低到高：粒子数量范围、生成间隔、最大烟花数量、粒子绘制方式
+QUALITY_LEVELS = [
+    {'name': '最低', 'particles': (8, 14), 'spawn_interval': 600, 'max_fireworks': 5, 'sprite': 'rect'},
+    {'name': '低', 'particles': (15, 25), 'spawn_interval': 400, 'max_fireworks': 10, 'sprite': 'circle'},
+    {'name': '中', 'particles': (25, 40), 'spawn_interval': 250, 'max_fireworks': 15, 'sprite': 'alpha'},
+    {'name': '高', 'particles': (40, 60), 'spawn_interval': 180, 'max_fireworks': 20, 'sprite': 'alpha'},
+]
+DEFAULT_QUALITY_LEVEL = 2
+
+# 多棋盘模式的棋盘布局
+BOARD_COLUMNS = 4
+BOARDS_TOP = 80
+BOARDS_AREA = (640, 420)  # 棋盘区域的宽和高
+BOARD_GAP = 8
+BOARD_HEADER = 22
+MIN_BOARD_ROW = 10  # 行高小于该值时只显示最近的猜测
+BOARD_BG_COLOR = (48, 53, 62)
+MULTI_GUESS_Y = 520  # 多棋盘模式下当前猜测行的位置
+
+# 对局分析显示在历史猜测右侧的位置（AI对战时显示在AI面板右侧）
+ANALYSIS_X = 300
+RACE_ANALYSIS_X = 570
+
+# AI对战模式下AI每步之间的间隔（秒）
+AI_MOVE_DELAY = 3.0
+
+# 固定步长模拟时钟 - 按真实经过的时间推进若干个固定步长，余下的部分用于渲染插值
+class SimulationClock:
+    def __init__(self, step=SIM_STEP, max_steps=MAX_SIM_STEPS):
+        self.step = step
+        self.max_steps = max_steps
+        self.time = 0.0  # 已模拟的时间（秒）
+        self.accumulator = 0.0
+        self.alpha = 0.0  # 渲染插值系数，0到1之间
+    
+    def advance(self, real_dt):
+        """累加真实经过的时间，返回本帧需要执行的模拟步数"""
+        self.accumulator += min(real_dt, self.step * self.max_steps)
+        steps = 0
+        while self.accumulator >= self.step:
+            self.accumulator -= self.step
+            self.time += self.step
+            steps += 1
+        self.alpha = self.accumulator / self.step
+        return steps
+    
+    @property
+    def render_time(self):
+        """插值后的渲染时间（秒）"""
+        return self.time + self.alpha * self.step
+
 # 烟花粒子系统类
 class Firework:
-    def __init__(self, x, y, color):
+    def __init__(self, x, y, color, particle_range=(25, 40), rng=random):
         self.x = x
         self.y = y
         self.color = color
+        self.particle_range = particle_range
+        self.rng = rng
         self.particles = []
         self.alive = True
         self.create_particles()
     
     def create_particles(self):
-        # 创建粒子 - 优化粒子数量，减少不必要的计算
-        num_particles = random.randint(25, 40)  # 略微减少粒子数量以提高性能
+        # 创建粒子 - 粒子数量范围由质量等级决定
+        num_particles = self.rng.randint(*self.particle_range)
         self.particles = []
         
         for _ in range(num_particles):
             # 随机速度和方向
-            angle = random.uniform(0, 2 * math.pi)
-            speed = random.uniform(2, 5)  # 略微减小速度范围
+            angle = self.rng.uniform(0, 2 * math.pi)
+            speed = self.rng.uniform(2, 5)  # 略微减小速度范围
             vx = math.cos(angle) * speed
             vy = math.sin(angle) * speed
             
             # 随机颜色变化 - 使用更高效的颜色计算
             r, g, b = self.color
             color_var = (
-                max(0, min(255, r + random.randint(-20, 20))),
-                max(0, min(255, g + random.randint(-20, 20))),
-                max(0, min(255, b + random.randint(-20, 20)))
+                max(0, min(255, r + self.rng.randint(-20, 20))),
+                max(0, min(255, g + self.rng.randint(-20, 20))),
+                max(0, min(255, b + self.rng.randint(-20, 20)))
             )
             
             # 添加粒子 - 使用更合理的生命周期和大小
             self.particles.append({
                 'x': self.x,
                 'y': self.y,
+                'px': self.x,  # 上一步的位置，用于渲染插值
+                'py': self.y,
                 'vx': vx,
                 'vy': vy,
                 'color': color_var,
                 'alpha': 255,  # 初始透明度
-                'size': random.randint(2, 4),  # 粒子大小
-                'life': random.uniform(0.5, 1.2)  # 略微减少最大寿命
+                'size': self.rng.randint(2, 4),  # 粒子大小
+                'life': self.rng.uniform(0.5, 1.2)  # 略微减少最大寿命
             })
     
     def update(self):
-        # 更新所有粒子 - 使用更高效的列表推导式
+        # 推进一个固定步长（SIM_STEP）
         new_particles = []
         for particle in self.particles:
             # 更新位置
+            particle['px'] = particle['x']
+            particle['py'] = particle['y']
             particle['x'] += particle['vx']
             particle['y'] += particle['vy']
             # 添加重力效果
@@ -102,31 +186,86 @@ class Firework:
         # 检查烟花是否还活着
         self.alive = len(self.particles) > 0
     
-    def draw(self, screen):
-        # 绘制所有粒子 - 使用批量绘制提高性能
-        for particle in self.particles:
-            # 创建带透明度的颜色
-            r, g, b = particle['color']
-            color_with_alpha = (r, g, b, particle['alpha'])
-            # 创建表面
+    def draw(self, screen, sprite='alpha', alpha=1.0):
+        # 在上一步和当前位置之间按 alpha 插值，渲染帧率变化时运动依然平滑
+        positions = [(p['px'] + (p['x'] - p['px']) * alpha, p['py'] + (p['y'] - p['py']) * alpha)
+                     for p in self.particles]
+        
+        # 低质量等级：不创建透明表面，直接在屏幕上绘制
+        if sprite == 'rect':
+            for particle, (x, y) in zip(self.particles, positions):
+                size = particle['size']
+                screen.fill(particle['color'], (x - size//2, y - size//2, size, size))
+            return
+        if sprite == 'circle':
+            for particle, (x, y) in zip(self.particles, positions):
+                screen.circle(particle['color'], (int(x), int(y)), max(1, particle['size']//2))
+            return
+        
+        # 绘制所有带透明度的粒子 - 纹理渲染时每种大小只有一张粒子纹理
+        for particle, (x, y) in zip(self.particles, positions):
             size = particle['size']
-            particle_surface = pygame.Surface((size, size), pygame.SRCALPHA)
-            # 绘制粒子
-            pygame.draw.circle(particle_surface, color_with_alpha, (size//2, size//2), size//2)
-            # 绘制到屏幕
-            screen.blit(particle_surface, (particle['x'] - size//2, particle['y'] - size//2))
+            screen.particle(particle['color'], particle['alpha'], (x - size//2, y - size//2), size)
+
+# 粒子质量调节器 - 根据庆祝期间的实际帧耗时升降质量等级
+class QualityGovernor:
+    def __init__(self, budget_ms=FRAME_BUDGET_MS, level=DEFAULT_QUALITY_LEVEL):
+        self.budget_ms = budget_ms
+        self.level = level
+        self.window = 15  # 每次评估使用的帧数
+        self.cooldown = 0  # 调整后等待若干帧再评估，避免来回抖动
+        self.frame_times = []
+        self.avg_frame_ms = 0.0
+    
+    @property
+    def settings(self):
+        return QUALITY_LEVELS[self.level]
+    
+    def record_frame(self, frame_ms):
+        """记录一帧的实际耗时（不含帧率限制的等待时间）"""
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return
+        
+        self.frame_times.append(frame_ms)
+        if len(self.frame_times) < self.window:
+            return
+        
+        self.avg_frame_ms = sum(self.frame_times) / len(self.frame_times)
+        self.frame_times.clear()
+        
+        # 接近预算时降级，明显低于预算时升级
+        if self.avg_frame_ms > self.budget_ms * 0.85 and self.level > 0:
+            self.set_level(self.level - 1)
+        elif self.avg_frame_ms < self.budget_ms * 0.4 and self.level < len(QUALITY_LEVELS) - 1:
+            self.set_level(self.level + 1)
+    
+    def set_level(self, level):
+        self.level = level
+        self.cooldown = self.window
+        print(f"粒子质量调整为: {self.describe()}")
+    
+    def describe(self):
+        """返回当前质量等级的诊断信息"""
+        return f"{self.settings['name']} (等级 {self.level}, 平均帧耗时 {self.avg_frame_ms:.1f}ms)"
 
 # 烟花管理器类
 class FireworkManager:
-    def __init__(self):
+    def __init__(self, rng=None, sprite_sheets=None):
         self.fireworks = []
-        self.last_spawn_time = 0
+        # 低功耗模式：{颜色: 预先烘焙的烟花帧}，None 表示实时模拟粒子
+        self.sprite_sheets = sprite_sheets
+        # 视觉效果使用独立的随机数流，不影响谜题生成
+        self.rng = rng or random.Random()
+        self.time = 0.0  # 烟花自己的模拟时间（秒），每次 update 推进一个固定步长
+        self.last_spawn_time = 0.0
         self.active = False
-        self.max_fireworks = 15  # 限制最大烟花数量，防止性能问题
+        # 最大烟花数量、生成间隔和粒子数量由质量调节器决定，防止性能问题
+        self.governor = QualityGovernor()
     
     def start_celebration(self):
         self.active = True
-        self.last_spawn_time = pygame.time.get_ticks()
+        self.last_spawn_time = self.time
         # 立即添加几个烟花，使效果更加明显
         for _ in range(3):
             self.add_random_firework()
@@ -137,6 +276,8 @@ class FireworkManager:
         self.fireworks.clear()
     
     def update(self):
+        self.time += SIM_STEP
+        
         # 更新现有烟花 - 使用更高效的方法
         # 创建新列表存储活着的烟花
         active_fireworks = []
@@ -151,141 +292,215 @@ class FireworkManager:
         self.fireworks = active_fireworks
         
         # 如果庆祝活动激活且烟花数量未超过限制，添加新烟花
-        if self.active and len(self.fireworks) < self.max_fireworks:
-            current_time = pygame.time.get_ticks()
-            # 每隔一段时间添加新烟花
-            if current_time - self.last_spawn_time > 250:  # 稍微减少间隔，使效果更连贯
+        settings = self.governor.settings
+        if self.active and len(self.fireworks) < settings['max_fireworks']:
+            # 每隔一段模拟时间添加新烟花
+            if (self.time - self.last_spawn_time) * 1000 > settings['spawn_interval']:
                 self.add_random_firework()
-                self.last_spawn_time = current_time
+                self.last_spawn_time = self.time
     
     def add_random_firework(self):
         # 随机位置 - 使用更合理的范围
-        x = random.randint(150, SCREEN_WIDTH - 150)
-        y = random.randint(100, SCREEN_HEIGHT - 250)
+        x = self.rng.randint(150, SCREEN_WIDTH - 150)
+        y = self.rng.randint(100, SCREEN_HEIGHT - 250)
         # 随机颜色 - 使用更鲜艳的颜色
-        color = random.choice(COLORS)
+        color = self.rng.choice(COLORS)
+        if self.sprite_sheets:
+            # 低功耗模式：播放这种颜色的一个预先烘焙的烟花，亮度变化已经包含在烘焙结果中
+            self.fireworks.append(BakedBurst(self.rng.choice(self.sprite_sheets[color]), x, y))
+            return
         # 随机调整颜色亮度，使烟花更加多样化
-        brightness = random.uniform(0.9, 1.2)
+        brightness = self.rng.uniform(0.9, 1.2)
         bright_color = tuple(min(255, int(c * brightness)) for c in color)
         # 添加烟花
-        self.fireworks.append(Firework(x, y, bright_color))
+        self.fireworks.append(Firework(x, y, bright_color, self.governor.settings['particles'], self.rng))
     
-    def draw(self, screen):
+    def draw(self, screen, alpha=1.0):
         # 绘制所有烟花 - 按照y坐标排序，确保正确的深度效果
+        sprite = self.governor.settings['sprite']
         for firework in sorted(self.fireworks, key=lambda f: f.y):
-            firework.draw(screen)
+            firework.draw(screen, sprite, alpha)
 
-class Game:
-    def reset_game(self, difficulty='easy', num_colors=4):
-        """初始化游戏状态"""
-        self.difficulty = difficulty
-        self.num_colors = num_colors
-        self.code_length = 4
-        
-        # 生成密码 - 确保颜色不重复
-        self._generate_secret_code()
-            
-        # 重置游戏状态
-        self.guesses = []
-        self.feedbacks = []
-        self.current_guess = [-1] * self.code_length
-        self.current_position = 0
-        self.game_over = False
+# AI对手 - 后台线程依次算出AI的猜测，界面按模拟时钟的节奏逐步亮出，回放时与实际对局一致
+class AIRacer:
+    def __init__(self, solver, secret, history, max_guesses, start_time, move_delay=AI_MOVE_DELAY, block=False):
+        self.solver = solver
+        self.secret = tuple(secret)
+        # 已经亮出的 [(猜测元组, 反馈编码)]，困难模式下包含与玩家相同的预填猜测
+        self.moves = list(history)
+        self.max_guesses = max_guesses
+        self.move_delay = move_delay
+        self.start_time = start_time  # 模拟时钟的时间（秒）
+        self.finish_time = None
         self.win = False
-        
-        # 停止烟花效果
-        self.firework_manager.stop_celebration()
-        
-        # 困难模式下，添加随机猜测
-        if difficulty == 'hard':
-            self.add_random_guesses()
-        
-        # 调试信息
-        print(f"生成的密码: {[COLOR_NAMES[i] for i in self.secret_code]}")
+        self.done = False
+        # 为 True 时猜测到期但后台还没算出，update 会等待（回放时使用，保证每步在同一时刻亮出）
+        self.block = block
+        self._prefilled = len(history)
+        self._planned = list(history)  # 后台线程已算出的猜测
+        self._finished = False
+        self._cond = threading.Condition()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ai-racer', daemon=True)
+        self._thread.start()
     
-    def _generate_secret_code(self):
-        """生成游戏密码 - 确保颜色不重复"""
-        available_colors = list(range(self.num_colors))
-        self.secret_code = []
-        
-        for _ in range(self.code_length):
-            if not available_colors:  # 如果可用颜色用完了，重新填充
-                available_colors = list(range(self.num_colors))
-            
-            color_idx = random.choice(available_colors)
-            self.secret_code.append(color_idx)
-            available_colors.remove(color_idx)  # 移除已使用的颜色
-    
-    def add_random_guesses(self):
-        """为困难模式添加5次随机猜测"""
-        attempts = 0
-        max_attempts = 100  # 防止无限循环
-        target_guesses = 5  # 目标随机猜测数量
-        
-        while len(self.guesses) < target_guesses and attempts < max_attempts:
-            attempts += 1
-            
-            # 生成一个随机猜测（确保颜色不重复）
-            random_guess = self._generate_random_guess()
+    def _run(self):
+        mode = self.solver.mode
+        win_outcome = winning_outcome(self.solver.code_length, mode)
+        candidates = self.solver.candidates_after(self._planned)
+        
+        # AI的猜测只取决于密码和已有的猜测，与出手时间无关，提前全部算出
+        while len(self._planned) < self.max_guesses:
+            guess = self.solver.next_guess(self._planned, candidates, cancel=self._cancel)
+            if guess is None or self._cancel.is_set():
+                break
             
-            # 检查这个猜测是否已经存在
-            if random_guess in self.guesses:
-                continue
-                
-            # 获取反馈
-            feedback = self.check_guess(random_guess)
-            
-            # 确保没有超过2个绿色反馈，且绿色+白色不超过3个
-            green_count = feedback.count(GREEN)
-            white_count = feedback.count(WHITE)
-            
-            if green_count <= 2 and (green_count + white_count) <= 3:
-                self.guesses.append(random_guess)
-                self.feedbacks.append(feedback)
-        
-        print(f"困难模式：已添加 {len(self.guesses)} 次随机猜测")
+            outcome = score(guess, self.secret, mode)
+            with self._cond:
+                self._planned.append((guess, outcome))
+                self._cond.notify_all()
+            if outcome == win_outcome:
+                break
+            candidates = filter_candidates(candidates, guess, outcome, mode)
+        
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
     
-    def _generate_random_guess(self):
-        """生成一个随机猜测（确保颜色不重复）"""
-        available_colors = list(range(self.num_colors))
-        random_guess = []
-        
-        for _ in range(self.code_length):
-            if not available_colors:  # 如果可用颜色用完了，重新填充
-                available_colors = list(range(self.num_colors))
-            
-            color_idx = random.choice(available_colors)
-            random_guess.append(color_idx)
-            available_colors.remove(color_idx)
-            
-        return random_guess
+    def update(self, now):
+        """在模拟步中调用：亮出到 now（模拟时钟）为止到期的猜测，用时按到期时间计算"""
+        win_outcome = winning_outcome(self.solver.code_length, self.solver.mode)
+        while not self.done:
+            due = self.start_time + (len(self.moves) - self._prefilled + 1) * self.move_delay
+            if now < due:
+                return
+            with self._cond:
+                if self.block:
+                    while (len(self._planned) == len(self.moves) and not self._finished
+                           and not self._cancel.is_set()):
+                        self._cond.wait()
+                if len(self._planned) == len(self.moves):
+                    return
+                move = self._planned[len(self.moves)]
+            self.moves.append(move)
+            if move[1] == win_outcome or len(self.moves) >= self.max_guesses:
+                self.win = move[1] == win_outcome
+                self.finish_time = due - self.start_time
+                self.done = True
+    
+    def cancel(self):
+        """停止AI的搜索，线程会在当前猜测评估完成后退出"""
+        self._cancel.set()
+        with self._cond:
+            self._cond.notify_all()
 
-    def __init__(self):
-        # 初始化游戏窗口
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("色块解谜游戏")
+class Game(GameEngine):
+    """pygame 图形界面 - 游戏规则和状态由 GameEngine 提供"""
+    
+    def __init__(self, renderer_backend=SOFTWARE, stats_path=STATS_DB_PATH, max_guesses=MAX_GUESSES,
+                 puzzle_id=None, celebration=LIVE):
+        # 初始化游戏窗口 - 纹理渲染不可用时自动退回软件渲染
+        self.screen = create_renderer(renderer_backend, (SCREEN_WIDTH, SCREEN_HEIGHT), "色块解谜游戏")
         self.clock = pygame.time.Clock()
         
+        # 固定步长模拟时钟，动画速度与渲染帧率无关
+        self.sim_clock = SimulationClock()
+        self.last_input_time = time.monotonic()
+        self.frame_ms_avg = 0.0
+        
+        # 调试热键（F9 CPU采样，F10 内存快照），只在设置 COLORCORTEX_DEBUG=1 时启用
+        self.debug_tools = DebugTools() if debug_enabled() else None
+        
         # 初始化烟花管理器
-        self.firework_manager = FireworkManager()
+        # 种子取自全局随机数，录制输入后回放时烟花也完全一致
+        # 低功耗模式下烟花预先烘焙为精灵帧（缓存在磁盘上），庆祝时每个烟花每帧只需一次 blit
+        sprite_sheets = None
+        if celebration == BAKED:
+            sprite_sheets = load_sprite_sheets(Firework, COLORS, QUALITY_LEVELS[DEFAULT_QUALITY_LEVEL]['particles'])
+        self.firework_manager = FireworkManager(random.Random(random.getrandbits(64)), sprite_sheets)
+        
+        # 战绩面板只在配置切换或有新数据写入时重新渲染
+        self.stats_cache_key = None
+        self.stats_surfaces = []
+        
+        # 输入录制（--record-input），未开启时为 None
+        self.input_recorder = None
+        # 画面录制（F8 或 --capture），未开启时为 None
+        self.frame_recorder = None
+        self.capture_format = PNG
+        
+        # AI对战模式
+        self.race_mode = False
+        self.ai_racer = None
+        # 回放时设为 True：AI的猜测到期时等待后台算出，保证与录制时在同一时刻出手
+        self.block_ai = False
+        self.move_analyzer = None
         
         # 加载字体
         self._load_fonts()
         
         # 初始化游戏状态
         self.show_instructions = True
+        self.show_confirm_dialog = False
         self.start_button = pygame.Rect(SCREEN_WIDTH//2 - 100, 500, 200, 50)
         
         # 预渲染常用文本以提高性能
         self.cached_text = {}
         self._prerender_common_text()
         
-        # 初始化游戏
-        self.reset_game('easy', 4)
+        # 每帧使用的动态文本和色块精灵也只渲染一次
+        self.text_cache = OrderedDict()
+        self.block_sprites = {}
+        self.overlay = None
+        self.dim_overlay = None
+        self.board_layout = None
+        
+        # 打开战绩数据库、加载求解器并初始化游戏
+        super().__init__(stats_path, max_guesses, puzzle_id)
         
         # 添加调试信息
         print("游戏初始化完成，应显示指令界面")
     
+    def _on_reset(self):
+        # 已提交的猜测行不会再变化，每行只渲染一次
+        self.history_rows = OrderedDict()
+        # 历史面板第一条可见猜测的序号，None 表示自动跟随最新的猜测
+        self.history_scroll = None
+        
+        # 停止烟花效果
+        self.firework_manager.stop_celebration()
+        
+        # 停止上一局的AI对手和对局分析
+        self.stop_ai_racer()
+        self.stop_move_analyzer()
+        
+        # 对局分析（多棋盘模式不支持）：预填的猜测单独记录，不与最佳猜测比较
+        if self.num_boards == 1:
+            self.move_analyzer = MoveAnalyzer(self.get_solver())
+    
+    def _on_move(self, guess, before, after, prefilled=False):
+        if self.move_analyzer:
+            self.move_analyzer.record_move(guess, before, after, prefilled)
+    
+    def _on_start(self):
+        if self.move_analyzer:
+            self.move_analyzer.analyze_state(len(self.guesses), self.solver_history(), self.color_domains.candidates)
+        
+        # AI对战模式下，AI从与玩家相同的局面开始破解同一个密码（多棋盘模式不支持）
+        if self.race_mode and not self.boards:
+            self.ai_racer = AIRacer(self.get_solver(), self.secret_code, self.solver_history(), self.max_guesses,
+                                    self.start_time, block=self.block_ai)
+    
+    def _on_guess(self):
+        self.history_scroll = None
+        if self.win:
+            # 触发烟花效果
+            self.firework_manager.start_celebration()
+        elif not self.game_over and self.move_analyzer:
+            # 玩家思考下一步时，后台计算新局面的最佳猜测
+            self.move_analyzer.analyze_state(len(self.guesses), self.solver_history(),
+                                             self.color_domains.candidates)
+    
     def _load_fonts(self):
         """加载游戏字体"""
         try:
@@ -329,7 +544,8 @@ class Game:
             "3. 使用键盘数字键1-7可以直接选择对应颜色",
             "4. 空格键或0键可以清空当前色块",
             "5. 左右方向键可以移动选择位置",
-            "6. 回车键可以提交猜测"
+            "6. 回车键可以提交猜测",
+            "7. H键可以获取提示"
         ]
         
         self.cached_text['instructions'] = []
@@ -345,6 +561,19 @@ class Game:
         # 颜色选择器标题
         self.cached_text['color_selector'] = self.small_font.render("可选颜色:", True, TEXT_COLOR)
 
+    def _render_text(self, font, text, color):
+        """渲染动态文本，相同内容只渲染一次（纹理渲染时也只上传一次）"""
+        key = (id(font), text, color)
+        surface = self.text_cache.get(key)
+        if surface is None:
+            surface = font.render(text, True, color)
+            self.text_cache[key] = surface
+            if len(self.text_cache) > TEXT_CACHE_SIZE:
+                self.text_cache.popitem(last=False)
+        else:
+            self.text_cache.move_to_end(key)
+        return surface
+
     def draw(self):
         # 清除屏幕
         self.screen.fill(BG_COLOR)
@@ -373,8 +602,8 @@ class Game:
         
         # 绘制开始游戏按钮 - 使用圆角矩形
         button_color = (100, 100, 255) if self.start_button.collidepoint(pygame.mouse.get_pos()) else (80, 80, 200)
-        pygame.draw.rect(self.screen, button_color, self.start_button, border_radius=10)
-        pygame.draw.rect(self.screen, (150, 150, 255), self.start_button, 2, border_radius=10)  # 添加边框
+        self.screen.rect(button_color, self.start_button, border_radius=10)
+        self.screen.rect((150, 150, 255), self.start_button, 2, border_radius=10)  # 添加边框
         
         # 使用预渲染的按钮文本
         start_text = self.cached_text['start_button']
@@ -384,8 +613,9 @@ class Game:
         # 在说明界面绘制难度选择
         difficulty_buttons = self.draw_difficulty_buttons()
         
-        # 强制更新显示
-        pygame.display.update()
+        # 绘制当前难度和颜色数量下的战绩
+        self._draw_stats_panel()
+        
         return difficulty_buttons, None, None, None
         
     def _draw_game(self):
@@ -393,13 +623,24 @@ class Game:
         # 绘制游戏状态
         self.draw_game_state()
         
-        # 绘制历史猜测
-        self._draw_history_guesses()
+        # 多棋盘模式绘制所有棋盘，否则绘制历史猜测
+        if self.boards:
+            self._draw_boards()
+        else:
+            self._draw_history_guesses()
         
         # 绘制当前猜测
-        if not self.game_over and len(self.guesses) < MAX_GUESSES:
+        if self._is_playing():
             self._draw_current_guess()
         
+        # 绘制AI对手的进度
+        if self.ai_racer:
+            self._draw_ai_progress()
+        
+        # 游戏结束后显示对局分析
+        if self.game_over and self.move_analyzer:
+            self._draw_move_analysis()
+        
         # 绘制颜色选择器
         self.draw_color_selector()
         
@@ -408,40 +649,265 @@ class Game:
         
         # 绘制烟花效果
         if self.win:
-            self.firework_manager.draw(self.screen)
+            self.firework_manager.draw(self.screen, self.sim_clock.alpha)
         
-        pygame.display.flip()
         return [], submit_rect, reset_rect, menu_rect
     
+    def _history_layout(self):
+        """返回 (第一条可见猜测的序号, 可见猜测条数, 最大滚动位置)
+        
+        游戏进行中最后一行固定显示当前猜测，其余行显示历史猜测；
+        当前猜测行紧跟在可见的历史猜测之后。
+        """
+        slots = HISTORY_ROWS - 1 if self._is_playing() else HISTORY_ROWS
+        max_first = max(0, len(self.guesses) - slots)
+        first = max_first if self.history_scroll is None else min(self.history_scroll, max_first)
+        return first, min(slots, len(self.guesses) - first), max_first
+    
+    def _row_y(self, slot):
+        return HISTORY_TOP + slot * ROW_HEIGHT
+    
+    def _current_row_y(self):
+        if self.boards:
+            return MULTI_GUESS_Y
+        return self._row_y(self._history_layout()[1])
+    
+    def scroll_history(self, rows):
+        """滚动历史面板，正数向后（更新的猜测）"""
+        first, _, max_first = self._history_layout()
+        first = max(0, min(max_first, first + rows))
+        self.history_scroll = None if first >= max_first else first
+    
     def _draw_history_guesses(self):
-        """绘制历史猜测"""
-        for i, (guess, feedback) in enumerate(zip(self.guesses, self.feedbacks)):
-            y = 100 + i * (BLOCK_SIZE + 20)
-            
-            # 绘制猜测序号
-            num_text = self.font.render(f"{i+1}.", True, TEXT_COLOR)
-            self.screen.blit(num_text, (MARGIN, y + BLOCK_SIZE//2 - num_text.get_height()//2))
+        """绘制历史猜测 - 只绘制可见的行，每行渲染一次后缓存，之后只需一次blit"""
+        first, visible, max_first = self._history_layout()
+        for slot in range(visible):
+            index = first + slot
+            row_surface = self.history_rows.get(index)
+            if row_surface is None:
+                row_surface = self.history_rows[index] = self._render_history_row(index)
+                if len(self.history_rows) > HISTORY_CACHE_SIZE:
+                    self.history_rows.popitem(last=False)
+            else:
+                self.history_rows.move_to_end(index)
+            self.screen.blit(row_surface, (0, self._row_y(slot)))
+        
+        # 提示被隐藏的猜测
+        hint_color = (150, 150, 150)
+        if first > 0:
+            text = self._render_text(self.small_font, f"更早的 {first} 次猜测（滚轮或PageUp查看）", hint_color)
+            self.screen.blit(text, (MARGIN + 30, HISTORY_TOP - text.get_height() - 4))
+        if first < max_first:
+            text = self._render_text(self.small_font, f"更新的 {max_first - first} 次猜测（滚轮或PageDown查看）",
+                                     hint_color)
+            self.screen.blit(text, (MARGIN + 30, self._row_y(HISTORY_ROWS) - 6))
+    
+    def _render_history_row(self, index):
+        """把一行已提交的猜测（序号、色块、反馈）渲染到独立的表面"""
+        guess, feedback = self.guesses[index], self.feedbacks[index]
+        width = MARGIN + 30 + self.code_length * (BLOCK_SIZE + MARGIN) + 40
+        # 使用不透明的背景色，blit结果与直接绘制到屏幕完全一致
+        row_surface = pygame.Surface((width, BLOCK_SIZE + 12))
+        row_surface.fill(BG_COLOR)
+        
+        # 绘制猜测序号
+        num_text = self.font.render(f"{index+1}.", True, TEXT_COLOR)
+        row_surface.blit(num_text, (MARGIN, BLOCK_SIZE//2 - num_text.get_height()//2))
+        
+        # 绘制猜测色块和反馈
+        canvas = SurfaceCanvas(row_surface)
+        for j, color_idx in enumerate(guess):
+            self.draw_block(color_idx, MARGIN + 30 + j * (BLOCK_SIZE + MARGIN), 0, canvas)
+        self.draw_feedback(feedback, MARGIN + 30, 0, self.difficulty == 'easy', canvas)
+        return row_surface
+    
+    def _board_layout(self):
+        """返回多棋盘的布局 (列数, 棋盘宽, 棋盘高, 行高, 色块大小, 可见行数)"""
+        key = (self.num_boards, self.guess_limit, self.code_length, self.difficulty)
+        if self.board_layout and self.board_layout[0] == key:
+            return self.board_layout[1]
+        
+        columns = min(self.num_boards, BOARD_COLUMNS)
+        rows = -(-self.num_boards // columns)
+        width = (BOARDS_AREA[0] - BOARD_GAP * (columns - 1)) // columns
+        height = (BOARDS_AREA[1] - BOARD_GAP * (rows - 1)) // rows
+        # 每个棋盘要放下全部猜测和一行当前猜测，行数太多时只显示最近的猜测
+        visible = min(self.guess_limit + 1, (height - BOARD_HEADER) // MIN_BOARD_ROW)
+        row_height = min(ROW_HEIGHT, (height - BOARD_HEADER) // visible)
+        # 右侧留出数量反馈圆点的位置，简单模式在色块下方留出反馈条
+        block = (width - 12) // self.code_length - 4 - (0 if self.difficulty == 'easy' else 6)
+        block = max(4, min(BLOCK_SIZE, block, row_height - (6 if self.difficulty == 'easy' else 3)))
+        layout = (columns, width, height, row_height, block, visible)
+        self.board_layout = (key, layout)
+        return layout
+    
+    def _board_first_row(self, board, visible):
+        """棋盘第一条可见猜测的序号，未猜中的棋盘为当前猜测留出一行"""
+        rows = len(board.outcomes)
+        if not board.solved and self._is_playing():
+            rows += 1
+        return max(0, rows - visible)
+    
+    def _draw_boards(self):
+        """绘制所有棋盘 - 每个棋盘渲染到缓存的表面，只有提交猜测后发生变化的棋盘才重新渲染"""
+        columns, width, height, row_height, block, visible = self._board_layout()
+        playing = self._is_playing()
+        for index, board in enumerate(self.boards):
+            if board.surface is None:
+                board.surface = self._render_board(index, board)
+            x = (index % columns) * (width + BOARD_GAP)
+            y = BOARDS_TOP + (index // columns) * (height + BOARD_GAP)
+            self.screen.blit(board.surface, (x, y))
             
-            # 绘制猜测色块
+            # 正在输入的猜测实时叠加在每个未猜中棋盘的下一行
+            if playing and not board.solved:
+                row_y = y + BOARD_HEADER + (len(board.outcomes) - self._board_first_row(board, visible)) * row_height
+                for j, color_idx in enumerate(self.current_guess):
+                    self.draw_block(color_idx, x + 6 + j * (block + 4), row_y, size=block)
+    
+    def _render_board(self, index, board):
+        """把一个棋盘（标题、猜测和反馈）渲染到独立的表面"""
+        columns, width, height, row_height, block, visible = self._board_layout()
+        board_surface = pygame.Surface((width, height))
+        board_surface.fill(BG_COLOR)
+        canvas = SurfaceCanvas(board_surface)
+        canvas.rect(BOARD_BG_COLOR, (0, 0, width, height), border_radius=8)
+        if board.solved:
+            canvas.rect(GREEN, (0, 0, width, height), 2, border_radius=8)
+        
+        # 标题：棋盘序号和状态，游戏结束时显示未猜中棋盘的密码
+        if board.solved:
+            status, color = f"{index + 1}. 第{board.solved_at}次猜中", GREEN
+        elif self.game_over:
+            status, color = f"{index + 1}.", TEXT_COLOR
+            for j, color_idx in enumerate(board.secret_code):
+                canvas.rect(COLORS[color_idx], (30 + j * 14, 6, 12, 12), border_radius=2)
+        else:
+            status, color = f"{index + 1}. 剩余 {len(board.domains.candidates)} 种", TEXT_COLOR
+        canvas.blit(self._render_text(self.small_font, status, color), (6, 3))
+        
+        # 猜测和反馈
+        first = self._board_first_row(board, visible)
+        is_easy = self.difficulty == 'easy'
+        dot = max(2, block // 8)
+        for slot, i in enumerate(range(first, len(board.outcomes))):
+            y = BOARD_HEADER + slot * row_height
+            for j, color_idx in enumerate(self.guesses[i]):
+                self.draw_block(color_idx, 6 + j * (block + 4), y, canvas, size=block)
+            feedback = self.outcome_feedback(board.outcomes[i])
+            if is_easy:
+                # 反馈条与位置对应
+                for j, color in enumerate(feedback):
+                    canvas.rect(color, (6 + j * (block + 4), y + block + 1, block, max(2, block // 10)),
+                                border_radius=1)
+            else:
+                # 数量反馈排成 2×2 的圆点
+                feedback_x = 6 + self.code_length * (block + 4) + dot + 1
+                for j, color in enumerate(feedback[:4]):
+                    canvas.circle(color, (feedback_x + (j % 2) * (2 * dot + 2),
+                                          y + block // 2 - dot + (j // 2) * (2 * dot + 2)), dot)
+        return board_surface
+    
+    def _draw_ai_progress(self):
+        """在玩家棋盘右侧绘制AI对手的猜测次数和反馈，游戏结束后才显示AI的颜色"""
+        ai = self.ai_racer
+        moves = list(ai.moves)  # 后台线程可能正在追加，先取快照
+        panel_x = 400
+        block = BLOCK_SIZE // 2
+        
+        if ai.done:
+            status = f"AI: 第{len(moves)}次猜中 ({ai.finish_time:.1f}秒)" if ai.win else "AI: 未能猜中"
+        else:
+            status = f"AI: 思考中... 已猜{len(moves)}次"
+        status_surface = self._render_text(self.small_font, status, TEXT_COLOR)
+        self.screen.blit(status_surface, (panel_x, 75))
+        
+        # 与玩家的历史面板同步滚动，只绘制可见的行
+        first = self._history_layout()[0]
+        for slot, (guess, outcome) in enumerate(moves[first:first + HISTORY_ROWS]):
+            y = self._row_y(slot) + block // 2
             for j, color_idx in enumerate(guess):
-                self.draw_block(color_idx, MARGIN + 30 + j * (BLOCK_SIZE + MARGIN), y)
+                color = COLORS[color_idx] if self.game_over else (80, 80, 80)
+                self.screen.rect(color, (panel_x + j * (block + 5), y, block, block), border_radius=4)
             
-            # 绘制反馈
-            self.draw_feedback(feedback, MARGIN + 30, y, self.difficulty == 'easy')
+            # 反馈统一按绿白灰排序显示为一排圆点
+            feedback = sorted(self.outcome_feedback(outcome), key=lambda x: (x != GREEN, x != WHITE, x != GRAY))
+            feedback_x = panel_x + self.code_length * (block + 5) + 10
+            for j, color in enumerate(feedback):
+                self.screen.circle(color, (feedback_x + j * 12, y + block // 2), 4)
+        
+        # 双方的比赛结果
+        result = None
+        if self.game_over:
+            if self.win and not (ai.win and ai.finish_time <= self.finish_time):
+                result = "你赢了这场比赛！"
+            elif ai.win:
+                result = "AI赢了这场比赛"
+            elif ai.done:
+                result = "双方都没有猜中"
+        if result:
+            result_surface = self._render_text(self.font, result, (255, 215, 0))
+            self.screen.blit(result_surface, (panel_x, self._row_y(HISTORY_ROWS)))
+    
+    def _draw_move_analysis(self):
+        """在每行猜测右侧显示候选数量变化、获得的信息量以及与信息量最大的猜测的比较"""
+        analyzer = self.move_analyzer
+        x = RACE_ANALYSIS_X if self.ai_racer else ANALYSIS_X
+        dim_color = (150, 150, 150)
+        line_height = self.small_font.get_linesize()
+        
+        first, visible, _ = self._history_layout()
+        for slot in range(visible):
+            i = first + slot
+            move = analyzer.moves[i]
+            y = self._row_y(slot)
+            line = f"{move['before']} → {move['after']}  获得 {move['bits']:.2f} 位"
+            self.screen.blit(self._render_text(self.small_font, line, dim_color if move['prefilled'] else TEXT_COLOR),
+                             (x, y))
+            
+            best = analyzer.best.get(i)
+            if move['prefilled']:
+                line, color = "预填猜测", dim_color
+            elif best is None:
+                line, color = "分析中...", dim_color
+            else:
+                line = f"期望 {move['expected']:.2f} 位 / 最多 {best[1]:.2f} 位"
+                color = GREEN if move['expected'] >= best[1] - 1e-9 else TEXT_COLOR
+            text = self._render_text(self.small_font, line, color)
+            self.screen.blit(text, (x, y + line_height))
+            
+            # 有空间时在后面用小色块显示信息量最大的猜测
+            if best is not None and not move['prefilled'] and tuple(best[0]) != move['guess']:
+                block_x = x + text.get_width() + 8
+                if block_x + self.code_length * 12 <= SCREEN_WIDTH:
+                    for j, color_idx in enumerate(best[0]):
+                        self.screen.rect(COLORS[color_idx], (block_x + j * 12, y + line_height + 3, 10, 10),
+                                         border_radius=2)
+        
+        # 汇总
+        summary = analyzer.summary()
+        y = self._row_y(HISTORY_ROWS) + 30
+        if summary['player_moves']:
+            line = f"平均每步期望 {summary['player_expected']:.2f} 位，最多 {summary['best_expected']:.2f} 位"
+            self.screen.blit(self._render_text(self.small_font, line, TEXT_COLOR), (ANALYSIS_X, y))
+            line = f"{summary['optimal_moves']}/{summary['player_moves']} 步信息量达到最大"
+            if summary['prefilled_moves']:
+                line += f"，预填 {summary['prefilled_moves']} 步共 {summary['prefilled_bits']:.1f} 位"
+            self.screen.blit(self._render_text(self.small_font, line, TEXT_COLOR), (ANALYSIS_X, y + line_height))
     
     def _draw_current_guess(self):
         """绘制当前猜测"""
-        current_y = 100 + len(self.guesses) * (BLOCK_SIZE + 20)
+        current_y = self._current_row_y()
         
         # 绘制猜测序号
-        num_text = self.font.render(f"{len(self.guesses)+1}.", True, TEXT_COLOR)
+        num_text = self._render_text(self.font, f"{len(self.guesses)+1}.", TEXT_COLOR)
         self.screen.blit(num_text, (MARGIN, current_y + BLOCK_SIZE//2 - num_text.get_height()//2))
         
         # 绘制当前猜测的色块
         for i, color_idx in enumerate(self.current_guess):
             # 高亮显示当前选择位置 - 使用圆角矩形
             if i == self.current_position:
-                pygame.draw.rect(self.screen, (100, 100, 255), 
+                self.screen.rect((100, 100, 255), 
                                (MARGIN + 30 + i * (BLOCK_SIZE + MARGIN) - 3, 
                                 current_y - 3, 
                                 BLOCK_SIZE + 6, 
@@ -454,43 +920,145 @@ class Game:
         running = True
         print(f"游戏开始运行，指令界面状态: {self.show_instructions}")
         
-        # 添加确认对话框状态变量
-        self.show_confirm_dialog = False
-        
         # 主游戏循环
+        last_frame = time.perf_counter()
         while running:
-            # 绘制界面
-            if self.show_instructions:
-                self.difficulty_buttons, _, _, _ = self.draw()
-            else:
-                _, self.submit_rect, self.reset_rect, self.menu_rect = self.draw()
-                
-                # 更新烟花效果 - 只在胜利时更新
-                if self.win:
-                    self.firework_manager.update()
-                
-                # 如果需要显示确认对话框，绘制它
-                if self.show_confirm_dialog:
-                    self.draw_confirm_dialog()
-            
-            # 处理事件
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    running = False
-                elif event.type == KEYDOWN:
-                    running = self._handle_key_event(event)
-                elif event.type == MOUSEBUTTONDOWN:
-                    self._handle_mouse_event(event)
+            # 按真实经过的时间推进固定步长模拟
+            now = time.perf_counter()
+            running = self.step(pygame.event.get(), now - last_frame)
+            last_frame = now
             
             # 控制帧率
-            self.clock.tick(30)
+            self.clock.tick(self._target_fps())
+            frame_ms = self.clock.get_rawtime()
+            self.frame_ms_avg = self.frame_ms_avg * 0.9 + frame_ms * 0.1
+            
+            # 庆祝期间把本帧实际耗时交给质量调节器
+            if self.firework_manager.active:
+                self.firework_manager.governor.record_frame(frame_ms)
         
         # 游戏退出清理
+        if self.debug_tools:
+            self.debug_tools.close()
+        self.stop_ai_racer()
+        self.stop_move_analyzer()
+        self.stop_capture()
+        if self.stats_store:
+            self.stats_store.close()
         pygame.quit()
         sys.exit()
     
+    def step(self, events, dt):
+        """执行一帧：推进模拟、绘制并提交画面、处理输入事件，返回是否继续运行
+        
+        主循环和输入回放（replay.py）共用这一函数。
+        """
+        for _ in range(self.sim_clock.advance(dt)):
+            self.update_simulation()
+        
+        # 绘制界面
+        if self.show_instructions:
+            self.difficulty_buttons, _, _, _ = self.draw()
+        else:
+            _, self.submit_rect, self.reset_rect, self.menu_rect = self.draw()
+            
+            # 如果需要显示确认对话框，绘制它
+            if self.show_confirm_dialog:
+                self.draw_confirm_dialog()
+        
+        # 每帧只提交一次画面
+        self.screen.present()
+        
+        # 录制画面：只复制像素交给写线程，写不过来时丢帧；写入失败时结束录制
+        if self.frame_recorder and not self.frame_recorder.capture(self.screen.to_surface()):
+            self.stop_capture()
+        
+        # 处理事件
+        running = True
+        for event in events:
+            self.last_input_time = time.monotonic()
+            if self.input_recorder:
+                self.input_recorder.record(event)
+            if event.type == QUIT:
+                running = False
+            elif event.type == KEYDOWN:
+                running = self._handle_key_event(event)
+            elif event.type == MOUSEBUTTONDOWN:
+                self._handle_mouse_event(event)
+        
+        # 把光标移动、选择颜色等变化发给旁观者
+        self.broadcast_state()
+        return running
+    
+    def start_capture(self, output_dir=None, fmt=None):
+        """开始录制画面"""
+        if self.frame_recorder is None:
+            try:
+                self.frame_recorder = FrameRecorder(output_dir, fmt or self.capture_format)
+            except OSError as e:
+                print(f"无法开始录制画面: {e}")
+    
+    def stop_capture(self):
+        if self.frame_recorder:
+            self.frame_recorder.close()
+            self.frame_recorder = None
+    
+    def toggle_capture(self):
+        if self.frame_recorder:
+            self.stop_capture()
+        else:
+            self.start_capture()
+    
+    def _debug_counters(self):
+        """内存快照时一并记录的缓存和对象数量"""
+        return {
+            'cached_text': len(self.cached_text),
+            'history_rows': len(self.history_rows),
+            'fireworks': len(self.firework_manager.fireworks),
+            'particles': sum(len(f.particles) for f in self.firework_manager.fireworks),
+            'board_surfaces': sum(1 for board in self.boards if board.surface is not None),
+        }
+    
+    def now(self):
+        # 对局计时使用模拟时钟，与AI对手的出手节奏一致，回放时也能得到相同的用时
+        return self.sim_clock.time
+    
+    def update_simulation(self):
+        """推进一个固定步长的模拟"""
+        # AI对手按模拟时钟出手
+        if self.ai_racer:
+            self.ai_racer.update(self.sim_clock.time)
+        
+        # 更新烟花效果 - 只在胜利时更新
+        if self.win and not self.show_instructions:
+            self.firework_manager.update()
+    
+    def _target_fps(self):
+        """选择渲染帧率 - 负载过高或空闲时降低，动画速度由模拟时钟保证不变"""
+        if self.frame_ms_avg > FRAME_BUDGET_MS:
+            return LOAD_FPS
+        # 录制画面时保持完整帧率
+        animating = (self.win and not self.show_instructions) or self.frame_recorder is not None
+        if not animating and time.monotonic() - self.last_input_time > IDLE_TIMEOUT:
+            return IDLE_FPS
+        return RENDER_FPS
+    
     def _handle_key_event(self, event):
         """处理键盘事件"""
+        # F8 开始/结束录制画面
+        if event.key == K_F8:
+            self.toggle_capture()
+            return True
+        
+        # 调试热键
+        if self.debug_tools:
+            if event.key == K_F9:
+                self.debug_tools.toggle_profiler()
+                return True
+            if event.key == K_F10:
+                self.debug_tools.take_snapshot(self._debug_counters())
+                return True
+        
         # 处理ESC键
         if event.key == K_ESCAPE:
             if not self.show_instructions and not self.show_confirm_dialog:
@@ -504,8 +1072,7 @@ class Game:
         # 处理确认对话框的按键
         if self.show_confirm_dialog:
             if event.key == K_y or event.key == K_RETURN:  # Y键或回车确认
-                self.show_instructions = True
-                self.show_confirm_dialog = False
+                self.return_to_menu()
             elif event.key == K_n:  # N键取消
                 self.show_confirm_dialog = False
             return True
@@ -516,8 +1083,19 @@ class Game:
                 self.reset_game(self.difficulty, self.num_colors)
             return True
         
+        # 翻页键滚动历史面板
+        if event.key in (K_PAGEUP, K_PAGEDOWN, K_HOME, K_END):
+            if not self.show_instructions:
+                if event.key == K_HOME:
+                    self.history_scroll = 0
+                elif event.key == K_END:
+                    self.history_scroll = None
+                else:
+                    self.scroll_history(HISTORY_ROWS - 1 if event.key == K_PAGEDOWN else 1 - HISTORY_ROWS)
+            return True
+        
         # 游戏进行中的按键处理
-        if not self.game_over and len(self.guesses) < MAX_GUESSES and not self.show_instructions:
+        if self._is_playing() and not self.show_instructions:
             # 处理方向键
             if event.key == K_LEFT:
                 self.current_position = (self.current_position - 1) % self.code_length
@@ -533,23 +1111,22 @@ class Game:
             elif event.key == K_RETURN:
                 if -1 not in self.current_guess:
                     self.process_guess()
+            # 处理H键提示
+            elif event.key == K_h:
+                self.apply_hint()
         
         return True
     
-    def _handle_color_selection(self, color_idx):
-        """处理颜色选择"""
-        if color_idx < self.num_colors:
-            # 检查其他位置是否有相同颜色，如果有则清空
-            for i in range(self.code_length):
-                if i != self.current_position and self.current_guess[i] == color_idx:
-                    self.current_guess[i] = -1  # 清空其他位置的相同颜色
-            # 设置当前位置的颜色
-            self.current_guess[self.current_position] = color_idx
-    
     def _handle_mouse_event(self, event):
         """处理鼠标事件"""
         mouse_x, mouse_y = event.pos
         
+        # 滚轮（按钮4/5）滚动历史面板
+        if event.button in (4, 5):
+            if not self.show_instructions and not self.show_confirm_dialog:
+                self.scroll_history(-1 if event.button == 4 else 1)
+            return
+        
         # 处理确认对话框的点击
         if self.show_confirm_dialog:
             self._handle_confirm_dialog_click(mouse_x, mouse_y)
@@ -575,8 +1152,7 @@ class Game:
         cancel_rect = pygame.Rect(dialog_x + 200, dialog_y + 120, 80, 30)
         
         if confirm_rect.collidepoint(mouse_x, mouse_y):
-            self.show_instructions = True
-            self.show_confirm_dialog = False
+            self.return_to_menu()
         elif cancel_rect.collidepoint(mouse_x, mouse_y):
             self.show_confirm_dialog = False
     
@@ -591,7 +1167,11 @@ class Game:
         # 处理难度选择
         for difficulty, rect in self.difficulty_buttons:
             if rect.collidepoint(mouse_x, mouse_y):
-                if isinstance(difficulty, str):
+                if difficulty == 'race':
+                    self.race_mode = not self.race_mode
+                elif isinstance(difficulty, tuple):
+                    self.num_boards = difficulty[1]
+                elif isinstance(difficulty, str):
                     self.difficulty = difficulty
                 else:
                     self.num_colors = difficulty
@@ -599,7 +1179,7 @@ class Game:
     def _handle_game_click(self, mouse_x, mouse_y, button):
         """处理游戏界面的点击"""
         # 如果游戏已结束，只处理按钮点击
-        if self.game_over or len(self.guesses) >= MAX_GUESSES:
+        if not self._is_playing():
             self._handle_button_click(mouse_x, mouse_y)
             return
         
@@ -613,7 +1193,7 @@ class Game:
                 return
         
         # 处理当前色块点击
-        current_y = 100 + len(self.guesses) * (BLOCK_SIZE + 20)
+        current_y = self._current_row_y()
         for i in range(self.code_length):
             block_x = MARGIN + 30 + i * (BLOCK_SIZE + MARGIN)
             block_rect = pygame.Rect(block_x, current_y, BLOCK_SIZE, BLOCK_SIZE)
@@ -625,35 +1205,6 @@ class Game:
         # 处理按钮点击
         self._handle_button_click(mouse_x, mouse_y)
     
-    def _cycle_colors(self, position, reverse=False):
-        """循环选择颜色"""
-        # 获取当前已使用的颜色（排除当前位置的颜色）
-        used_colors = []
-        for j, color in enumerate(self.current_guess):
-            if j != position and color != -1:
-                used_colors.append(color)
-        
-        # 获取所有可用颜色（包括空白色）
-        available_colors = [-1]  # 首先添加空白色
-        for color_idx in range(self.num_colors):
-            if color_idx not in used_colors:
-                available_colors.append(color_idx)
-        
-        # 找到当前颜色在可用颜色列表中的位置
-        current_color = self.current_guess[position]
-        try:
-            current_index = available_colors.index(current_color)
-        except ValueError:
-            current_index = -1
-        
-        # 根据方向选择颜色滚动方向
-        if reverse:  # 向前滚动
-            next_index = (current_index - 1) % len(available_colors)
-        else:  # 向后滚动
-            next_index = (current_index + 1) % len(available_colors)
-        
-        self.current_guess[position] = available_colors[next_index]
-    
     def _handle_button_click(self, mouse_x, mouse_y):
         """处理按钮点击"""
         if hasattr(self, 'submit_rect') and self.submit_rect.collidepoint(mouse_x, mouse_y):
@@ -663,35 +1214,23 @@ class Game:
             self.reset_game(self.difficulty, self.num_colors)
         elif hasattr(self, 'menu_rect') and self.menu_rect.collidepoint(mouse_x, mouse_y):
             # 返回主菜单
-            self.show_instructions = True
+            self.return_to_menu()
+    
+    def return_to_menu(self):
+        """返回主菜单，同时停止AI对手"""
+        self.show_instructions = True
+        self.show_confirm_dialog = False
+        self.stop_ai_racer()
+    
+    def stop_ai_racer(self):
+        if self.ai_racer:
+            self.ai_racer.cancel()
+            self.ai_racer = None
 
-    def process_guess(self):
-        """处理猜测结果的通用逻辑"""
-        feedback = self.check_guess(self.current_guess)
-        self.guesses.append(self.current_guess.copy())
-        self.feedbacks.append(feedback)
-        
-        # 检查胜利条件
-        if feedback.count(GREEN) == self.code_length:
-            self.win = True
-            self.game_over = True
-            # 触发烟花效果
-            self.firework_manager.start_celebration()
-        elif len(self.guesses) >= MAX_GUESSES:
-            self.game_over = True
-            
-        # 重置当前猜测
-        self.current_guess = [-1] * self.code_length
-        
-        # 在简单模式下，如果某个位置猜对了，自动填入该颜色
-        if self.difficulty == 'easy' and not self.game_over:
-            for i, color in enumerate(feedback):
-                if color == GREEN:  # 如果这个位置是绿色（完全正确）
-                    self.current_guess[i] = self.guesses[-1][i]  # 使用上一次猜测的颜色
-        
-        self.current_position = 0
-        # 删除重复的行
-        # self.current_position = 0
+    def stop_move_analyzer(self):
+        if self.move_analyzer:
+            self.move_analyzer.cancel()
+            self.move_analyzer = None
     
     def draw_difficulty_buttons(self):
         """绘制难度选择按钮"""
@@ -699,7 +1238,7 @@ class Game:
         y = 400  # 将游戏模式选择按钮向上移动到400
         
         # 模式选择按钮
-        mode_text = self.small_font.render("游戏模式:", True, TEXT_COLOR)
+        mode_text = self._render_text(self.small_font, "游戏模式:", TEXT_COLOR)
         self.screen.blit(mode_text, (50, y))
         
         # 添加困难模式选项
@@ -718,15 +1257,30 @@ class Game:
                 border_color = (100, 130, 170)
                 border_width = 1
                 
-            pygame.draw.rect(self.screen, color, rect, border_radius=8)
-            pygame.draw.rect(self.screen, border_color, rect, border_width, border_radius=8)
-            text = self.small_font.render(mode, True, BUTTON_TEXT_COLOR)
+            self.screen.rect(color, rect, border_radius=8)
+            self.screen.rect(border_color, rect, border_width, border_radius=8)
+            text = self._render_text(self.small_font, mode, BUTTON_TEXT_COLOR)
             self.screen.blit(text, (rect.x + (rect.width - text.get_width())//2, rect.y + 5))
             buttons.append((mode_value, rect))
         
+        # 棋盘数量选择按钮
+        boards_text = self._render_text(self.small_font, "棋盘:", TEXT_COLOR)
+        self.screen.blit(boards_text, (460, y + 5))
+        for i, num in enumerate(BOARD_OPTIONS):
+            rect = pygame.Rect(510 + i * 50, y, 40, 30)
+            if self.num_boards == num:
+                color, border_color, border_width = (120, 180, 255), (180, 220, 255), 2
+            else:
+                color, border_color, border_width = (60, 90, 130), (100, 130, 170), 1
+            self.screen.rect(color, rect, border_radius=8)
+            self.screen.rect(border_color, rect, border_width, border_radius=8)
+            text = self._render_text(self.small_font, str(num), BUTTON_TEXT_COLOR)
+            self.screen.blit(text, (rect.x + (rect.width - text.get_width())//2, rect.y + 5))
+            buttons.append((('boards', num), rect))
+        
         # 颜色数量选择按钮
         y += 50  # 增加间距，从50改为70，避免按钮重叠
-        num_text = self.small_font.render("颜色数量:", True, TEXT_COLOR)
+        num_text = self._render_text(self.small_font, "颜色数量:", TEXT_COLOR)
         self.screen.blit(num_text, (50, y))
         
         for i, num in enumerate([4, 5, 6, 7]):
@@ -741,69 +1295,55 @@ class Game:
                 border_color = (100, 130, 170)
                 border_width = 1
                 
-            pygame.draw.rect(self.screen, color, rect, border_radius=8)
-            pygame.draw.rect(self.screen, border_color, rect, border_width, border_radius=8)
-            text = self.small_font.render(str(num), True, BUTTON_TEXT_COLOR)
+            self.screen.rect(color, rect, border_radius=8)
+            self.screen.rect(border_color, rect, border_width, border_radius=8)
+            text = self._render_text(self.small_font, str(num), BUTTON_TEXT_COLOR)
             self.screen.blit(text, (rect.x + 15, rect.y + 5))
             buttons.append((num, rect))
         
+        # AI对战开关
+        rect = pygame.Rect(450, y, 110, 30)
+        if self.race_mode:
+            color, border_color, border_width = (120, 180, 255), (180, 220, 255), 2
+        else:
+            color, border_color, border_width = (60, 90, 130), (100, 130, 170), 1
+        self.screen.rect(color, rect, border_radius=8)
+        self.screen.rect(border_color, rect, border_width, border_radius=8)
+        text = self._render_text(self.small_font, f"AI对战: {'开' if self.race_mode else '关'}", BUTTON_TEXT_COLOR)
+        self.screen.blit(text, (rect.x + (rect.width - text.get_width())//2, rect.y + 5))
+        buttons.append(('race', rect))
+        
         return buttons
 
-    def check_guess(self, guess):
-        """检查猜测结果，返回反馈列表"""
-        # 在简单模式下，反馈需要与位置对应
-        if self.difficulty == 'easy':
-            feedback = [GRAY] * self.code_length
-            
-            # 创建临时列表以跟踪已匹配的位置
-            secret_copy = self.secret_code.copy()
-            guess_copy = guess.copy()
-            
-            # 首先检查位置和颜色都正确的
-            for i in range(self.code_length):
-                if guess[i] == self.secret_code[i]:
-                    feedback[i] = GREEN
-                    secret_copy[i] = guess_copy[i] = -1
-            
-            # 然后检查颜色正确但位置错误的
-            for i in range(self.code_length):
-                if guess_copy[i] != -1:
-                    for j in range(self.code_length):
-                        if secret_copy[j] == guess_copy[i] and secret_copy[j] != -1:
-                            feedback[i] = WHITE
-                            secret_copy[j] = -1
-                            break
-            
-            return feedback
-        else:  # 中等模式（原困难模式）
-            feedback = []
-            # 创建临时列表以跟踪已匹配的位置
-            secret_copy = self.secret_code.copy()
-            guess_copy = guess.copy()
-            
-            # 首先检查位置和颜色都正确的
-            for i in range(self.code_length):
-                if guess[i] == self.secret_code[i]:
-                    feedback.append(GREEN)
-                    secret_copy[i] = guess_copy[i] = -1
-            
-            # 然后检查颜色正确但位置错误的
-            for i in range(self.code_length):
-                if guess_copy[i] != -1:
-                    for j in range(self.code_length):
-                        if secret_copy[j] == guess_copy[i] and secret_copy[j] != -1:
-                            feedback.append(WHITE)
-                            secret_copy[j] = -1
-                            break
-            
-            # 添加灰色反馈，确保总数为4个
-            while len(feedback) < self.code_length:
-                feedback.append(GRAY)
+    def _draw_stats_panel(self):
+        """绘制战绩统计 - 只在配置切换或有新数据写入时重新查询和渲染"""
+        if not self.stats_store:
+            return
+        
+        cache_key = (self.stats_difficulty(), self.num_colors, self.stats_store.version)
+        if cache_key != self.stats_cache_key:
+            self.stats_cache_key = cache_key
+            try:
+                summary = self.stats_store.get_summary(self.stats_difficulty(), self.num_colors)
+            except sqlite3.Error as e:
+                print(f"读取战绩失败: {e}")
+                self.stats_surfaces = []
+                return
             
-            return feedback
+            lines = [f"战绩: {summary['games']}局 | 胜率 {summary['win_rate']:.0%} | "
+                     f"当前连胜 {summary['current_streak']} | 最佳连胜 {summary['best_streak']}"]
+            if summary['distribution']:
+                distribution = "  ".join(f"{n}次: {count}" for n, count in summary['distribution'].items())
+                lines.append(f"猜测分布: {distribution}")
+            self.stats_surfaces = [self.small_font.render(line, True, (200, 200, 200)) for line in lines]
+        
+        for i, surface in enumerate(self.stats_surfaces):
+            self.screen.blit(surface, (50, 580 + i * 25))
 
-    def draw_feedback(self, feedback, x, y, is_easy_mode):
-        """绘制反馈指示器"""
+    def draw_feedback(self, feedback, x, y, is_easy_mode, surface=None):
+        """绘制反馈指示器，默认绘制到屏幕"""
+        if surface is None:
+            surface = self.screen
         if is_easy_mode:
             # 简单模式：在色块下方显示反馈，与位置对应
             # 反馈已经与位置对应，直接绘制
@@ -815,7 +1355,7 @@ class Game:
                 rect_height = 6  # 稍微减小高度
                 
                 # 使用与色块相同的圆角半径
-                pygame.draw.rect(self.screen, feedback[i], 
+                surface.rect(feedback[i], 
                                (rect_x, rect_y, rect_width, rect_height),
                                border_radius=3)
         else:
@@ -837,10 +1377,28 @@ class Game:
             # 绘制反馈点
             for i, color in enumerate(sorted_feedback):
                 if i < 4:  # 确保不超出位置数量
-                    pygame.draw.circle(self.screen, color, positions[i], 4)  # 减小圆点大小
+                    surface.circle(color, positions[i], 4)  # 减小圆点大小
 
-    def draw_block(self, color_idx, x, y):
-        """绘制单个色块"""
+    def draw_block(self, color_idx, x, y, surface=None, size=BLOCK_SIZE):
+        """绘制单个色块，默认绘制到屏幕 - 每种颜色和大小的色块只渲染一次精灵"""
+        if surface is None:
+            surface = self.screen
+        surface.blit(self._block_sprite(color_idx, size), (x, y))
+    
+    def _block_sprite(self, color_idx, size):
+        sprite = self.block_sprites.get((color_idx, size))
+        if sprite is None:
+            if size == BLOCK_SIZE:
+                sprite = pygame.Surface((BLOCK_SIZE, BLOCK_SIZE), pygame.SRCALPHA)
+                self._render_block(color_idx, 0, 0, SurfaceCanvas(sprite))
+            else:
+                # 多棋盘模式的小色块由标准色块缩放得到
+                sprite = pygame.transform.smoothscale(self._block_sprite(color_idx, BLOCK_SIZE), (size, size))
+            self.block_sprites[(color_idx, size)] = sprite
+        return sprite
+    
+    def _render_block(self, color_idx, x, y, surface):
+        """把色块绘制到指定画布"""
         # 统一的圆角半径
         block_radius = 8
         # 暗金色边框颜色
@@ -852,7 +1410,7 @@ class Game:
             base_color = COLORS[color_idx]
             
             # 绘制底色 - 使用圆角矩形
-            pygame.draw.rect(self.screen, base_color, (x, y, BLOCK_SIZE, BLOCK_SIZE), border_radius=block_radius)
+            surface.rect(base_color, (x, y, BLOCK_SIZE, BLOCK_SIZE), border_radius=block_radius)
             
             # 创建方形渐变效果
             # 计算内部方形的大小和位置
@@ -864,12 +1422,12 @@ class Game:
             lighter_color = tuple(min(c + 100, 255) for c in base_color)
             
             # 绘制内部方形渐变
-            pygame.draw.rect(self.screen, lighter_color, 
+            surface.rect(lighter_color, 
                            (inner_x, inner_y, inner_size, inner_size), 
                            border_radius=block_radius-2)  # 内部方形的圆角稍小
             
             # 绘制色块边框 - 使用暗金色和加粗边框
-            pygame.draw.rect(self.screen, border_color, (x, y, BLOCK_SIZE, BLOCK_SIZE), border_width, border_radius=block_radius)
+            surface.rect(border_color, (x, y, BLOCK_SIZE, BLOCK_SIZE), border_width, border_radius=block_radius)
             
             # 在色块中间显示数字
             if color_idx >= 0:
@@ -878,10 +1436,10 @@ class Game:
                 # 渲染数字
                 number_text = self.font.render(str(color_idx + 1), True, text_color)
                 text_rect = number_text.get_rect(center=(x + BLOCK_SIZE//2, y + BLOCK_SIZE//2))
-                self.screen.blit(number_text, text_rect)
+                surface.blit(number_text, text_rect)
         else:
             # 绘制空色块 - 使用圆角矩形
-            pygame.draw.rect(self.screen, (50, 50, 50), (x, y, BLOCK_SIZE, BLOCK_SIZE), border_radius=block_radius)
+            surface.rect((50, 50, 50), (x, y, BLOCK_SIZE, BLOCK_SIZE), border_radius=block_radius)
             
             # 为空色块也添加方形渐变效果
             inner_size = int(BLOCK_SIZE * 0.5)
@@ -890,41 +1448,46 @@ class Game:
             
             # 创建一个稍微亮一点的颜色
             lighter_gray = (80, 80, 80)
-            pygame.draw.rect(self.screen, lighter_gray, 
+            surface.rect(lighter_gray, 
                            (inner_x, inner_y, inner_size, inner_size), 
                            border_radius=block_radius-2)
             
             # 空色块也使用相同的暗金色边框
-            pygame.draw.rect(self.screen, border_color, (x, y, BLOCK_SIZE, BLOCK_SIZE), border_width, border_radius=block_radius)
+            surface.rect(border_color, (x, y, BLOCK_SIZE, BLOCK_SIZE), border_width, border_radius=block_radius)
             
             # 在空色块中显示 "0"
             text_color = (150, 150, 150)  # 使用灰色显示空色块的数字
             number_text = self.font.render("0", True, text_color)
             text_rect = number_text.get_rect(center=(x + BLOCK_SIZE//2, y + BLOCK_SIZE//2))
-            self.screen.blit(number_text, text_rect)
+            surface.blit(number_text, text_rect)
 
     def draw_game_state(self):
         """绘制游戏状态"""
         if self.game_over:
             if self.win:
                 # 为胜利文本添加闪烁效果
-                pulse = (math.sin(pygame.time.get_ticks() * 0.01) + 1) * 0.5  # 0到1之间的脉冲值
+                pulse = (math.sin(self.sim_clock.render_time * 10) + 1) * 0.5  # 0到1之间的脉冲值
                 size_factor = 1.0 + pulse * 0.3  # 大小变化因子
                 # 使用支持中文的字体，而不是默认字体
                 victory_font_size = int(36 * size_factor)  # 计算脉动的字体大小
                 # 使用与游戏其他部分相同的字体，确保中文正确显示
                 text = "恭喜你猜对了！"
-                text_surface = self.font.render(text, True, (80, 200, 80))
-                # 创建一个临时表面来实现缩放效果
-                scaled_surface = pygame.transform.scale(text_surface, 
-                                                      (int(text_surface.get_width() * size_factor),
-                                                       int(text_surface.get_height() * size_factor)))
-                text_rect = scaled_surface.get_rect(center=(SCREEN_WIDTH//2, 50))
-                self.screen.blit(scaled_surface, text_rect)
+                text_surface = self._render_text(self.font, text, (80, 200, 80))
+                # 按脉冲缩放绘制
+                text_rect = pygame.Rect(0, 0, int(text_surface.get_width() * size_factor),
+                                        int(text_surface.get_height() * size_factor))
+                text_rect.center = (SCREEN_WIDTH//2, 50)
+                self.screen.blit_scaled(text_surface, text_rect)
+            elif self.boards:
+                # 多棋盘模式的密码显示在各个棋盘上
+                solved = sum(1 for board in self.boards if board.solved)
+                text = f"游戏结束！猜中了 {solved}/{len(self.boards)} 个棋盘"
+                text_surface = self._render_text(self.font, text, TEXT_COLOR)
+                self.screen.blit(text_surface, text_surface.get_rect(center=(SCREEN_WIDTH//2, 50)))
             else:
                 # 使用色块显示正确答案而不是中文
                 text = "游戏结束！正确答案是: "
-                text_surface = self.font.render(text, True, TEXT_COLOR)
+                text_surface = self._render_text(self.font, text, TEXT_COLOR)
                 text_rect = text_surface.get_rect(midleft=(SCREEN_WIDTH//2 - 200, 50))
                 self.screen.blit(text_surface, text_rect)
                 
@@ -932,14 +1495,14 @@ class Game:
                 for i, color_idx in enumerate(self.secret_code):
                     x = text_rect.right + 10 + i * (BLOCK_SIZE//2 + 5)
                     y = text_rect.centery - BLOCK_SIZE//4
-                    pygame.draw.rect(self.screen, COLORS[color_idx], 
+                    self.screen.rect(COLORS[color_idx], 
                                     (x, y, BLOCK_SIZE//2, BLOCK_SIZE//2), 
                                     border_radius=4)
         else:
             # 显示剩余猜测次数
-            remaining = MAX_GUESSES - len(self.guesses)
+            remaining = self.guess_limit - len(self.guesses)
             text = f"剩余猜测次数: {remaining}"
-            text_surface = self.font.render(text, True, TEXT_COLOR)
+            text_surface = self._render_text(self.font, text, TEXT_COLOR)
             text_rect = text_surface.get_rect(center=(SCREEN_WIDTH//2, 50))
             self.screen.blit(text_surface, text_rect)
             
@@ -951,22 +1514,31 @@ class Game:
             else:
                 mode_name = "困难"
                 
-            mode_text = f"模式: {mode_name} | 颜色数量: {self.num_colors}"
-            mode_surface = self.small_font.render(mode_text, True, TEXT_COLOR)
+            mode_text = f"模式: {mode_name} | 颜色数量: {self.num_colors} | 谜题 #{self.puzzle_id}"
+            if self.boards:
+                mode_text += f" | 棋盘: {len(self.boards)}"
+            mode_surface = self._render_text(self.small_font, mode_text, TEXT_COLOR)
             self.screen.blit(mode_surface, (MARGIN, 20))
 
     def draw_color_selector(self):
         """绘制颜色选择器"""
         selector_y = SCREEN_HEIGHT - 100
         
+        # 当前位置不可能的颜色变暗显示
+        domain = self._position_domain(self.current_position)
+        if self.dim_overlay is None:
+            self.dim_overlay = pygame.Surface((BLOCK_SIZE, BLOCK_SIZE), pygame.SRCALPHA)
+            self.dim_overlay.fill((*BG_COLOR, 170))
+        
         # 绘制颜色选择器
         for i in range(self.num_colors):
             x = MARGIN + i * (BLOCK_SIZE + MARGIN)
             self.draw_block(i, x, selector_y)
+            if not domain >> i & 1:
+                self.screen.blit(self.dim_overlay, (x, selector_y))
             
         # 绘制颜色选择器标题
-        title_text = self.small_font.render("可选颜色:", True, TEXT_COLOR)
-        self.screen.blit(title_text, (MARGIN, selector_y - 25))
+        self.screen.blit(self.cached_text['color_selector'], (MARGIN, selector_y - 25))
     
     def draw_buttons(self):
         """绘制控制按钮"""
@@ -976,22 +1548,22 @@ class Game:
         
         # 绘制提交按钮 - 使用圆角矩形
         color = BUTTON_HOVER_COLOR if submit_rect.collidepoint(pygame.mouse.get_pos()) else BUTTON_COLOR
-        pygame.draw.rect(self.screen, color, submit_rect, border_radius=10)
-        submit_text = self.small_font.render("提交(Enter)", True, BUTTON_TEXT_COLOR)
+        self.screen.rect(color, submit_rect, border_radius=10)
+        submit_text = self.cached_text['submit_button']
         self.screen.blit(submit_text, (submit_rect.centerx - submit_text.get_width()//2,
                                      submit_rect.centery - submit_text.get_height()//2))
         
         # 绘制再来一局按钮 - 使用圆角矩形
         color = BUTTON_HOVER_COLOR if reset_rect.collidepoint(pygame.mouse.get_pos()) else BUTTON_COLOR
-        pygame.draw.rect(self.screen, color, reset_rect, border_radius=10)
-        reset_text = self.small_font.render("再来一局(R)", True, BUTTON_TEXT_COLOR)
+        self.screen.rect(color, reset_rect, border_radius=10)
+        reset_text = self.cached_text['reset_button']
         self.screen.blit(reset_text, (reset_rect.centerx - reset_text.get_width()//2,
                                     reset_rect.centery - reset_text.get_height()//2))
         
         # 绘制返回主菜单按钮 - 使用圆角矩形
         color = BUTTON_HOVER_COLOR if menu_rect.collidepoint(pygame.mouse.get_pos()) else BUTTON_COLOR
-        pygame.draw.rect(self.screen, color, menu_rect, border_radius=10)
-        menu_text = self.small_font.render("主菜单(Esc)", True, BUTTON_TEXT_COLOR)
+        self.screen.rect(color, menu_rect, border_radius=10)
+        menu_text = self.cached_text['menu_button']
         self.screen.blit(menu_text, (menu_rect.centerx - menu_text.get_width()//2,
                                    menu_rect.centery - menu_text.get_height()//2))
         
@@ -1000,10 +1572,11 @@ class Game:
     # 添加确认对话框绘制函数
     def draw_confirm_dialog(self):
         """绘制返回主菜单的确认对话框"""
-        # 半透明背景
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 128))  # 黑色半透明
-        self.screen.blit(overlay, (0, 0))
+        # 半透明背景 - 只创建一次
+        if self.overlay is None:
+            self.overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+            self.overlay.fill((0, 0, 0, 128))  # 黑色半透明
+        self.screen.blit(self.overlay, (0, 0))
         
         # 增加对话框尺寸，确保文字能够完全显示
         dialog_width, dialog_height = 350, 170  # 增加宽度和高度
@@ -1011,40 +1584,37 @@ class Game:
         dialog_y = (SCREEN_HEIGHT - dialog_height) // 2
         
         # 绘制对话框背景
-        pygame.draw.rect(self.screen, (60, 70, 90), 
+        self.screen.rect((60, 70, 90), 
                         (dialog_x, dialog_y, dialog_width, dialog_height),
                         border_radius=15)
-        pygame.draw.rect(self.screen, (100, 120, 150), 
+        self.screen.rect((100, 120, 150), 
                         (dialog_x, dialog_y, dialog_width, dialog_height),
                         2, border_radius=15)
         
         # 绘制标题
-        title_text = self.font.render("返回主菜单", True, (255, 255, 255))
+        title_text = self._render_text(self.font, "返回主菜单", (255, 255, 255))
         self.screen.blit(title_text, (dialog_x + (dialog_width - title_text.get_width())//2, dialog_y + 25))
         
         # 绘制提示文本 - 确保文字不会超出对话框
-        prompt_text = self.small_font.render("确定要返回主菜单吗？当前进度将丢失。", True, (220, 220, 220))
+        prompt_text = self._render_text(self.small_font, "确定要返回主菜单吗？当前进度将丢失。", (220, 220, 220))
         self.screen.blit(prompt_text, (dialog_x + (dialog_width - prompt_text.get_width())//2, dialog_y + 70))
         
         # 调整按钮位置，使其更加分散
         # 确认按钮
         confirm_rect = pygame.Rect(dialog_x + 70, dialog_y + 120, 80, 30)  # 调整Y坐标
         confirm_color = (100, 180, 100) if confirm_rect.collidepoint(pygame.mouse.get_pos()) else (80, 150, 80)
-        pygame.draw.rect(self.screen, confirm_color, confirm_rect, border_radius=8)
-        confirm_text = self.small_font.render("确定(Y)", True, (255, 255, 255))
+        self.screen.rect(confirm_color, confirm_rect, border_radius=8)
+        confirm_text = self._render_text(self.small_font, "确定(Y)", (255, 255, 255))
         self.screen.blit(confirm_text, (confirm_rect.centerx - confirm_text.get_width()//2, 
                                       confirm_rect.centery - confirm_text.get_height()//2))
         
         # 取消按钮
         cancel_rect = pygame.Rect(dialog_x + 200, dialog_y + 120, 80, 30)  # 调整X坐标和Y坐标
         cancel_color = (180, 100, 100) if cancel_rect.collidepoint(pygame.mouse.get_pos()) else (150, 80, 80)
-        pygame.draw.rect(self.screen, cancel_color, cancel_rect, border_radius=8)
-        cancel_text = self.small_font.render("取消(N)", True, (255, 255, 255))
+        self.screen.rect(cancel_color, cancel_rect, border_radius=8)
+        cancel_text = self._render_text(self.small_font, "取消(N)", (255, 255, 255))
         self.screen.blit(cancel_text, (cancel_rect.centerx - cancel_text.get_width()//2, 
                                      cancel_rect.centery - cancel_text.get_height()//2))
-        
-        # 更新显示
-        pygame.display.update()
 
 def setup_input_method():
     """设置输入法，返回原始输入法状态"""
@@ -1101,9 +1671,33 @@ def restore_input_method(original_keyboard_layout):
         print(f"恢复输入法失败: {e}")
 
 if __name__ == "__main__":
-    # 设置一个简单的环境变量来强制使用软件渲染
+    import argparse
     import os
-    os.environ['SDL_VIDEODRIVER'] = 'windib'  # 在Windows上使用windib驱动
+    
+    # 启动参数：渲染后端
+    parser = argparse.ArgumentParser(description="色块解谜游戏")
+    parser.add_argument('--renderer', choices=BACKENDS, default=SOFTWARE,
+                        help="渲染后端：software 为软件渲染，texture 为 SDL2 纹理渲染（不可用时自动退回软件渲染）")
+    parser.add_argument('--max-guesses', type=guess_count, default=MAX_GUESSES,
+                        help="每局最多猜测次数，超过一屏时历史猜测可以滚动查看")
+    parser.add_argument('--boards', type=int, choices=range(1, MAX_BOARDS + 1), default=1, metavar='N',
+                        help="同时破解的棋盘数量（1-8），所有棋盘共用同一串猜测")
+    puzzle_group = parser.add_mutually_exclusive_group()
+    puzzle_group.add_argument('--puzzle', type=int, metavar='N',
+                              help="玩指定编号的谜题（界面上显示的谜题编号），同一编号和配置总是同一题")
+    puzzle_group.add_argument('--daily', nargs='?', const='', metavar='YYYY-MM-DD',
+                              help="玩每日谜题（默认今天），所有玩家同一天得到同一题")
+    parser.add_argument('--record-input', metavar='FILE',
+                        help="把键盘和鼠标输入录制到文件，可用 replay.py 回放")
+    parser.add_argument('--capture', metavar='DIR', nargs='?', const='',
+                        help="启动后立即录制画面（默认写入 captures/ 下按时间命名的目录），游戏中也可以按 F8 开始/结束")
+    parser.add_argument('--capture-format', choices=FORMATS, default=PNG,
+                        help="画面录制格式：png 为编号的 PNG 序列，raw 为 RGB24 原始帧流")
+    parser.add_argument('--celebration', choices=CELEBRATION_MODES, default=LIVE,
+                        help="胜利时的烟花：live 为实时模拟粒子，baked 为播放预先烘焙的烟花帧（低功耗）")
+    parser.add_argument('--spectate', metavar='[HOST:]PORT', nargs='?', const='',
+                        help="开启旁观服务（默认 127.0.0.1:7654），其他人可以用 spectate.py 实时观看对局")
+    args = parser.parse_args()
     
     # 确保pygame已初始化
     if not pygame.get_init():
@@ -1111,10 +1705,35 @@ if __name__ == "__main__":
     
     original_keyboard_layout = None
     game = None
+    recorder = None
     
     try:
+        # 每日谜题的编号由日期决定
+        puzzle_id = args.puzzle
+        if args.daily is not None:
+            import datetime
+            date = datetime.date.fromisoformat(args.daily) if args.daily else None
+            puzzle_id = daily_puzzle_id(date)
+            print(f"每日谜题 #{puzzle_id}")
+        
+        # 录制输入时固定随机种子，回放时才能得到相同的谜题
+        if args.record_input:
+            from replay import InputRecorder
+            seed = random.randrange(2**32)
+            random.seed(seed)
+            recorder = InputRecorder(args.record_input, seed, args.renderer, puzzle_id, args.boards,
+                                     args.max_guesses, args.celebration)
+        
         # 创建游戏实例
-        game = Game()
+        game = Game(args.renderer, max_guesses=args.max_guesses, puzzle_id=puzzle_id, celebration=args.celebration)
+        game.input_recorder = recorder
+        game.num_boards = args.boards
+        game.capture_format = args.capture_format
+        if args.capture is not None:
+            game.start_capture(args.capture or None)
+        if args.spectate is not None:
+            from spectate import start_spectator_server
+            start_spectator_server(game, args.spectate)
         
         # 设置输入法
         original_keyboard_layout = setup_input_method()
@@ -1130,6 +1749,25 @@ if __name__ == "__main__":
         # 在退出前恢复原始输入法状态
         restore_input_method(original_keyboard_layout)
         
+        if recorder:
+            recorder.close()
+        
+        # 写完队列中剩余的画面
+        if game:
+            game.stop_capture()
+        
+        # 断开所有旁观者
+        if game and game.broadcaster:
+            game.broadcaster.close()
+        
+        # 停止后台准备下一局的线程
+        if game and game.prefetcher:
+            game.prefetcher.close()
+        
+        # 写完尚未落盘的战绩
+        if game and game.stats_store:
+            game.stats_store.close()
+        
         # 确保程序不会立即退出
         pygame.quit()
         # 修复：使用更安全的方式等待用户输入
@@ -0,0 +1,138 @@
+import json
+import os
+
+from solver import POSITIONAL, COUNTS, STRATEGIES, all_codes, best_guess, score, winning_outcome
+
+# 开局库文件默认位置（与游戏脚本同目录）
+OPENING_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.json')
+
+# 默认生成的配置：两种反馈模式 × 游戏中可选的颜色数量，密码长度为4
+DEFAULT_MODES = (POSITIONAL, COUNTS)
+DEFAULT_NUM_COLORS = (4, 5, 6, 7)
+DEFAULT_CODE_LENGTHS = (4,)
+DEFAULT_DEPTH = 3
+
+
+def book_key(mode, num_colors, code_length, allow_repeats=False):
+    """开局库中某个配置的键"""
+    return f"{mode}-{num_colors}-{code_length}{'-r' if allow_repeats else ''}"
+
+
+def encode_code(code):
+    """密码编码为紧凑的数字字符串，例如 (0, 1, 2, 3) -> '0123'"""
+    return ''.join(str(c) for c in code)
+
+
+def decode_code(text):
+    return tuple(int(c) for c in text)
+
+
+def build_tree(codes, candidates, mode, strategy, depth):
+    """用求解器生成一棵深度为 depth 的开局树
+
+    节点格式为 {'g': 猜测, 'r': {反馈编码: 子节点}}，
+    depth 为1时只保存该步的猜测，候选只剩一个时直接保存答案。
+    """
+    guess = best_guess(candidates, codes, mode, strategy)
+    node = {'g': encode_code(guess)}
+    if depth <= 1 or len(candidates) <= 1:
+        return node
+
+    parts = {}
+    for secret in candidates:
+        parts.setdefault(score(guess, secret, mode), []).append(secret)
+
+    win = winning_outcome(len(guess), mode)
+    replies = {}
+    for outcome in sorted(parts):
+        if outcome == win:
+            continue
+        replies[str(outcome)] = build_tree(codes, parts[outcome], mode, strategy, depth - 1)
+    node['r'] = replies
+    return node
+
+
+class OpeningBook:
+    """预先计算的开局库：每个配置的最佳首次猜测以及每种反馈下的最佳应对"""
+
+    _cache = {}
+
+    def __init__(self, data):
+        self.strategy = data['strategy']
+        self.depth = data['depth']
+        self.books = data['books']
+
+    @classmethod
+    def load(cls, path=OPENING_BOOK_PATH):
+        """读取开局库，文件不存在或损坏时返回 None"""
+        if path not in cls._cache:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    cls._cache[path] = cls(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"加载开局库失败: {e}")
+                cls._cache[path] = None
+        return cls._cache[path]
+
+    def lookup(self, mode, num_colors, code_length, history, strategy, allow_repeats=False):
+        """沿历史猜测查找下一步猜测，历史偏离开局库时返回 None"""
+        if strategy != self.strategy:
+            return None
+        node = self.books.get(book_key(mode, num_colors, code_length, allow_repeats))
+        for guess, outcome in history:
+            if node is None or node['g'] != encode_code(guess):
+                return None
+            node = node.get('r', {}).get(str(outcome))
+        if node is None:
+            return None
+        return decode_code(node['g'])
+
+
+def build_book(modes=DEFAULT_MODES, num_colors_options=DEFAULT_NUM_COLORS,
+               code_lengths=DEFAULT_CODE_LENGTHS, depth=DEFAULT_DEPTH, strategy='minimax'):
+    books = {}
+    for mode in modes:
+        for num_colors in num_colors_options:
+            for code_length in code_lengths:
+                if code_length > num_colors:
+                    continue
+                codes = all_codes(num_colors, code_length)
+                books[book_key(mode, num_colors, code_length)] = build_tree(codes, codes, mode, strategy, depth)
+                print(f"已生成 {book_key(mode, num_colors, code_length)}")
+    return {'strategy': strategy, 'depth': depth, 'books': books}
+
+
+def check_book(path=OPENING_BOOK_PATH):
+    """用当前求解器重新计算，检查开局库是否与之一致，返回不一致的配置列表"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    mismatched = []
+    for key, tree in data['books'].items():
+        mode, num_colors, code_length = key.split('-')[:3]
+        codes = all_codes(int(num_colors), int(code_length), key.endswith('-r'))
+        if build_tree(codes, codes, mode, data['strategy'], data['depth']) != tree:
+            mismatched.append(key)
+        print(f"{key}: {'不一致' if key in mismatched else '一致'}")
+    return mismatched
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='生成或校验开局库')
+    parser.add_argument('--check', action='store_true', help='用当前求解器校验已有的开局库')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help='开局库深度（猜测步数）')
+    parser.add_argument('--strategy', choices=STRATEGIES, default='minimax')
+    parser.add_argument('--colors', type=int, nargs='+', default=list(DEFAULT_NUM_COLORS))
+    parser.add_argument('--length', type=int, nargs='+', default=list(DEFAULT_CODE_LENGTHS))
+    parser.add_argument('--output', default=OPENING_BOOK_PATH)
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(1 if check_book(args.output) else 0)
+
+    book = build_book(DEFAULT_MODES, args.colors, args.length, args.depth, args.strategy)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(book, f, separators=(',', ':'), sort_keys=True)
+    print(f"开局库已写入 {args.output}")
@@ -0,0 +1,347 @@
+import itertools
+import json
+import math
+import os
+import time
+
+from opening_book import book_key, decode_code, encode_code
+from solver import POSITIONAL, COUNTS, all_codes, num_outcomes, score, winning_outcome
+
+# 精确最优策略文件默认位置（与游戏脚本同目录）
+OPTIMAL_STRATEGY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'optimal_strategy.json')
+
+# 决策树的策略名，求解器据此区分精确最优策略和启发式开局库
+OPTIMAL = 'optimal'
+
+# 默认最多猜测次数，与游戏的最大猜测次数一致
+DEFAULT_MAX_DEPTH = 7
+
+# 规范化时最多尝试的置换数量，超过时直接用候选集合本身作为置换表的键（仍然正确，只是少一些命中）
+CANONICAL_LIMIT = 64
+
+INF = float('inf')
+
+
+class OptimalSearch:
+    """计算某个配置下猜测总次数最少（即平均猜测次数最少）的策略
+
+    利用两种对称性缩小搜索：
+    - 颜色在出现于猜测之前可以互换，位置也可以互换（逐位置反馈时反馈随位置一起置换），
+      因此在保持已有猜测不变的置换群下等价的猜测只需搜索一个；
+    - 候选集合在颜色和位置置换下规范化后作为置换表的键，等价的子局面只计算一次。
+    搜索为带上下界剪枝的深度优先搜索，depth 为剩余可用的猜测次数。
+    """
+
+    def __init__(self, num_colors, code_length=4, mode=COUNTS):
+        self.num_colors = num_colors
+        self.code_length = code_length
+        self.mode = mode
+        self.codes = all_codes(num_colors, code_length)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.table = [[score(guess, secret, mode) for secret in self.codes] for guess in self.codes]
+        self.win = winning_outcome(code_length, mode)
+        self.branching = num_outcomes(code_length, mode)
+        self.tt = {}
+        self.nodes = 0
+
+    # ---- 对称性 ----
+
+    def _transform(self, element, code):
+        """置换 (q, π) 作用于密码：新密码第 i 位为 π[原密码第 q[i] 位]"""
+        q, colors = element
+        return tuple(colors[code[q[i]]] for i in range(self.code_length))
+
+    def _fixes_outcome(self, q, outcome):
+        """逐位置反馈时，位置置换还必须保持反馈不变"""
+        if self.mode != POSITIONAL:
+            return True
+        digits = [outcome // 3 ** i % 3 for i in range(self.code_length)]
+        return all(digits[q[i]] == digits[i] for i in range(self.code_length))
+
+    def _root_stabilizer(self, guess, outcome):
+        """第一步猜测后保持该猜测（及反馈）不变的全部置换"""
+        code = self.codes[guess]
+        others = [c for c in range(self.num_colors) if c not in code]
+        group = []
+        for q in itertools.permutations(range(self.code_length)):
+            if not self._fixes_outcome(q, outcome):
+                continue
+            for rest in itertools.permutations(others):
+                colors = [0] * self.num_colors
+                for i in range(self.code_length):
+                    colors[code[q[i]]] = code[i]
+                for src, dst in zip(others, rest):
+                    colors[src] = dst
+                group.append((q, tuple(colors)))
+        return group
+
+    def _stabilizer(self, group, guess, outcome):
+        code = self.codes[guess]
+        return [e for e in group if self._transform(e, code) == code and self._fixes_outcome(e[0], outcome)]
+
+    def _guess_orbits(self, group):
+        """在置换群下等价的猜测只保留编号最小的一个"""
+        if group is None:
+            # 根节点：所有不重复的密码在完整置换群下等价
+            return [0]
+        if len(group) <= 1:
+            return range(len(self.codes))
+        reps = set()
+        for code in self.codes:
+            reps.add(min(self.index[self._transform(e, code)] for e in group))
+        return sorted(reps)
+
+    def canonical(self, candidates):
+        """候选集合在颜色和位置置换下的规范形式
+
+        先按出现次数特征给颜色和位置排序，只在特征相同的颜色（位置）之间尝试全部排列，
+        取像集中字典序最小的一个。需要尝试的排列过多时直接返回候选集合本身。
+        """
+        counts = [[0] * self.code_length for _ in range(self.num_colors)]
+        for s in candidates:
+            for i, c in enumerate(self.codes[s]):
+                counts[c][i] += 1
+        color_sig = [tuple(sorted(row)) for row in counts]
+        pos_sig = [tuple(sorted(counts[c][i] for c in range(self.num_colors))) for i in range(self.code_length)]
+
+        color_groups = _tie_groups(range(self.num_colors), color_sig)
+        pos_groups = _tie_groups(range(self.code_length), pos_sig)
+        combos = 1
+        for g in color_groups + pos_groups:
+            combos *= math.factorial(len(g))
+        if combos > CANONICAL_LIMIT:
+            return tuple(sorted(candidates))
+
+        best = None
+        for pos_order in itertools.product(*(itertools.permutations(g) for g in pos_groups)):
+            q = [p for group in pos_order for p in group]
+            for color_order in itertools.product(*(itertools.permutations(g) for g in color_groups)):
+                colors = [0] * self.num_colors
+                for label, c in enumerate(c for group in color_order for c in group):
+                    colors[c] = label
+                image = sorted(self.index[tuple(colors[self.codes[s][q[i]]] for i in range(self.code_length))]
+                               for s in candidates)
+                if best is None or image < best:
+                    best = image
+        return tuple(best)
+
+    # ---- 搜索 ----
+
+    def lower_bound(self, n, depth):
+        """n 个候选在 depth 步内全部猜中所需总次数的下界（每步最多分出 branching-1 个分支）"""
+        total = 0
+        capacity = 1
+        level = 1
+        while n > 0:
+            if level > depth:
+                return INF
+            take = min(n, capacity)
+            total += take * level
+            n -= take
+            capacity *= self.branching - 1
+            level += 1
+        return total
+
+    def _partitions(self, candidates, group):
+        """枚举有用的猜测及其划分，相同划分只保留一个，按划分均匀程度排序"""
+        members = set(candidates)
+        seen = set()
+        options = []
+        for guess in self._guess_orbits(group):
+            row = self.table[guess]
+            parts = {}
+            for s in candidates:
+                parts.setdefault(row[s], []).append(s)
+            if len(parts) == 1 and guess not in members:
+                continue
+            signature = frozenset(tuple(p) for o, p in parts.items() if o != self.win)
+            if (signature, guess in members) in seen:
+                continue
+            seen.add((signature, guess in members))
+            children = [(o, p) for o, p in parts.items() if o != self.win]
+            children.sort(key=lambda item: -len(item[1]))
+            options.append((sum(len(p) ** 2 for _, p in children), guess not in members, guess, children))
+        options.sort(key=lambda item: item[:3])
+        return [(guess, children) for _, _, guess, children in options]
+
+    def _child_group(self, group, guess, outcome):
+        if group is None:
+            return self._root_stabilizer(guess, outcome)
+        if len(group) <= 1:
+            return group
+        return self._stabilizer(group, guess, outcome)
+
+    def solve(self, candidates, depth, group=None, bound=INF):
+        """返回在 depth 步内猜中全部候选所需的最少总次数
+
+        结果小于 bound 时为精确值，否则只保证不小于 bound。group 为保持已有猜测不变的置换，
+        None 表示根节点（完整置换群）。
+        """
+        n = len(candidates)
+        if n == 1:
+            return 1 if depth >= 1 else INF
+        if n == 2:
+            return 3 if depth >= 2 else INF
+        lower = self.lower_bound(n, depth)
+        if lower >= bound:
+            return lower
+
+        key = (self.canonical(candidates), depth)
+        entry = self.tt.get(key)
+        if entry is not None:
+            value, exact = entry
+            if exact or value >= bound:
+                return value
+            lower = max(lower, value)
+
+        self.nodes += 1
+        best = INF
+        for guess, children in self._partitions(candidates, group):
+            limit = min(best, bound)
+            bounds = [self.lower_bound(len(p), depth - 1) for _, p in children]
+            total = n + sum(bounds)
+            if total >= limit:
+                continue
+            for (outcome, part), child_lower in zip(children, bounds):
+                child_bound = limit - total + child_lower
+                value = self.solve(part, depth - 1, self._child_group(group, guess, outcome), child_bound)
+                total += value - child_lower
+                if total >= limit:
+                    break
+            else:
+                best = total
+                if best <= lower:
+                    break
+
+        if best < bound:
+            self.tt[key] = (best, True)
+            return best
+        self.tt[key] = (max(bound, lower), False)
+        return max(bound, lower)
+
+    def build_tree(self, candidates, depth, group=None):
+        """按搜索结果导出决策树，节点格式与开局库相同"""
+        if len(candidates) == 1:
+            return {'g': encode_code(self.codes[candidates[0]])}
+        value = self.solve(candidates, depth, group)
+        for guess, children in self._partitions(candidates, group):
+            total = len(candidates)
+            for outcome, part in children:
+                total += self.solve(part, depth - 1, self._child_group(group, guess, outcome))
+            if total == value:
+                node = {'g': encode_code(self.codes[guess])}
+                if children:
+                    node['r'] = {str(outcome): self.build_tree(part, depth - 1, self._child_group(group, guess, outcome))
+                                 for outcome, part in sorted(children)}
+                return node
+        raise RuntimeError("无法复现搜索结果")
+
+    def optimize(self, max_depth=DEFAULT_MAX_DEPTH, objective='expected'):
+        """返回 (决策树, 猜测总次数)；objective 为 worst 时先求最坏情况最少的步数"""
+        candidates = list(range(len(self.codes)))
+        if objective == 'worst':
+            depth = 1
+            while self.solve(candidates, depth) == INF:
+                depth += 1
+                if depth > max_depth:
+                    raise ValueError(f"{max_depth} 步内无法保证猜中")
+        else:
+            depth = max_depth
+        total = self.solve(candidates, depth)
+        if total == INF:
+            raise ValueError(f"{max_depth} 步内无法保证猜中")
+        return self.build_tree(candidates, depth), total
+
+
+def _tie_groups(items, signature):
+    """按特征排序并把特征相同的元素分为一组"""
+    groups = []
+    for _, group in itertools.groupby(sorted(items, key=lambda x: signature[x]), key=lambda x: signature[x]):
+        groups.append(list(group))
+    return groups
+
+
+def tree_stats(tree, num_colors, code_length, mode):
+    """用决策树破解全部密码，返回 (猜测总次数, 最坏次数)；树与反馈不一致时抛出 ValueError"""
+    win = winning_outcome(code_length, mode)
+    total = 0
+    worst = 0
+    for secret in all_codes(num_colors, code_length):
+        node = tree
+        guesses = 0
+        while True:
+            if node is None:
+                raise ValueError(f"决策树缺少密码 {secret} 的分支")
+            guess = decode_code(node['g'])
+            guesses += 1
+            outcome = score(guess, secret, mode)
+            if outcome == win:
+                break
+            node = node.get('r', {}).get(str(outcome))
+        total += guesses
+        worst = max(worst, guesses)
+    return total, worst
+
+
+def load_optimal_strategy(path=OPTIMAL_STRATEGY_PATH):
+    """读取精确最优策略（格式与开局库相同），文件不存在时返回 None"""
+    if not os.path.exists(path):
+        return None
+    from opening_book import OpeningBook
+    return OpeningBook.load(path)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='计算精确最优策略并导出为决策树')
+    parser.add_argument('--colors', type=int, nargs='+', default=[4, 5, 6, 7])
+    parser.add_argument('--length', type=int, default=4)
+    parser.add_argument('--mode', choices=(POSITIONAL, COUNTS), nargs='+', default=[POSITIONAL, COUNTS])
+    parser.add_argument('--objective', choices=('expected', 'worst'), default='expected',
+                        help='expected 为平均猜测次数最少；worst 为最坏情况步数最少，其次平均最少')
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_MAX_DEPTH, help='最多猜测次数')
+    parser.add_argument('--output', default=OPTIMAL_STRATEGY_PATH)
+    parser.add_argument('--check', action='store_true', help='校验已导出的决策树')
+    args = parser.parse_args()
+
+    if args.check:
+        with open(args.output, encoding='utf-8') as f:
+            data = json.load(f)
+        failed = False
+        for key, tree in data['books'].items():
+            mode, num_colors, code_length = key.split('-')[:3]
+            try:
+                total, worst = tree_stats(tree, int(num_colors), int(code_length), mode)
+            except ValueError as e:
+                print(f"{key}: {e}")
+                failed = True
+                continue
+            summary = data['summary'][key]
+            ok = (total, worst) == (summary['total'], summary['worst'])
+            failed = failed or not ok
+            print(f"{key}: 平均 {total / len(all_codes(int(num_colors), int(code_length))):.4f} 次，"
+                  f"最坏 {worst} 次，{'一致' if ok else '与记录不一致'}")
+        sys.exit(1 if failed else 0)
+
+    books = {}
+    summary = {}
+    for mode in args.mode:
+        for num_colors in args.colors:
+            start = time.perf_counter()
+            search = OptimalSearch(num_colors, args.length, mode)
+            tree, total = search.optimize(args.max_depth, args.objective)
+            _, worst = tree_stats(tree, num_colors, args.length, mode)
+            key = book_key(mode, num_colors, args.length)
+            books[key] = tree
+            summary[key] = {'total': total, 'worst': worst, 'expected': total / len(search.codes)}
+            print(f"{key}: 平均 {total / len(search.codes):.4f} 次（总 {total}），最坏 {worst} 次，"
+                  f"搜索 {search.nodes} 个节点，置换表 {len(search.tt)} 项，"
+                  f"耗时 {time.perf_counter() - start:.1f}s")
+
+    data = {'strategy': OPTIMAL, 'depth': args.max_depth, 'objective': args.objective,
+            'books': books, 'summary': summary}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'), sort_keys=True)
+    print(f"决策树已写入 {args.output}")
@@ -0,0 +1,126 @@
+import datetime
+import hashlib
+import struct
+
+from solver import COUNTS, score
+
+# 每日谜题 #1 对应的日期
+DAILY_EPOCH = datetime.date(2025, 1, 1)
+
+# 随机对局的谜题编号范围（编号会显示在界面上，可用 --puzzle 重玩）
+RANDOM_PUZZLE_LIMIT = 10 ** 9
+
+# 困难模式预填的猜测数量，以及生成时的最大尝试次数（防止无限循环）
+PREFILL_GUESSES = 5
+PREFILL_MAX_ATTEMPTS = 100
+
+# 谜题生成使用的独立随机流
+SECRET_STREAM = b'secret'
+PREFILL_STREAM = b'prefill'
+
+
+class CounterRNG:
+    """基于计数器的随机数生成器：第 i 个随机数为 BLAKE2b(key, stream, i)
+
+    不保存任何序列状态，同一个 key 在任何机器上得到相同的结果，
+    也可以用 at() 直接取出任意位置的随机数；不同 stream 的随机数互不影响。
+    """
+
+    def __init__(self, key, stream=b''):
+        self.key = key
+        self.stream = stream
+        self.counter = 0
+
+    def at(self, index):
+        """第 index 个 64 位随机数"""
+        digest = hashlib.blake2b(struct.pack('<Q', index), digest_size=8, key=self.key, person=self.stream)
+        return int.from_bytes(digest.digest(), 'little')
+
+    def next(self):
+        value = self.at(self.counter)
+        self.counter += 1
+        return value
+
+    def randbelow(self, n):
+        """[0, n) 内的均匀随机整数（拒绝采样，避免取模偏差）"""
+        limit = (1 << 64) - (1 << 64) % n
+        while True:
+            value = self.next()
+            if value < limit:
+                return value % n
+
+    def choice(self, seq):
+        return seq[self.randbelow(len(seq))]
+
+
+def daily_puzzle_id(date=None):
+    """日期对应的每日谜题编号（DAILY_EPOCH 为 #1）"""
+    date = date or datetime.date.today()
+    return (date - DAILY_EPOCH).days + 1
+
+
+def puzzle_key(puzzle_id, difficulty, num_colors, code_length, board=0):
+    """谜题编号和配置共同决定随机数的密钥（多棋盘模式下棋盘 0 与单棋盘的谜题相同）"""
+    text = f"colorcortex:{puzzle_id}:{difficulty}:{num_colors}:{code_length}"
+    if board:
+        text += f":{board}"
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=32).digest()
+
+
+def _distinct_code(rng, num_colors, code_length):
+    """生成一组颜色尽量不重复的代码（颜色用完后重新填充）"""
+    available_colors = list(range(num_colors))
+    code = []
+    for _ in range(code_length):
+        if not available_colors:
+            available_colors = list(range(num_colors))
+        color_idx = rng.choice(available_colors)
+        code.append(color_idx)
+        available_colors.remove(color_idx)
+    return code
+
+
+def generate_puzzle(puzzle_id, difficulty, num_colors, code_length, board=0):
+    """由谜题编号和配置生成谜题，返回 (密码, 预填的猜测列表)
+
+    只依赖参数本身，不读取也不改变全局 random 的状态，任意编号都可以直接重新生成；
+    board 为多棋盘模式的棋盘序号，每个棋盘的密码互相独立。
+    """
+    key = puzzle_key(puzzle_id, difficulty, num_colors, code_length, board)
+    secret = _distinct_code(CounterRNG(key, SECRET_STREAM), num_colors, code_length)
+
+    prefilled = []
+    if difficulty == 'hard':
+        rng = CounterRNG(key, PREFILL_STREAM)
+        for _ in range(PREFILL_MAX_ATTEMPTS):
+            if len(prefilled) >= PREFILL_GUESSES:
+                break
+            guess = _distinct_code(rng, num_colors, code_length)
+            if guess in prefilled:
+                continue
+            # 确保没有超过2个绿色反馈，且绿色+白色不超过3个
+            green, white = divmod(score(guess, secret, COUNTS), code_length + 1)
+            if green <= 2 and green + white <= 3:
+                prefilled.append(guess)
+    return secret, prefilled
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='按编号或日期重新生成谜题')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--id', type=int, help='谜题编号')
+    group.add_argument('--date', help='每日谜题的日期（YYYY-MM-DD），默认今天')
+    parser.add_argument('--difficulty', choices=('easy', 'medium', 'hard'), default='easy')
+    parser.add_argument('--colors', type=int, default=4)
+    parser.add_argument('--length', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.id is None:
+        date = datetime.date.fromisoformat(args.date) if args.date else None
+        args.id = daily_puzzle_id(date)
+    secret, prefilled = generate_puzzle(args.id, args.difficulty, args.colors, args.length)
+    print(f"谜题 #{args.id}（{args.difficulty}，{args.colors} 色）密码: {secret}")
+    for guess in prefilled:
+        print(f"预填猜测: {guess}")
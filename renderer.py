@@ -0,0 +1,211 @@
+from collections import OrderedDict
+
+import pygame
+
+# 可选的渲染后端
+SOFTWARE = 'software'
+TEXTURE = 'texture'
+BACKENDS = (SOFTWARE, TEXTURE)
+
+# 纹理缓存最多保留的表面数量（按最近使用淘汰）
+TEXTURE_CACHE_SIZE = 512
+
+# SDL_RENDERER_ACCELERATED 标志
+RENDERER_ACCELERATED = 0x00000002
+
+
+class SurfaceCanvas:
+    """在 pygame.Surface 上绘制的画布，接口与 Surface 和 pygame.draw 保持一致"""
+
+    name = SOFTWARE
+
+    def __init__(self, surface):
+        self.surface = surface
+
+    def get_size(self):
+        return self.surface.get_size()
+
+    def fill(self, color, rect=None):
+        self.surface.fill(color, rect)
+
+    def blit(self, source, dest, area=None):
+        self.surface.blit(source, dest, area)
+
+    def blit_scaled(self, source, rect):
+        """把表面缩放到 rect 的大小后绘制"""
+        rect = pygame.Rect(rect)
+        self.surface.blit(pygame.transform.scale(source, rect.size), rect)
+
+    def rect(self, color, rect, width=0, border_radius=0):
+        pygame.draw.rect(self.surface, color, rect, width, border_radius=border_radius)
+
+    def circle(self, color, center, radius):
+        pygame.draw.circle(self.surface, color, center, radius)
+
+    def particle(self, color, alpha, pos, size):
+        """绘制一个带透明度的圆形粒子，pos 为左上角"""
+        particle_surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(particle_surface, (*color, alpha), (size//2, size//2), size//2)
+        self.surface.blit(particle_surface, pos)
+
+    def present(self):
+        pass
+
+    def to_surface(self):
+        """返回当前画面（用于截图和录制）"""
+        return self.surface
+
+
+class SoftwareRenderer(SurfaceCanvas):
+    """软件渲染：所有绘制都在显示表面上完成"""
+
+    def __init__(self, size, caption):
+        super().__init__(pygame.display.set_mode(size))
+        pygame.display.set_caption(caption)
+
+    def present(self):
+        pygame.display.flip()
+
+
+class TextureRenderer:
+    """基于 pygame._sdl2.video 的渲染后端
+
+    色块、文字、圆角矩形和粒子精灵在第一次使用时上传为纹理，之后每帧只做纹理复制。
+    图形仍由 pygame.draw 栅格化，输出与软件渲染一致（半透明混合只有个位数的舍入差异）。
+    """
+
+    name = TEXTURE
+
+    def __init__(self, size, caption, accelerated=True):
+        from pygame._sdl2 import video
+
+        self._video = video
+        self.window = video.Window(caption, size)
+        try:
+            self.renderer = video.Renderer(self.window, accelerated=1 if accelerated else 0)
+        except video.error:
+            self.window.destroy()
+            raise
+        self.size = size
+        # id(表面) -> (表面, 纹理)；保留表面引用，避免 id 被复用
+        self._textures = OrderedDict()
+        self._shapes = OrderedDict()
+        self._particles = {}
+        self._scaled = OrderedDict()
+
+    def get_size(self):
+        return self.size
+
+    def _texture(self, surface):
+        key = id(surface)
+        entry = self._textures.get(key)
+        if entry is not None and entry[0] is surface:
+            self._textures.move_to_end(key)
+            return entry[1]
+
+        texture = self._video.Texture.from_surface(self.renderer, surface)
+        self._textures[key] = (surface, texture)
+        if len(self._textures) > TEXTURE_CACHE_SIZE:
+            self._textures.popitem(last=False)
+        return texture
+
+    def _shape(self, key, size, draw):
+        """把一个图形栅格化为纹理并缓存（按最近使用淘汰）"""
+        texture = self._shapes.get(key)
+        if texture is not None:
+            self._shapes.move_to_end(key)
+            return texture
+
+        surface = pygame.Surface(size, pygame.SRCALPHA)
+        draw(surface)
+        texture = self._shapes[key] = self._video.Texture.from_surface(self.renderer, surface)
+        if len(self._shapes) > TEXTURE_CACHE_SIZE:
+            self._shapes.popitem(last=False)
+        return texture
+
+    def fill(self, color, rect=None):
+        self.renderer.draw_color = pygame.Color(color)
+        if rect is None:
+            self.renderer.clear()
+        else:
+            self.renderer.fill_rect(pygame.Rect(rect))
+
+    def blit(self, source, dest, area=None):
+        texture = self._texture(source)
+        x, y = int(dest[0]), int(dest[1])
+        if area is None:
+            texture.draw(dstrect=(x, y, texture.width, texture.height))
+        else:
+            area = pygame.Rect(area)
+            texture.draw(srcrect=area, dstrect=(x, y, area.width, area.height))
+
+    def blit_scaled(self, source, rect):
+        # 与软件渲染一样用 pygame.transform.scale 缩放，缩放结果按尺寸缓存
+        rect = pygame.Rect(rect)
+        key = (id(source), rect.size)
+        entry = self._scaled.get(key)
+        if entry is None or entry[0] is not source:
+            entry = self._scaled[key] = (source, pygame.transform.scale(source, rect.size))
+            if len(self._scaled) > TEXTURE_CACHE_SIZE:
+                self._scaled.popitem(last=False)
+        self.blit(entry[1], rect)
+
+    def rect(self, color, rect, width=0, border_radius=0):
+        rect = pygame.Rect(rect)
+        color = tuple(color)
+        if width == 0 and border_radius <= 0:
+            self.fill(color, rect)
+            return
+        key = ('rect', color, rect.size, width, border_radius)
+        texture = self._shape(key, rect.size, lambda surface: pygame.draw.rect(
+            surface, color, surface.get_rect(), width, border_radius=border_radius))
+        texture.draw(dstrect=rect)
+
+    def circle(self, color, center, radius):
+        # 圆心放在纹理中央，保证栅格化结果与直接绘制一致；
+        # 与粒子一样每种半径只有一张白色纹理，颜色通过纹理调制实现（烟花粒子的颜色各不相同）
+        color = pygame.Color(color)
+        size = (radius * 2 + 2, radius * 2 + 2)
+        texture = self._shape(('circle', radius), size, lambda surface: pygame.draw.circle(
+            surface, (255, 255, 255, 255), (radius + 1, radius + 1), radius))
+        texture.color = color
+        texture.alpha = color.a
+        texture.draw(dstrect=(int(center[0]) - radius - 1, int(center[1]) - radius - 1, size[0], size[1]))
+
+    def particle(self, color, alpha, pos, size):
+        # 每种大小只有一张白色粒子纹理，颜色和透明度通过纹理调制实现
+        texture = self._particles.get(size)
+        if texture is None:
+            surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(surface, (255, 255, 255, 255), (size//2, size//2), size//2)
+            texture = self._particles[size] = self._video.Texture.from_surface(self.renderer, surface)
+        texture.color = color
+        texture.alpha = alpha
+        texture.draw(dstrect=(int(pos[0]), int(pos[1]), size, size))
+
+    def present(self):
+        self.renderer.present()
+
+    def to_surface(self):
+        return self.renderer.to_surface()
+
+
+def has_accelerated_renderer():
+    """是否存在支持硬件加速的渲染驱动"""
+    from pygame._sdl2 import video
+    return any(driver.flags & RENDERER_ACCELERATED for driver in video.get_drivers())
+
+
+def create_renderer(backend, size, caption):
+    """创建渲染后端，纹理渲染不可用时退回软件渲染"""
+    if backend == TEXTURE:
+        try:
+            if has_accelerated_renderer():
+                renderer = TextureRenderer(size, caption)
+                print("使用纹理渲染")
+                return renderer
+            print("没有可用的硬件加速渲染器，使用软件渲染")
+        except (ImportError, pygame.error, RuntimeError) as e:
+            # pygame._sdl2 的错误类型继承自 RuntimeError
+            print(f"创建纹理渲染器失败: {e}，使用软件渲染")
+    return SoftwareRenderer(size, caption)
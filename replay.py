@@ -0,0 +1,251 @@
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+import pygame
+from pygame.locals import KEYDOWN, MOUSEBUTTONDOWN
+
+from capture import FrameRecorder, FORMATS, PNG
+from celebration import CELEBRATION_MODES, LIVE
+from engine import MAX_GUESSES
+
+# 录制文件格式版本（2：谜题由编号生成，并记录固定的谜题编号；3：随机对局的编号来自独立的随机数流）
+RECORDING_VERSION = 3
+
+# 回放的默认帧率（尽快回放时每帧推进的虚拟时间为 1/帧率）
+REPLAY_FPS = 30
+
+
+class InputRecorder:
+    """把游戏中的键盘和鼠标输入按时间顺序写入 JSON Lines 文件
+
+    第一行记录随机种子、渲染后端、固定的谜题编号、棋盘数量、每局最多猜测次数和庆祝效果，
+    之后每行一个事件，t 为距离录制开始的秒数；
+    关闭时写入一条 end 记录，回放会一直运行到这个时间点。
+    """
+
+    def __init__(self, path, seed, renderer, puzzle_id=None, boards=1, max_guesses=MAX_GUESSES, celebration=LIVE):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.start = time.monotonic()
+        self._write({'version': RECORDING_VERSION, 'seed': seed, 'renderer': renderer, 'puzzle': puzzle_id,
+                     'boards': boards, 'max_guesses': max_guesses, 'celebration': celebration})
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def _elapsed(self):
+        return round(time.monotonic() - self.start, 4)
+
+    def record(self, event):
+        if event.type == KEYDOWN:
+            self._write({'t': self._elapsed(), 'type': 'key', 'key': event.key,
+                         'mod': event.mod, 'unicode': event.unicode})
+        elif event.type == MOUSEBUTTONDOWN:
+            self._write({'t': self._elapsed(), 'type': 'mouse',
+                         'pos': list(event.pos), 'button': event.button})
+
+    def close(self):
+        if self.file.closed:
+            return
+        self._write({'t': self._elapsed(), 'type': 'end'})
+        self.file.close()
+
+
+def load_recording(path):
+    """读取录制文件，返回 (文件头, 事件列表, 结束时间)"""
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records or records[0].get('version') != RECORDING_VERSION:
+        raise ValueError(f"不支持的录制文件: {path}")
+
+    header = records[0]
+    events = []
+    end_time = 0.0
+    for record in records[1:]:
+        end_time = max(end_time, record['t'])
+        if record['type'] == 'key':
+            event = pygame.event.Event(KEYDOWN, key=record['key'], mod=record.get('mod', 0),
+                                       unicode=record.get('unicode', ''))
+        elif record['type'] == 'mouse':
+            event = pygame.event.Event(MOUSEBUTTONDOWN, pos=tuple(record['pos']), button=record['button'])
+        else:
+            continue
+        events.append((record['t'], event))
+    return header, events, end_time
+
+
+def current_rss_kib():
+    """当前进程的常驻内存（KiB）；没有 /proc 时退回峰值 RSS"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reset_session(game, header):
+    """把游戏恢复到刚启动时的状态，并使用录制时的随机种子"""
+    game.stop_ai_racer()
+    random.seed(header['seed'])
+    # 与 Game.__init__ 相同的顺序：先取烟花的种子，再取谜题编号的种子
+    game.firework_manager.rng.seed(random.getrandbits(64))
+    game.puzzle_rng.seed(random.getrandbits(64))
+    game.race_mode = False
+    game.num_boards = header.get('boards', 1)
+    game.show_confirm_dialog = False
+    game.show_instructions = True
+    game.reset_game('easy', 4)
+
+
+def replay(path, loops=1, duration=None, realtime=False, fps=REPLAY_FPS, renderer=None,
+           capture=None, capture_format=PNG, celebration=None):
+    """回放录制的输入，返回性能报告
+
+    loops 为回放轮数；指定 duration（秒）时改为循环回放直到超时，用于长时间的内存泄漏测试。
+    realtime 为 False 时不等待，每帧推进固定的虚拟时间，尽快完成回放。
+    capture 为目录时把回放画面逐帧导出到该目录（等待写入，不丢帧）。
+    celebration 默认使用录制时的庆祝效果，指定后覆盖，用于比较两种庆祝效果的帧耗时。
+    """
+    header, events, end_time = load_recording(path)
+
+    # 必须在导入游戏之前选择视频驱动（main 在导入时初始化 pygame）
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import main
+
+    # 回放产生的对局写入临时数据库，不影响玩家的战绩
+    stats_dir = tempfile.mkdtemp(prefix='replay-stats-')
+    random.seed(header['seed'])
+    game = main.Game(renderer or header['renderer'], os.path.join(stats_dir, 'stats.db'),
+                     max_guesses=header.get('max_guesses', MAX_GUESSES), puzzle_id=header.get('puzzle'),
+                     celebration=celebration or header.get('celebration', LIVE))
+    game.num_boards = header.get('boards', 1)
+    # AI对战的猜测按模拟时钟到期时等待后台算出，尽快回放时也与录制时一致
+    game.block_ai = True
+    if capture:
+        game.frame_recorder = FrameRecorder(capture, capture_format, block=True)
+
+    frame_times = []
+    rss_samples = [current_rss_kib()]
+    frame_dt = 1 / fps
+    started = time.perf_counter()
+    loop = 0
+    try:
+        while True:
+            if loop:
+                reset_session(game, header)
+            index = 0
+            virtual_time = 0.0
+            loop_start = last_frame = time.perf_counter()
+            while virtual_time <= end_time:
+                frame_start = time.perf_counter()
+                if realtime:
+                    dt = frame_start - last_frame
+                    virtual_time = frame_start - loop_start
+                else:
+                    dt = frame_dt
+                    virtual_time += frame_dt
+                last_frame = frame_start
+
+                batch = []
+                while index < len(events) and events[index][0] <= virtual_time:
+                    batch.append(events[index][1])
+                    index += 1
+                # 窗口事件仍需处理，否则某些驱动会认为程序无响应
+                pygame.event.pump()
+                game.step(batch, dt)
+                frame_times.append((time.perf_counter() - frame_start) * 1000)
+
+                if realtime:
+                    game.clock.tick(fps)
+
+            loop += 1
+            rss_samples.append(current_rss_kib())
+            if duration is not None:
+                if time.perf_counter() - started >= duration:
+                    break
+            elif loop >= loops:
+                break
+    finally:
+        game.stop_ai_racer()
+        game.stop_move_analyzer()
+        game.stop_capture()
+        if game.prefetcher:
+            game.prefetcher.close()
+        if game.stats_store:
+            game.stats_store.close()
+        shutil.rmtree(stats_dir, ignore_errors=True)
+
+    return build_report(frame_times, rss_samples, time.perf_counter() - started, loop)
+
+
+def build_report(frame_times, rss_samples, elapsed, loops):
+    """汇总帧耗时分位数和内存增长"""
+    if len(frame_times) >= 2:
+        percentiles = statistics.quantiles(frame_times, n=100)
+    else:
+        percentiles = [frame_times[0] if frame_times else 0.0] * 99
+    return {
+        'loops': loops,
+        'frames': len(frame_times),
+        'elapsed': elapsed,
+        'fps': len(frame_times) / elapsed if elapsed > 0 else 0.0,
+        'frame_ms': {
+            'mean': statistics.fmean(frame_times) if frame_times else 0.0,
+            'p50': percentiles[49],
+            'p95': percentiles[94],
+            'p99': percentiles[98],
+            'max': max(frame_times, default=0.0),
+        },
+        'rss_kib': {
+            'start': rss_samples[0],
+            'end': rss_samples[-1],
+            'growth': rss_samples[-1] - rss_samples[0],
+            # 第一轮包含缓存预热，从第一轮结束后开始计算每轮增长
+            'growth_per_loop': (rss_samples[-1] - rss_samples[1]) / (loops - 1) if loops > 1 else 0.0,
+        },
+    }
+
+
+def print_report(report):
+    frame_ms = report['frame_ms']
+    rss = report['rss_kib']
+    print(f"回放 {report['loops']} 轮，共 {report['frames']} 帧，耗时 {report['elapsed']:.1f} 秒，"
+          f"平均 {report['fps']:.1f} FPS")
+    print(f"帧耗时(ms): 平均 {frame_ms['mean']:.2f}  p50 {frame_ms['p50']:.2f}  "
+          f"p95 {frame_ms['p95']:.2f}  p99 {frame_ms['p99']:.2f}  最大 {frame_ms['max']:.2f}")
+    print(f"RSS: 起始 {rss['start'] / 1024:.1f} MiB  结束 {rss['end'] / 1024:.1f} MiB  "
+          f"增长 {rss['growth'] / 1024:.1f} MiB  每轮 {rss['growth_per_loop']:.1f} KiB")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='回放录制的输入，测量帧率、帧耗时和内存增长')
+    parser.add_argument('recording', help='main.py --record-input 录制的文件')
+    parser.add_argument('--realtime', action='store_true', help='按录制时的节奏实时回放（默认尽快回放）')
+    parser.add_argument('--loops', type=int, default=1, help='回放轮数')
+    parser.add_argument('--duration', type=float, help='循环回放的总时长（秒），指定后忽略 --loops')
+    parser.add_argument('--fps', type=int, default=REPLAY_FPS, help='回放帧率')
+    parser.add_argument('--renderer', help='渲染后端，默认使用录制时的后端')
+    parser.add_argument('--report', metavar='FILE', help='把报告以 JSON 格式写入文件')
+    parser.add_argument('--capture', metavar='DIR', help='把回放画面逐帧导出到目录（按 --fps 的固定帧率，不丢帧）')
+    parser.add_argument('--capture-format', choices=FORMATS, default=PNG, help='画面导出格式')
+    parser.add_argument('--celebration', choices=CELEBRATION_MODES, help='胜利时的烟花，默认使用录制时的设置（旧的录制文件为实时模拟粒子）')
+    args = parser.parse_args()
+
+    result = replay(args.recording, args.loops, args.duration, args.realtime, args.fps, args.renderer,
+                    args.capture, args.capture_format, args.celebration)
+    print_report(result)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,505 @@
+import itertools
+import math
+import os
+import struct
+import time
+
+# 反馈模式：简单模式逐位置给出反馈，中等/困难模式只给出数量
+POSITIONAL = 'positional'
+COUNTS = 'counts'
+
+# 搜索策略：最坏情况剩余数量、信息熵、期望剩余数量
+STRATEGIES = ('minimax', 'entropy', 'expected')
+
+# 候选数量 × 猜测数量低于该值时直接在当前进程计算，进程池的开销反而更大
+PARALLEL_THRESHOLD = 200000
+
+# 共享控制块：[停止标志(1字节), 填充(3字节), 候选集代号(4字节)]
+CTRL_FORMAT = '<B3xI'
+CTRL_SIZE = struct.calcsize(CTRL_FORMAT)
+
+# 并行搜索时检查取消事件的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.05
+
+
+def feedback_mode(difficulty):
+    """根据难度返回反馈模式"""
+    return POSITIONAL if difficulty == 'easy' else COUNTS
+
+
+def all_codes(num_colors, code_length, allow_repeats=False):
+    """生成全部可能的密码（颜色索引元组）"""
+    if allow_repeats:
+        return list(itertools.product(range(num_colors), repeat=code_length))
+    return list(itertools.permutations(range(num_colors), code_length))
+
+
+def score(guess, secret, mode):
+    """计算猜测对某个密码的反馈，编码为整数
+
+    简单模式按位置编码为三进制（0灰 1白 2绿，第i位对应位置i），
+    与 Game.check_guess 的判定顺序一致；其他模式编码为 黑数 × (长度+1) + 白数。
+    """
+    length = len(guess)
+    if mode == POSITIONAL:
+        remaining = list(secret)
+        digits = [0] * length
+        for i in range(length):
+            if guess[i] == secret[i]:
+                digits[i] = 2
+                remaining[i] = -1
+        outcome = 0
+        for i in range(length - 1, -1, -1):
+            outcome *= 3
+            if digits[i] == 2:
+                outcome += 2
+        # 白色按位置从左到右依次匹配剩余的颜色
+        for i in range(length):
+            if digits[i] == 0 and guess[i] in remaining:
+                remaining[remaining.index(guess[i])] = -1
+                outcome += 3 ** i
+        return outcome
+
+    black = 0
+    for a, b in zip(guess, secret):
+        if a == b:
+            black += 1
+    total = 0
+    for color in set(guess):
+        total += min(guess.count(color), secret.count(color))
+    return black * (length + 1) + total - black
+
+
+def score_many(guess, secrets, mode):
+    """一次计算同一个猜测对多个密码的反馈（多棋盘模式每次提交只调用一次）
+
+    数量反馈只需统计一次猜测的颜色；逐位置反馈的白色依赖匹配顺序，逐个调用 score。
+    """
+    if mode == POSITIONAL:
+        return [score(guess, secret, mode) for secret in secrets]
+    length = len(guess)
+    guess_colors = [(color, guess.count(color)) for color in set(guess)]
+    outcomes = []
+    for secret in secrets:
+        black = 0
+        for a, b in zip(guess, secret):
+            if a == b:
+                black += 1
+        total = 0
+        for color, count in guess_colors:
+            total += min(count, secret.count(color))
+        outcomes.append(black * (length + 1) + total - black)
+    return outcomes
+
+
+def winning_outcome(code_length, mode):
+    """全部猜对时的反馈编码"""
+    if mode == POSITIONAL:
+        return 3 ** code_length - 1
+    return code_length * (code_length + 1)
+
+
+def num_outcomes(code_length, mode):
+    """反馈编码种类数的上界"""
+    if mode == POSITIONAL:
+        return 3 ** code_length
+    return (code_length + 1) * (code_length + 2) // 2 - 1
+
+
+def filter_candidates(candidates, guess, outcome, mode):
+    """保留与一次猜测及其反馈一致的候选密码"""
+    return [code for code in candidates if score(guess, code, mode) == outcome]
+
+
+class ColorDomains:
+    """每个位置仍然可能的颜色，随反馈增量收窄
+
+    对每个（位置, 颜色）维护一个候选密码位集。位置 j 的可能颜色是：在其余位置已填颜色的前提下，
+    仍有候选密码支持的颜色（即对全部反馈约束做广义弧相容）。提交猜测时过滤一次候选并重建位集，
+    编辑输入时只需 O(长度 × (长度 + 颜色数)) 次大整数与运算。
+    """
+
+    def __init__(self, candidates, num_colors, code_length, mode):
+        self.num_colors = num_colors
+        self.code_length = code_length
+        self.mode = mode
+        self._set_candidates(list(candidates))
+
+    def _set_candidates(self, candidates):
+        self.candidates = candidates
+        # 先在字节数组里置位再转成整数，避免逐位 |= 大整数带来的平方复杂度
+        num_bytes = (len(candidates) + 7) // 8
+        bitmaps = [[bytearray(num_bytes) for _ in range(self.num_colors)] for _ in range(self.code_length)]
+        for bit, code in enumerate(candidates):
+            byte, mask = bit >> 3, 1 << (bit & 7)
+            for position, color in enumerate(code):
+                bitmaps[position][color][byte] |= mask
+        self._index = [[int.from_bytes(bitmap, 'little') for bitmap in row] for row in bitmaps]
+        self._all = (1 << len(candidates)) - 1
+        self._cache_key = None
+        self._cache = None
+
+    def apply(self, guess, outcome):
+        """加入一次猜测的反馈"""
+        self._set_candidates(filter_candidates(self.candidates, tuple(guess), outcome, self.mode))
+
+    def allowed(self, partial):
+        """partial 为当前输入（-1 表示空位），返回每个位置可选颜色的位掩码"""
+        key = tuple(partial)
+        if key == self._cache_key:
+            return self._cache
+
+        masks = []
+        for j in range(self.code_length):
+            support = self._all
+            for i, color in enumerate(key):
+                if i != j and color != -1:
+                    support &= self._index[i][color]
+            domain = 0
+            if support:
+                for color, codes in enumerate(self._index[j]):
+                    if support & codes:
+                        domain |= 1 << color
+            masks.append(domain)
+
+        self._cache_key = key
+        self._cache = masks
+        return masks
+
+
+def partition_sizes(guess, candidates, mode):
+    """按反馈把候选密码分组，返回 {反馈: 数量}"""
+    sizes = {}
+    for secret in candidates:
+        outcome = score(guess, secret, mode)
+        sizes[outcome] = sizes.get(outcome, 0) + 1
+    return sizes
+
+
+def evaluate(sizes, total, strategy):
+    """把分组大小转换为评分，越小越好"""
+    if strategy == 'minimax':
+        return max(sizes.values())
+    if strategy == 'entropy':
+        return -sum(n / total * math.log2(total / n) for n in sizes.values())
+    return sum(n * n for n in sizes.values()) / total
+
+
+def lower_bound(num_candidates, code_length, mode, strategy):
+    """评分的理论下界，达到时可以提前结束搜索"""
+    parts = min(num_candidates, num_outcomes(code_length, mode))
+    if strategy == 'minimax':
+        return math.ceil(num_candidates / parts)
+    if strategy == 'entropy':
+        return -math.log2(parts)
+    return num_candidates / parts
+
+
+def best_guess(candidates, guesses, mode, strategy='minimax', deadline=None, cancel=None):
+    """单进程搜索下一步的最佳猜测，评分相同时优先选择候选密码本身
+
+    cancel 为 threading.Event 时，在其被设置后尽快返回当前最佳结果。
+    """
+    if len(candidates) <= 2:
+        return candidates[0]
+
+    candidate_set = set(candidates)
+    bound = lower_bound(len(candidates), len(candidates[0]), mode, strategy)
+    best_key = None
+    best = None
+    for guess in guesses:
+        key = (evaluate(partition_sizes(guess, candidates, mode), len(candidates), strategy),
+               guess not in candidate_set)
+        if best_key is None or key < best_key:
+            best_key = key
+            best = guess
+            if key[0] <= bound and not key[1]:
+                break
+        if deadline is not None and time.monotonic() > deadline:
+            break
+        if cancel is not None and cancel.is_set():
+            break
+    return best
+
+
+# ---- 进程池工作进程 ----
+# 每个工作进程在初始化时连接共享内存，之后只通过分片的起止下标通信
+
+_worker = {}
+
+
+def _attach_worker(codes_name, mask_name, scores_name, ctrl_name, num_codes, code_length, mode):
+    from multiprocessing import shared_memory
+
+    codes_shm = shared_memory.SharedMemory(name=codes_name)
+    buf = codes_shm.buf
+    _worker.update({
+        'shms': [codes_shm] + [shared_memory.SharedMemory(name=name)
+                               for name in (mask_name, scores_name, ctrl_name)],
+        # 每个进程只解码一次密码表
+        'codes': [tuple(buf[i * code_length:(i + 1) * code_length]) for i in range(num_codes)],
+        'code_length': code_length,
+        'mode': mode,
+        'generation': None,
+        'candidates': None,
+    })
+    _worker['mask'] = _worker['shms'][1].buf
+    _worker['scores'] = _worker['shms'][2].buf.cast('d')
+    _worker['ctrl'] = _worker['shms'][3].buf
+
+
+def _evaluate_shard(start, stop, strategy, deadline):
+    """评估 [start, stop) 范围内的猜测，评分写入共享评分表（主进程从表中选出最佳猜测），返回评估的数量"""
+    ctrl = _worker['ctrl']
+    stopped, generation = struct.unpack_from(CTRL_FORMAT, ctrl)
+    if stopped:
+        return 0
+
+    # 同一代候选集只从掩码解码一次
+    if _worker['generation'] != generation:
+        mask = _worker['mask']
+        codes = _worker['codes']
+        _worker['candidates'] = [codes[i] for i in range(len(codes)) if mask[i]]
+        _worker['candidate_set'] = set(_worker['candidates'])
+        _worker['generation'] = generation
+    candidates = _worker['candidates']
+    candidate_set = _worker['candidate_set']
+
+    codes = _worker['codes']
+    mode = _worker['mode']
+    scores = _worker['scores']
+    bound = lower_bound(len(candidates), _worker['code_length'], mode, strategy)
+
+    evaluated = 0
+    for index in range(start, stop):
+        # 每个猜测都检查一次停止标志和截止时间，保证能及时终止
+        if ctrl[0] or (deadline is not None and time.time() > deadline):
+            break
+        guess = codes[index]
+        value = evaluate(partition_sizes(guess, candidates, mode), len(candidates), strategy)
+        scores[index] = value
+        evaluated += 1
+        if value <= bound and guess in candidate_set:
+            # 已达到理论最优，通知其他分片提前结束
+            ctrl[0] = 1
+            break
+    return evaluated
+
+
+class ParallelSolver:
+    """把猜测评估分片到进程池的求解器
+
+    密码表、候选掩码和评分表放在 multiprocessing.shared_memory 中，
+    任务参数只有分片范围，不需要序列化候选集；工作进程把评分写入评分表，
+    主进程等所有分片结束后从表中选出最佳猜测（未评估的位置为 inf）。
+    """
+
+    def __init__(self, codes, mode, workers=None):
+        # 进程池和共享内存模块只在并行求解时导入，游戏和终端界面启动时不需要
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import shared_memory
+
+        self.codes = codes
+        self.mode = mode
+        self.code_length = len(codes[0])
+        self.workers = workers or os.cpu_count() or 1
+        self.index = {code: i for i, code in enumerate(codes)}
+        num_codes = len(codes)
+
+        self._codes_shm = shared_memory.SharedMemory(create=True, size=num_codes * self.code_length)
+        self._mask_shm = shared_memory.SharedMemory(create=True, size=num_codes)
+        self._scores_shm = shared_memory.SharedMemory(create=True, size=num_codes * 8)
+        self._ctrl_shm = shared_memory.SharedMemory(create=True, size=CTRL_SIZE)
+        self._codes_shm.buf[:num_codes * self.code_length] = bytes(c for code in codes for c in code)
+        self.scores = self._scores_shm.buf.cast('d')
+        # 每次搜索前用一次内存复制把评分表重置为 inf
+        self._empty_scores = struct.pack(f'{num_codes}d', *[math.inf] * num_codes)
+        self._generation = 0
+
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_attach_worker,
+            initargs=(self._codes_shm.name, self._mask_shm.name, self._scores_shm.name,
+                      self._ctrl_shm.name, num_codes, self.code_length, mode))
+
+    def best_guess(self, candidates, strategy='minimax', timeout=None, guess_indices=None, cancel=None):
+        """并行搜索最佳猜测；超过 timeout 秒或 cancel（threading.Event）被设置时返回已评估部分中的最佳结果"""
+        if len(candidates) <= 2:
+            return candidates[0]
+
+        # 写入新的候选掩码并清空评分表
+        num_codes = len(self.codes)
+        mask = self._mask_shm.buf
+        mask[:num_codes] = bytes(num_codes)
+        for code in candidates:
+            mask[self.index[code]] = 1
+        self._scores_shm.buf[:num_codes * 8] = self._empty_scores
+        self._generation += 1
+        struct.pack_into(CTRL_FORMAT, self._ctrl_shm.buf, 0, 0, self._generation)
+
+        # 连续的下标范围切成比进程数更多的分片，便于负载均衡
+        if guess_indices is None:
+            start, stop = 0, num_codes
+        else:
+            start, stop = guess_indices
+        num_shards = self.workers * 4
+        step = max(1, -(-(stop - start) // num_shards))
+        deadline = time.time() + timeout if timeout is not None else None
+        futures = [self._pool.submit(_evaluate_shard, i, min(i + step, stop), strategy, deadline)
+                   for i in range(start, stop, step)]
+
+        from concurrent.futures import wait, FIRST_COMPLETED
+
+        pending = set(futures)
+        while pending:
+            # 有取消事件时按较短的间隔醒来检查
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            if cancel is not None:
+                remaining = CANCEL_POLL_INTERVAL if remaining is None else min(remaining, CANCEL_POLL_INTERVAL)
+            _, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            expired = deadline is not None and time.time() >= deadline
+            if pending and (expired or (cancel is not None and cancel.is_set())):
+                self.cancel()
+                for future in pending:
+                    future.cancel()
+                # 已经开始的分片会看到停止标志并在下一个猜测前返回，等它们写完评分表
+                wait(pending)
+                break
+
+        # 工作进程中的异常在这里抛出
+        for future in futures:
+            if not future.cancelled():
+                future.result()
+
+        # 与串行搜索相同的优先顺序：评分、是否为候选密码、下标
+        scores = self.scores[start:stop].tolist()
+        best = min(range(len(scores)), key=lambda i: (scores[i], not mask[start + i]))
+        if scores[best] == math.inf:
+            return candidates[0]
+        return self.codes[start + best]
+
+    def cancel(self):
+        """通知所有工作进程停止当前搜索"""
+        self._ctrl_shm.buf[0] = 1
+
+    def close(self):
+        self.cancel()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self.scores.release()
+        for shm in (self._codes_shm, self._mask_shm, self._scores_shm, self._ctrl_shm):
+            shm.close()
+            shm.unlink()
+
+
+class Solver:
+    """某个配置下的求解器：根据历史猜测和反馈给出下一步猜测"""
+
+    def __init__(self, num_colors, code_length=4, mode=COUNTS, allow_repeats=False,
+                 strategy='minimax', workers=None, book=None, exact_book=None):
+        self.num_colors = num_colors
+        self.code_length = code_length
+        self.mode = mode
+        self.allow_repeats = allow_repeats
+        self.strategy = strategy
+        self.codes = all_codes(num_colors, code_length, allow_repeats)
+        self.workers = workers
+        # 开局库（OpeningBook），前几步直接查表
+        self.book = book
+        # 精确最优策略的完整决策树（optimal.py 导出，格式与开局库相同），优先于开局库
+        self.exact_book = exact_book
+        self._parallel = None
+
+    def candidates_after(self, history):
+        """history 为 [(猜测元组, 反馈编码), ...]，返回仍然可能的密码"""
+        candidates = self.codes
+        for guess, outcome in history:
+            candidates = filter_candidates(candidates, guess, outcome, self.mode)
+        return candidates
+
+    def next_guess(self, history, candidates=None, timeout=None, cancel=None):
+        """返回下一步猜测；优先查精确最优决策树和开局库，大规模搜索交给进程池"""
+        if self.exact_book is not None:
+            guess = self.exact_book.lookup(self.mode, self.num_colors, self.code_length, history,
+                                           self.exact_book.strategy, self.allow_repeats)
+            if guess is not None:
+                return guess
+
+        if self.book is not None:
+            guess = self.book.lookup(self.mode, self.num_colors, self.code_length, history,
+                                     self.strategy, self.allow_repeats)
+            if guess is not None:
+                return guess
+
+        if candidates is None:
+            candidates = self.candidates_after(history)
+        if not candidates:
+            return None
+
+        work = len(candidates) * len(self.codes)
+        if self.workers != 0 and work >= PARALLEL_THRESHOLD:
+            if self._parallel is None:
+                self._parallel = ParallelSolver(self.codes, self.mode, self.workers)
+            return self._parallel.best_guess(candidates, self.strategy, timeout, cancel=cancel)
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return best_guess(candidates, self.codes, self.mode, self.strategy, deadline, cancel)
+
+    def close(self):
+        if self._parallel is not None:
+            self._parallel.close()
+            self._parallel = None
+
+
+def simulate(solver, secrets=None):
+    """让求解器依次破解每个密码，返回 {猜测次数: 局数}"""
+    win = winning_outcome(solver.code_length, solver.mode)
+    distribution = {}
+    for secret in secrets if secrets is not None else solver.codes:
+        history = []
+        candidates = solver.codes
+        while True:
+            guess = solver.next_guess(history, candidates)
+            outcome = score(guess, secret, solver.mode)
+            history.append((guess, outcome))
+            if outcome == win:
+                break
+            candidates = filter_candidates(candidates, guess, outcome, solver.mode)
+        distribution[len(history)] = distribution.get(len(history), 0) + 1
+    return distribution
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='测试求解器在大规模配置下的第一步搜索')
+    parser.add_argument('--colors', type=int, default=8)
+    parser.add_argument('--length', type=int, default=6)
+    parser.add_argument('--repeats', action='store_true', help='允许颜色重复')
+    parser.add_argument('--mode', choices=(POSITIONAL, COUNTS), default=COUNTS)
+    parser.add_argument('--strategy', choices=STRATEGIES, default='minimax')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--timeout', type=float, default=None, help='搜索时限（秒）')
+    parser.add_argument('--simulate', action='store_true', help='破解全部密码并统计猜测次数分布')
+    args = parser.parse_args()
+
+    if args.simulate:
+        from opening_book import OpeningBook
+        solver = Solver(args.colors, args.length, args.mode, args.repeats, args.strategy, 0,
+                        OpeningBook.load())
+        start = time.perf_counter()
+        distribution = simulate(solver)
+        games = sum(distribution.values())
+        average = sum(n * count for n, count in distribution.items()) / games
+        print(f"{games} 局，平均 {average:.3f} 次，分布 {dict(sorted(distribution.items()))}，"
+              f"耗时 {time.perf_counter() - start:.2f}s")
+        sys.exit(0)
+
+    solver = Solver(args.colors, args.length, args.mode, args.repeats, args.strategy, args.workers)
+    try:
+        start = time.perf_counter()
+        guess = solver.next_guess([], timeout=args.timeout)
+        print(f"密码空间 {len(solver.codes)}，{args.workers} 个进程，"
+              f"最佳首次猜测 {guess}，耗时 {time.perf_counter() - start:.2f}s")
+    finally:
+        solver.close()
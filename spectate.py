@@ -0,0 +1,542 @@
+import asyncio
+import socket
+import struct
+import threading
+import time
+
+from engine import COLOR_NAMES, DIFFICULTIES, DIFFICULTY_NAMES
+
+# 旁观服务默认只监听本机
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 7654
+
+# 消息类型：完整状态（新的一局或旁观者刚加入）、提交猜测、当前猜测变化（光标和颜色）、胜负
+SNAPSHOT = 0
+GUESS = 1
+CURSOR = 2
+END = 3
+
+# 帧头：消息长度（不含帧头）和消息类型，之后的颜色、反馈都只占一个字节
+HEADER = struct.Struct('<IB')
+# 完整状态：谜题编号、难度、颜色数量、密码长度、棋盘数量、最多猜测次数、预填猜测数量、
+# 状态标志（是否结束、是否胜利）、光标位置、已有猜测数量；之后是当前猜测、每次猜测和各棋盘的反馈、
+# 结束时还有各棋盘的密码。谜题编号可能为负（2025 年之前的每日谜题）或很大（--puzzle），使用 64 位有符号整数
+SNAPSHOT_FIELDS = struct.Struct('<qBBBBIBBBI')
+FLAG_GAME_OVER = 1
+FLAG_WIN = 2
+
+# 空的位置，以及棋盘已经猜中、这次猜测没有反馈
+EMPTY = 0xFF
+
+# 旁观者连接的发送缓冲上限（字节）：超过后不再发送增量，缓冲写出后补发一次完整状态
+HIGH_WATER = 16 * 1024
+
+# 测试时每个连接的内核发送缓冲（字节）
+BENCH_SEND_BUFFER = 8192
+
+# 同时等待接受的连接数，大量旁观者同时加入时避免连接被拒绝
+BACKLOG = 4096
+
+
+def _frame(kind, payload):
+    return HEADER.pack(len(payload), kind) + payload
+
+
+def _code_bytes(code):
+    return bytes(EMPTY if color == -1 else color for color in code)
+
+
+def _outcome_bytes(game, index):
+    """第 index 次猜测在每个棋盘上的反馈编码"""
+    if not game.boards:
+        return bytes((game.feedback_outcome(game.feedbacks[index]),))
+    return bytes(board.outcomes[index] if index < len(board.outcomes) else EMPTY for board in game.boards)
+
+
+def _secret_bytes(game):
+    if not game.boards:
+        return _code_bytes(game.secret_code)
+    return b''.join(_code_bytes(board.secret_code) for board in game.boards)
+
+
+def encode_snapshot(game):
+    flags = (FLAG_GAME_OVER if game.game_over else 0) | (FLAG_WIN if game.win else 0)
+    parts = [
+        SNAPSHOT_FIELDS.pack(game.puzzle_id, DIFFICULTIES.index(game.difficulty), game.num_colors,
+                             game.code_length, max(1, len(game.boards)), game.guess_limit, game.prefilled_count,
+                             flags, game.current_position, len(game.guesses)),
+        _code_bytes(game.current_guess),
+    ]
+    for index, guess in enumerate(game.guesses):
+        parts.append(_code_bytes(guess))
+        parts.append(_outcome_bytes(game, index))
+    if game.game_over:
+        parts.append(_secret_bytes(game))
+    return _frame(SNAPSHOT, b''.join(parts))
+
+
+def encode_guess(game, index):
+    return _frame(GUESS, _code_bytes(game.guesses[index]) + _outcome_bytes(game, index))
+
+
+def encode_cursor(game):
+    return _frame(CURSOR, bytes((game.current_position,)) + _code_bytes(game.current_guess))
+
+
+def encode_end(game):
+    return _frame(END, bytes((1 if game.win else 0,)) + _secret_bytes(game))
+
+
+class _Subscriber(asyncio.Protocol):
+    """一个旁观者连接：只发送不接收，发送缓冲满时由 SpectatorServer 合并增量"""
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.paused = False
+        self.stale = False  # 暂停期间丢弃过增量，恢复后需要补发完整状态
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(high=HIGH_WATER)
+        sock = transport.get_extra_info('socket')
+        if self.server.send_buffer and sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.server.send_buffer)
+        self.server.subscribers.add(self)
+        # 中途加入的旁观者先收到完整状态
+        if self.server.snapshot:
+            transport.write(self.server.snapshot)
+
+    def connection_lost(self, exc):
+        self.server.subscribers.discard(self)
+
+    def data_received(self, data):
+        pass
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        if self.stale:
+            self.stale = False
+            self.server.coalesced += 1
+            self.transport.write(self.server.snapshot)
+
+
+class SpectatorServer:
+    """把一局游戏的状态变化广播给旁观者
+
+    asyncio 服务在后台线程中运行，游戏线程每次调用 sync() 时与上一次的状态比较，
+    把变化编码为增量帧（提交的猜测、当前猜测、胜负，新的一局时为完整状态），只编码一次后
+    交给服务线程发给所有旁观者；服务线程来不及发送的多次变化合并为一次写入。旁观者接收太慢时不为它累积增量，而是等发送缓冲写出后
+    补发一次最新的完整状态，每个连接占用的内存不超过 HIGH_WATER。
+    send_buffer 限制每个连接的内核发送缓冲（字节），None 使用系统默认值（本机回环上可达数 MB）。
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, send_buffer=None):
+        self.send_buffer = send_buffer
+        self.subscribers = set()
+        self.snapshot = b''  # 最新的完整状态帧，只在服务线程中读写
+        self.coalesced = 0  # 因接收太慢而合并增量的次数
+        self._server = None
+        self._error = None
+        self._ready = threading.Event()
+
+        # 游戏线程编码好、尚未发出的增量帧；服务线程忙不过来时多次变化合并为一次发送
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_snapshot = None
+
+        # 游戏线程上一次同步时的状态
+        self._serial = None
+        self._guesses = 0
+        self._game_over = False
+        self._cursor = None
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, args=(host, port), name='spectator-server', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            self._thread.join()
+            raise self._error
+        self.host, self.port = self._server.sockets[0].getsockname()[:2]
+
+    def _run(self, host, port):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(
+                self.loop.create_server(lambda: _Subscriber(self), host, port, backlog=BACKLOG))
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            self.loop.close()
+            return
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    @property
+    def spectators(self):
+        return len(self.subscribers)
+
+    def sync(self, game):
+        """在游戏线程中调用：把自上一次同步以来的状态变化广播出去，没有变化时几乎没有开销"""
+        cursor = (game.current_position, tuple(game.current_guess))
+        frames = []
+        if game.game_serial != self._serial:
+            # 新的一局：增量就是完整状态
+            self._serial = game.game_serial
+            self._guesses = len(game.guesses)
+            self._game_over = game.game_over
+            snapshot = encode_snapshot(game)
+            frames.append(snapshot)
+        else:
+            while self._guesses < len(game.guesses):
+                frames.append(encode_guess(game, self._guesses))
+                self._guesses += 1
+            if game.game_over and not self._game_over:
+                self._game_over = True
+                frames.append(encode_end(game))
+            if cursor != self._cursor:
+                frames.append(encode_cursor(game))
+            if not frames:
+                return
+            snapshot = encode_snapshot(game)
+        self._cursor = cursor
+        with self._lock:
+            schedule = not self._pending
+            self._pending += frames
+            self._pending_snapshot = snapshot
+        if schedule:
+            self.loop.call_soon_threadsafe(self._publish)
+
+    def _publish(self):
+        with self._lock:
+            data = b''.join(self._pending)
+            self._pending.clear()
+            self.snapshot = self._pending_snapshot
+        for subscriber in self.subscribers:
+            if subscriber.paused:
+                subscriber.stale = True
+            else:
+                subscriber.transport.write(data)
+
+    def _shutdown(self):
+        self._server.close()
+        for subscriber in list(self.subscribers):
+            subscriber.transport.close()
+        self.loop.stop()
+
+    def close(self):
+        """关闭服务和所有旁观者连接"""
+        if self._thread.is_alive():
+            self.loop.call_soon_threadsafe(self._shutdown)
+            self._thread.join()
+
+
+def start_spectator_server(game, address=''):
+    """为游戏开启旁观服务，address 为 [HOST:]PORT，空字符串使用默认地址"""
+    host, port = parse_address(address) if address else (DEFAULT_HOST, DEFAULT_PORT)
+    try:
+        game.broadcaster = SpectatorServer(host, port)
+    except OSError as e:
+        game.log(f"开启旁观服务失败: {e}")
+        return None
+    game.broadcast_state()
+    if game.broadcaster is None:
+        return None
+    game.log(f"旁观服务已启动，用 python spectate.py {game.broadcaster.host}:{game.broadcaster.port} 观看")
+    return game.broadcaster
+
+
+class SpectatorState:
+    """旁观端：解码收到的帧并维护游戏状态"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.puzzle_id = None
+        self.difficulty = None
+        self.num_colors = 0
+        self.code_length = 0
+        self.num_boards = 1
+        self.guess_limit = 0
+        self.prefilled_count = 0
+        self.game_over = False
+        self.win = False
+        self.current_position = 0
+        self.current_guess = []
+        self.guesses = []  # [(猜测, 各棋盘的反馈编码), ...]，反馈为 None 表示该棋盘已经猜中
+        self.secrets = []
+
+    def feed(self, data):
+        """加入收到的数据，返回解码出的 [(消息类型, 消息内容), ...]"""
+        self.buffer += data
+        messages = []
+        while len(self.buffer) >= HEADER.size:
+            length, kind = HEADER.unpack_from(self.buffer)
+            end = HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            payload = bytes(self.buffer[HEADER.size:end])
+            del self.buffer[:end]
+            self.apply(kind, payload)
+            messages.append((kind, payload))
+        return messages
+
+    def _code(self, data):
+        return [-1 if value == EMPTY else value for value in data]
+
+    def _guess(self, data):
+        length = self.code_length
+        outcomes = [None if value == EMPTY else value for value in data[length:length + self.num_boards]]
+        return self._code(data[:length]), outcomes
+
+    def _secrets(self, data):
+        length = self.code_length
+        return [self._code(data[i * length:(i + 1) * length]) for i in range(self.num_boards)]
+
+    def apply(self, kind, payload):
+        if kind == SNAPSHOT:
+            (self.puzzle_id, difficulty, self.num_colors, self.code_length, self.num_boards, self.guess_limit,
+             self.prefilled_count, flags, self.current_position, num_guesses) = SNAPSHOT_FIELDS.unpack_from(payload)
+            self.difficulty = DIFFICULTIES[difficulty]
+            self.game_over = bool(flags & FLAG_GAME_OVER)
+            self.win = bool(flags & FLAG_WIN)
+            offset = SNAPSHOT_FIELDS.size
+            self.current_guess = self._code(payload[offset:offset + self.code_length])
+            offset += self.code_length
+            step = self.code_length + self.num_boards
+            self.guesses = [self._guess(payload[offset + i * step:offset + (i + 1) * step])
+                            for i in range(num_guesses)]
+            offset += num_guesses * step
+            self.secrets = self._secrets(payload[offset:]) if self.game_over else []
+        elif kind == GUESS:
+            self.guesses.append(self._guess(payload))
+        elif kind == CURSOR:
+            self.current_position = payload[0]
+            self.current_guess = self._code(payload[1:])
+        elif kind == END:
+            self.game_over = True
+            self.win = bool(payload[0])
+            self.secrets = self._secrets(payload[1:])
+
+    def state(self):
+        """用于比较的完整状态"""
+        return (self.puzzle_id, self.difficulty, self.num_colors, self.num_boards, self.guess_limit,
+                self.prefilled_count, self.game_over, self.win, self.current_position, self.current_guess,
+                self.guesses, self.secrets)
+
+    def outcome_text(self, outcome):
+        """把反馈编码显示为 ●（颜色和位置都正确）○（颜色正确但位置错误）·（颜色错误）"""
+        if outcome is None:
+            return ' ' * self.code_length
+        if self.difficulty == 'easy':
+            marks = []
+            for _ in range(self.code_length):
+                outcome, digit = divmod(outcome, 3)
+                marks.append('●○·'[2 - digit])
+            return ''.join(marks)
+        black, white = divmod(outcome, self.code_length + 1)
+        return '●' * black + '○' * white + '·' * (self.code_length - black - white)
+
+
+def _colors_text(code):
+    return ' '.join(COLOR_NAMES[color] if color != -1 else '_' for color in code)
+
+
+def describe(state, kind):
+    """旁观端显示的一行文字"""
+    if kind == SNAPSHOT:
+        mode = f"{DIFFICULTY_NAMES[state.difficulty]} · {state.num_colors}色"
+        if state.num_boards > 1:
+            mode += f" · {state.num_boards}个棋盘"
+        lines = [f"谜题 #{state.puzzle_id}  {mode}  已猜 {len(state.guesses)}/{state.guess_limit}"]
+        lines += [describe_guess(state, i) for i in range(len(state.guesses))]
+        if state.game_over:
+            lines.append(describe(state, END))
+        return '\n'.join(lines)
+    if kind == GUESS:
+        return describe_guess(state, len(state.guesses) - 1)
+    if kind == CURSOR:
+        return f"    正在输入: {_colors_text(state.current_guess)}"
+    result = "猜中了" if state.win else "猜测次数用完"
+    return f"{result}，密码: " + "  |  ".join(_colors_text(secret) for secret in state.secrets)
+
+
+def describe_guess(state, index):
+    guess, outcomes = state.guesses[index]
+    feedback = ' '.join(state.outcome_text(outcome) for outcome in outcomes)
+    return f"{index + 1:>2}. {_colors_text(guess)}   {feedback}"
+
+
+async def watch(host, port):
+    """连接旁观服务并逐行显示对局"""
+    reader, writer = await asyncio.open_connection(host, port)
+    state = SpectatorState()
+    print(f"已连接到 {host}:{port}")
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                print("对局已结束旁观")
+                return
+            for kind, _ in state.feed(data):
+                print(describe(state, kind))
+    finally:
+        writer.close()
+
+
+class _BenchClient(asyncio.Protocol):
+    def __init__(self):
+        self.state = SpectatorState()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.state.feed(data)
+
+
+async def _bench_clients(host, port, count, slow, conn):
+    """测试用的旁观者：slow 个旁观者在对局期间不读取数据，接收缓冲很快就会写满"""
+    loop = asyncio.get_running_loop()
+
+    async def connect(is_slow):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if is_slow:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.setblocking(False)
+        await loop.sock_connect(sock, (host, port))
+        _, client = await loop.create_connection(_BenchClient, sock=sock)
+        if is_slow:
+            client.transport.pause_reading()
+        return client
+
+    clients = []
+    for start in range(0, count, 200):
+        batch = range(start, min(count, start + 200))
+        clients += await asyncio.gather(*(connect(i < slow) for i in batch))
+    conn.send('ready')
+
+    # 等待对局结束，恢复读取后所有旁观者的状态都应与游戏一致
+    expected = await loop.run_in_executor(None, conn.recv)
+    sent_at = time.monotonic()
+    for client in clients[:slow]:
+        client.transport.resume_reading()
+    reference = SpectatorState()
+    reference.feed(expected)
+    matched = 0
+    deadline = sent_at + 30
+    while time.monotonic() < deadline:
+        matched = sum(client.state.state() == reference.state() for client in clients)
+        if matched == count:
+            break
+        await asyncio.sleep(0.01)
+    conn.send((matched, time.monotonic() - sent_at))
+    for client in clients:
+        client.transport.close()
+
+
+def _bench_client_process(host, port, count, slow, conn):
+    asyncio.run(_bench_clients(host, port, count, slow, conn))
+
+
+def benchmark(spectators, slow, games, interval):
+    """在本机回环上检查广播：AI 连续下 games 局，模拟逐个选择颜色再提交，
+    旁观者在另一个进程中接收，最后检查每个旁观者的状态（包括读得很慢的）都与游戏一致"""
+    import multiprocessing
+    import statistics
+    import tempfile
+
+    from engine import GameEngine
+
+    class BenchGame(GameEngine):
+        def log(self, message):
+            pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        game = BenchGame(stats_path=f"{tmp}/stats.db")
+        # 限制内核发送缓冲，慢速旁观者才会在测试的数据量下触发增量合并
+        server = SpectatorServer(port=0, send_buffer=BENCH_SEND_BUFFER)
+        game.broadcaster = server
+        game.broadcast_state()
+
+        parent_conn, child_conn = multiprocessing.Pipe()
+        clients = multiprocessing.Process(target=_bench_client_process,
+                                          args=(server.host, server.port, spectators, slow, child_conn))
+        clients.start()
+        parent_conn.recv()
+        deadline = time.monotonic() + 10
+        while server.spectators < spectators and time.monotonic() < deadline:
+            time.sleep(0.01)
+        print(f"{server.spectators} 个旁观者已连接（其中 {slow} 个接收很慢）")
+
+        sync_times = []
+
+        def sync():
+            start = time.perf_counter()
+            game.broadcast_state()
+            sync_times.append(time.perf_counter() - start)
+            time.sleep(interval)
+
+        modes = [(difficulty, num_colors) for difficulty in DIFFICULTIES for num_colors in (4, 6)]
+        started = time.perf_counter()
+        for i in range(games):
+            game.reset_game(*modes[i % len(modes)])
+            while not game.game_over:
+                game.apply_hint()
+                hint = game.current_guess
+                game.current_guess = [-1] * game.code_length
+                for position, color in enumerate(hint):
+                    game.current_position = position
+                    game.current_guess[position] = color
+                    sync()
+                game.process_guess()
+                sync()
+        elapsed = time.perf_counter() - started
+
+        parent_conn.send(encode_snapshot(game))
+        matched, delay = parent_conn.recv()
+        clients.join()
+        server.close()
+        game.stats_store.close()
+
+    print(f"{games} 局共广播 {len(sync_times)} 次变化，用时 {elapsed:.1f} 秒")
+    print(f"游戏线程每次同步: 中位数 {statistics.median(sync_times) * 1e6:.0f} µs，"
+          f"最大 {max(sync_times) * 1e3:.2f} ms")
+    print(f"慢速旁观者合并增量 {server.coalesced} 次")
+    print(f"{matched}/{spectators} 个旁观者的状态与游戏一致（最后一帧送达用时 {delay * 1e3:.0f} ms）")
+    return matched == spectators
+
+
+def parse_address(text):
+    """解析 [HOST:]PORT"""
+    host, _, port = text.rpartition(':')
+    return host or DEFAULT_HOST, int(port)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="旁观正在进行的对局")
+    parser.add_argument('address', nargs='?', default=f"{DEFAULT_HOST}:{DEFAULT_PORT}", help="[HOST:]PORT")
+    parser.add_argument('--bench', type=int, metavar='N',
+                        help="不连接对局，在本机回环上用 N 个旁观者测试广播并检查状态是否一致")
+    parser.add_argument('--slow', type=int, default=None, help="测试时接收很慢的旁观者数量（默认 5%%）")
+    parser.add_argument('--games', type=int, default=20, help="测试时 AI 连续下的局数")
+    parser.add_argument('--interval', type=float, default=0.005, help="测试时两次状态变化之间的间隔（秒）")
+    args = parser.parse_args()
+    if args.bench:
+        slow = args.bench // 20 if args.slow is None else args.slow
+        raise SystemExit(0 if benchmark(args.bench, slow, args.games, args.interval) else 1)
+    try:
+        asyncio.run(watch(*parse_address(args.address)))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"连接失败: {e}")
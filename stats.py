@@ -0,0 +1,177 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# 统计数据库默认位置（与游戏脚本同目录）
+STATS_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stats.db')
+
+# 写线程每批最多写入的对局数和最长等待时间（秒）
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,
+    difficulty TEXT NOT NULL,
+    num_colors INTEGER NOT NULL,
+    code_length INTEGER NOT NULL,
+    win INTEGER NOT NULL,
+    num_guesses INTEGER NOT NULL,
+    prefilled INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_games_config ON games (difficulty, num_colors, played_at);
+
+CREATE TABLE IF NOT EXISTS config_stats (
+    difficulty TEXT NOT NULL,
+    num_colors INTEGER NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    current_streak INTEGER NOT NULL DEFAULT 0,
+    best_streak INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (difficulty, num_colors)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS guess_distribution (
+    difficulty TEXT NOT NULL,
+    num_colors INTEGER NOT NULL,
+    num_guesses INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (difficulty, num_colors, num_guesses)
+) WITHOUT ROWID;
+"""
+
+# 聚合表的增量更新语句，与插入对局记录在同一个事务中执行
+UPDATE_CONFIG_STATS = """
+INSERT INTO config_stats (difficulty, num_colors, games, wins, current_streak, best_streak)
+VALUES (:difficulty, :num_colors, 1, :win, :win, :win)
+ON CONFLICT (difficulty, num_colors) DO UPDATE SET
+    games = games + 1,
+    wins = wins + excluded.wins,
+    current_streak = CASE WHEN excluded.wins THEN current_streak + 1 ELSE 0 END,
+    best_streak = MAX(best_streak, CASE WHEN excluded.wins THEN current_streak + 1 ELSE 0 END)
+"""
+
+UPDATE_GUESS_DISTRIBUTION = """
+INSERT INTO guess_distribution (difficulty, num_colors, num_guesses, count)
+VALUES (:difficulty, :num_colors, :num_guesses, 1)
+ON CONFLICT (difficulty, num_colors, num_guesses) DO UPDATE SET count = count + 1
+"""
+
+
+class StatsStore:
+    """本地战绩存储 - 对局由后台线程批量写入，聚合表随写入增量维护"""
+
+    def __init__(self, path=STATS_DB_PATH):
+        self.path = path
+        # 每提交一批数据加一，界面据此判断缓存的统计是否过期
+        self.version = 0
+        self._queue = queue.Queue()
+        self._closed = False
+
+        # 主线程使用的只读连接；WAL模式下读取不会被后台写入阻塞
+        self._conn = self._connect()
+        self._conn.executescript(SCHEMA)
+
+        self._writer = threading.Thread(target=self._writer_loop, name='stats-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def record_game(self, difficulty, num_colors, code_length, win, num_guesses, prefilled=0):
+        """记录一局已结束的游戏（只入队，不阻塞调用线程）"""
+        if self._closed:
+            return
+        self._queue.put({
+            'played_at': time.time(),
+            'difficulty': difficulty,
+            'num_colors': num_colors,
+            'code_length': code_length,
+            'win': 1 if win else 0,
+            'num_guesses': num_guesses,
+            'prefilled': prefilled,
+        })
+
+    def _writer_loop(self):
+        """后台写线程：攒批后在一个事务中写入对局并更新聚合表"""
+        conn = self._connect()
+        try:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+
+                # 在短时间窗口内尽量多取一些记录，合并为一个事务
+                batch = [record]
+                stop = False
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                while len(batch) < BATCH_SIZE:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        record = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if record is None:
+                        stop = True
+                        break
+                    batch.append(record)
+
+                try:
+                    self._write_batch(conn, batch)
+                except sqlite3.Error as e:
+                    print(f"写入战绩失败: {e}")
+
+                if stop:
+                    break
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, batch):
+        with conn:
+            conn.executemany(
+                "INSERT INTO games (played_at, difficulty, num_colors, code_length, win, num_guesses, prefilled) "
+                "VALUES (:played_at, :difficulty, :num_colors, :code_length, :win, :num_guesses, :prefilled)",
+                batch)
+            # 连胜依赖对局顺序，按入队顺序逐条累计
+            conn.executemany(UPDATE_CONFIG_STATS, batch)
+            conn.executemany(UPDATE_GUESS_DISTRIBUTION, [r for r in batch if r['win']])
+        self.version += 1
+
+    def get_summary(self, difficulty, num_colors):
+        """读取某个配置的聚合统计（只查询聚合表，耗时与对局总数无关）"""
+        row = self._conn.execute(
+            "SELECT games, wins, current_streak, best_streak FROM config_stats "
+            "WHERE difficulty = ? AND num_colors = ?",
+            (difficulty, num_colors)).fetchone()
+        games, wins, current_streak, best_streak = row if row else (0, 0, 0, 0)
+
+        distribution = dict(self._conn.execute(
+            "SELECT num_guesses, count FROM guess_distribution "
+            "WHERE difficulty = ? AND num_colors = ? ORDER BY num_guesses",
+            (difficulty, num_colors)).fetchall())
+
+        return {
+            'games': games,
+            'wins': wins,
+            'win_rate': wins / games if games else 0.0,
+            'current_streak': current_streak,
+            'best_streak': best_streak,
+            'distribution': distribution,
+        }
+
+    def close(self):
+        """写完队列中剩余的对局后关闭数据库"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        self._conn.close()
@@ -0,0 +1,382 @@
+import curses
+import locale
+import os
+import sqlite3
+import unicodedata
+
+from engine import (GameEngine, BOARD_OPTIONS, COLOR_NAMES, COLOR_OPTIONS, DIFFICULTIES, DIFFICULTY_NAMES,
+                    GREEN, MAX_BOARDS, MAX_GUESSES, WHITE, guess_count)
+from puzzle import daily_puzzle_id
+from stats import STATS_DB_PATH
+
+# 终端界面：与图形界面共用 GameEngine，不导入 pygame，适合 SSH 和瘦客户端
+
+# 色块颜色：256 色终端使用与图形界面 COLORS 接近的颜色，只有 8 色时退回基本颜色
+COLORS_256 = [167, 71, 62, 220, 134, 44, 208]
+COLORS_8 = [curses.COLOR_RED, curses.COLOR_GREEN, curses.COLOR_BLUE, curses.COLOR_YELLOW,
+            curses.COLOR_MAGENTA, curses.COLOR_CYAN, curses.COLOR_RED]
+
+# 反馈标记：颜色和位置都正确 / 颜色正确但位置错误 / 颜色错误
+MARK_GREEN = '●'
+MARK_WHITE = '○'
+MARK_GRAY = '·'
+
+# 颜色对编号：1-7 为色块，之后为反馈和提示文字
+PAIR_FEEDBACK_GREEN = 8
+PAIR_FEEDBACK_WHITE = 9
+PAIR_DIM = 10
+
+# 历史猜测从第 HISTORY_TOP 行开始，每个色块占 CELL_WIDTH 列
+HISTORY_TOP = 2
+CELL_WIDTH = 4
+GUESS_X = 4
+
+# 按 Esc 后等待后续字符的时间（毫秒），默认的 1 秒会让 Esc 反应迟钝
+ESC_DELAY = '25'
+
+# 战绩由后台线程写入，等待按键时每隔一段时间（毫秒）刷新一次画面
+REFRESH_INTERVAL = 500
+
+HELP_TEXT = "1-7 选色  ←→ 移动  ↑↓ 循环颜色  空格 清空  回车 提交  H 提示  Q 返回菜单"
+MENU_HELP_TEXT = "↑↓ 选择项目  ←→ 修改  回车 开始  Q 退出"
+
+
+def display_width(text):
+    """文字在终端中占的列数（中文等全角字符占两列）"""
+    return sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+
+
+class TerminalGame(GameEngine):
+    """curses 终端界面 - 游戏规则和状态由 GameEngine 提供"""
+
+    def __init__(self, stats_path=STATS_DB_PATH, max_guesses=MAX_GUESSES, puzzle_id=None, num_boards=1):
+        # 状态行显示上一次按键的结果（提示、胜负），启动时显示初始化时的提示信息
+        self.status = ""
+        self.show_menu = True
+        self.menu_row = 0
+        self.running = True
+        self.stats_cache_key = None
+        self.stats_lines = []
+        super().__init__(stats_path, max_guesses, puzzle_id)
+        if num_boards != self.num_boards:
+            self.num_boards = num_boards
+            self.reset_game(self.difficulty, self.num_colors)
+
+    def log(self, message):
+        """提示信息显示在状态行（print 会打乱 curses 画面）"""
+        self.status = message
+
+    def debug(self, message):
+        """密码等调试信息不在终端界面显示"""
+
+    def _on_guess(self):
+        if self.game_over:
+            if self.win:
+                self.status = f"恭喜！用 {len(self.guesses)} 次猜测破解了密码"
+            else:
+                self.status = "猜测次数用完了"
+
+    def menu_items(self):
+        """菜单项：(名称, 可选值, 当前值, 显示文字)，与图形界面的难度选择按钮相同"""
+        return [
+            ("游戏模式", DIFFICULTIES, self.difficulty, DIFFICULTY_NAMES),
+            ("颜色数量", COLOR_OPTIONS, self.num_colors, {n: str(n) for n in COLOR_OPTIONS}),
+            ("棋盘", BOARD_OPTIONS, self.num_boards, {n: str(n) for n in BOARD_OPTIONS}),
+        ]
+
+    def change_option(self, step):
+        """修改菜单中选中的项目，立即按新配置开始一局"""
+        _, values, current, _ = self.menu_items()[self.menu_row]
+        index = values.index(current) if current in values else 0
+        value = values[(index + step) % len(values)]
+        difficulty, num_colors = self.difficulty, self.num_colors
+        if self.menu_row == 0:
+            difficulty = value
+        elif self.menu_row == 1:
+            num_colors = value
+        else:
+            self.num_boards = value
+        self.reset_game(difficulty, num_colors)
+
+    def handle_key(self, key):
+        """处理按键"""
+        self.status = ""
+        if self.show_menu:
+            self._handle_menu_key(key)
+            return
+
+        if key in (ord('q'), ord('Q'), 27):
+            self.show_menu = True
+            return
+
+        if not self._is_playing():
+            # 游戏结束后回车或 R 键按相同配置开始新的一局
+            if key in (ord('r'), ord('R'), ord('\n'), ord('\r'), curses.KEY_ENTER):
+                self.reset_game(self.difficulty, self.num_colors)
+            return
+
+        if ord('1') <= key <= ord('7'):
+            self._handle_color_selection(key - ord('1'))
+        elif key in (ord(' '), ord('0'), curses.KEY_BACKSPACE, curses.KEY_DC):
+            self.current_guess[self.current_position] = -1
+        elif key == curses.KEY_LEFT:
+            self.current_position = (self.current_position - 1) % self.code_length
+        elif key == curses.KEY_RIGHT:
+            self.current_position = (self.current_position + 1) % self.code_length
+        elif key in (curses.KEY_UP, curses.KEY_DOWN):
+            self._cycle_colors(self.current_position, reverse=key == curses.KEY_UP)
+        elif key in (ord('h'), ord('H')):
+            self.apply_hint()
+        elif key in (ord('\n'), ord('\r'), curses.KEY_ENTER):
+            if -1 in self.current_guess:
+                self.status = "还有空的位置"
+            else:
+                self.process_guess()
+
+    def _handle_menu_key(self, key):
+        if key in (ord('q'), ord('Q'), 27):
+            self.running = False
+        elif key == curses.KEY_UP:
+            self.menu_row = (self.menu_row - 1) % len(self.menu_items())
+        elif key == curses.KEY_DOWN:
+            self.menu_row = (self.menu_row + 1) % len(self.menu_items())
+        elif key in (curses.KEY_LEFT, curses.KEY_RIGHT):
+            self.change_option(-1 if key == curses.KEY_LEFT else 1)
+        elif key in (ord('\n'), ord('\r'), curses.KEY_ENTER, ord(' ')):
+            self.show_menu = False
+
+    def init_colors(self):
+        """初始化颜色对，终端不支持颜色时只用文字区分"""
+        self.has_colors = curses.has_colors()
+        if not self.has_colors:
+            return
+        curses.start_color()
+        try:
+            curses.use_default_colors()
+            background = -1
+        except curses.error:
+            background = curses.COLOR_BLACK
+        palette = COLORS_256 if curses.COLORS >= 256 else COLORS_8
+        for i, color in enumerate(palette):
+            curses.init_pair(i + 1, curses.COLOR_BLACK, color)
+        curses.init_pair(PAIR_FEEDBACK_GREEN, palette[1], background)
+        curses.init_pair(PAIR_FEEDBACK_WHITE, curses.COLOR_WHITE, background)
+        curses.init_pair(PAIR_DIM, 244 if curses.COLORS >= 256 else curses.COLOR_WHITE, background)
+
+    def _attr(self, pair, fallback=curses.A_NORMAL):
+        return curses.color_pair(pair) if self.has_colors else fallback
+
+    def _put(self, y, x, text, attr=curses.A_NORMAL):
+        """写入文字，超出窗口的部分直接丢弃"""
+        height, width = self.stdscr.getmaxyx()
+        if 0 <= y < height and x < width:
+            try:
+                self.stdscr.addstr(y, x, text, attr)
+            except curses.error:
+                # 写到右下角最后一格时 curses 会报错，文字已经写入
+                pass
+
+    def draw_cell(self, y, x, color_idx, selected=False, width=CELL_WIDTH - 1):
+        """绘制一个色块：背景为颜色，中间显示颜色编号；selected 时两侧加方括号"""
+        if color_idx == -1:
+            self._put(y, x, MARK_GRAY.center(width), self._attr(PAIR_DIM, curses.A_DIM))
+        else:
+            self._put(y, x, str(color_idx + 1).center(width), self._attr(color_idx + 1, curses.A_BOLD))
+        if selected:
+            self._put(y, x - 1, '[', curses.A_BOLD)
+            self._put(y, x + width, ']', curses.A_BOLD)
+
+    def draw_feedback(self, y, x, feedback, spacing=1):
+        """绘制反馈标记（简单模式与位置对应，其他模式只表示数量）"""
+        for i, color in enumerate(feedback):
+            if color == GREEN:
+                mark, attr = MARK_GREEN, self._attr(PAIR_FEEDBACK_GREEN, curses.A_BOLD)
+            elif color == WHITE:
+                mark, attr = MARK_WHITE, self._attr(PAIR_FEEDBACK_WHITE)
+            else:
+                mark, attr = MARK_GRAY, self._attr(PAIR_DIM, curses.A_DIM)
+            self._put(y, x + i * (spacing + 1), mark, attr)
+
+    def draw(self):
+        self.stdscr.erase()
+        if self.show_menu:
+            self.draw_menu()
+        else:
+            self.draw_game()
+        height, _ = self.stdscr.getmaxyx()
+        self._put(height - 2, 0, self.status, curses.A_BOLD)
+        self._put(height - 1, 0, MENU_HELP_TEXT if self.show_menu else HELP_TEXT,
+                  self._attr(PAIR_DIM, curses.A_DIM))
+        self.stdscr.refresh()
+
+    def draw_menu(self):
+        self._put(0, 0, "色块解谜", curses.A_BOLD)
+        self._put(1, 0, "根据反馈猜测色块的颜色和位置：● 颜色和位置都正确，○ 颜色正确但位置错误")
+        for row, (name, values, current, labels) in enumerate(self.menu_items()):
+            y = 3 + row * 2
+            self._put(y, 0, '>' if row == self.menu_row else ' ', curses.A_BOLD)
+            self._put(y, 2, f"{name}:")
+            x = 14
+            for value in values:
+                label = f" {labels[value]} "
+                attr = curses.A_REVERSE | curses.A_BOLD if value == current else curses.A_NORMAL
+                self._put(y, x, label, attr)
+                x += display_width(label) + 1
+        self._draw_stats(10)
+
+    def _draw_stats(self, y):
+        """显示当前配置的战绩 - 只在配置切换或有新数据写入时重新查询"""
+        if not self.stats_store:
+            return
+        cache_key = (self.stats_difficulty(), self.num_colors, self.stats_store.version)
+        if cache_key != self.stats_cache_key:
+            self.stats_cache_key = cache_key
+            try:
+                summary = self.stats_store.get_summary(self.stats_difficulty(), self.num_colors)
+            except sqlite3.Error as e:
+                self.stats_lines = [f"读取战绩失败: {e}"]
+            else:
+                self.stats_lines = [f"战绩: {summary['games']}局 | 胜率 {summary['win_rate']:.0%} | "
+                                    f"当前连胜 {summary['current_streak']} | 最佳连胜 {summary['best_streak']}"]
+                if summary['distribution']:
+                    distribution = "  ".join(f"{n}次: {count}" for n, count in summary['distribution'].items())
+                    self.stats_lines.append(f"猜测分布: {distribution}")
+        for i, line in enumerate(self.stats_lines):
+            self._put(y + i, 0, line)
+
+    def draw_game(self):
+        height, _ = self.stdscr.getmaxyx()
+        mode = f"{DIFFICULTY_NAMES[self.difficulty]} · {self.num_colors}色"
+        if self.boards:
+            mode += f" · {self.num_boards}个棋盘"
+        self._put(0, 0, f"谜题 #{self.puzzle_id}  {mode}  已猜 {len(self.guesses)}/{self.guess_limit}", curses.A_BOLD)
+
+        feedback_x = GUESS_X + self.code_length * CELL_WIDTH + 1
+        if self.boards:
+            for index in range(len(self.boards)):
+                self._put(1, feedback_x + index * (self.code_length + 1), str(index + 1),
+                          self._attr(PAIR_DIM, curses.A_DIM))
+
+        # 窗口放不下时只显示最近的猜测（当前猜测行和下方的颜色、结果各占几行）
+        playing = self._is_playing()
+        reserved = 7 if self.game_over else 6
+        slots = max(1, height - HISTORY_TOP - reserved - (1 if playing else 0))
+        first = max(0, len(self.guesses) - slots)
+        y = HISTORY_TOP
+        for i in range(first, len(self.guesses)):
+            self._draw_history_row(y, i, feedback_x)
+            y += 1
+
+        if playing:
+            self._put(y, 0, f"{len(self.guesses) + 1:>2}", curses.A_BOLD)
+            for j, color_idx in enumerate(self.current_guess):
+                self.draw_cell(y, GUESS_X + j * CELL_WIDTH, color_idx, selected=j == self.current_position)
+            y += 1
+            self._draw_palette(y + 1)
+        elif self.game_over:
+            self._draw_result(y + 1, feedback_x)
+
+    def _draw_history_row(self, y, i, feedback_x):
+        index_attr = self._attr(PAIR_DIM, curses.A_DIM) if i < self.prefilled_count else curses.A_NORMAL
+        self._put(y, 0, f"{i + 1:>2}", index_attr)
+        for j, color_idx in enumerate(self.guesses[i]):
+            self.draw_cell(y, GUESS_X + j * CELL_WIDTH, color_idx)
+        if not self.boards:
+            self.draw_feedback(y, feedback_x, self.feedbacks[i])
+            return
+        # 多棋盘模式：每个棋盘一列反馈，猜中之后的行留空
+        for index, board in enumerate(self.boards):
+            if i < len(board.outcomes):
+                self.draw_feedback(y, feedback_x + index * (self.code_length + 1),
+                                   self.outcome_feedback(board.outcomes[i]), spacing=0)
+
+    def _draw_palette(self, y):
+        """可选颜色，根据已有反馈不可能出现在当前位置的颜色变暗"""
+        self._put(y, 0, "颜色:")
+        domain = self._position_domain(self.current_position)
+        x = 6
+        for color_idx in range(self.num_colors):
+            possible = domain >> color_idx & 1
+            if possible:
+                self.draw_cell(y, x, color_idx)
+            else:
+                self._put(y, x, str(color_idx + 1).center(CELL_WIDTH - 1), self._attr(PAIR_DIM, curses.A_DIM))
+            self._put(y, x + CELL_WIDTH - 1, COLOR_NAMES[color_idx],
+                      curses.A_NORMAL if possible else self._attr(PAIR_DIM, curses.A_DIM))
+            x += CELL_WIDTH + 3
+
+    def _draw_result(self, y, feedback_x):
+        """游戏结束：显示密码和战绩"""
+        if self.boards:
+            # 每个棋盘的密码显示在它的反馈列下方
+            self._put(y, 0, "密码:")
+            for index, board in enumerate(self.boards):
+                x = feedback_x + index * (self.code_length + 1)
+                for j, color_idx in enumerate(board.secret_code):
+                    self.draw_cell(y, x + j, color_idx, width=1)
+        else:
+            self._put(y, 0, "密码:")
+            for j, color_idx in enumerate(self.secret_code):
+                self.draw_cell(y, GUESS_X + j * CELL_WIDTH, color_idx)
+        self._put(y + 1, 0, "回车或 R 键再来一局，Q 键返回菜单")
+        self._draw_stats(y + 3)
+
+    def run(self, stdscr):
+        self.stdscr = stdscr
+        curses.curs_set(0)
+        self.init_colors()
+        stdscr.keypad(True)
+        stdscr.timeout(REFRESH_INTERVAL)
+        while self.running:
+            self.draw()
+            key = stdscr.getch()
+            if key in (-1, curses.KEY_RESIZE):
+                continue
+            self.handle_key(key)
+            self.broadcast_state()
+
+
+def main(args):
+    # 让 curses 按当前语言环境输出中文和标记符号
+    locale.setlocale(locale.LC_ALL, '')
+    os.environ.setdefault('ESCDELAY', ESC_DELAY)
+
+    puzzle_id = args.puzzle
+    if args.daily is not None:
+        import datetime
+        date = datetime.date.fromisoformat(args.daily) if args.daily else None
+        puzzle_id = daily_puzzle_id(date)
+
+    game = TerminalGame(max_guesses=args.max_guesses, puzzle_id=puzzle_id, num_boards=args.boards)
+    if args.spectate is not None:
+        from spectate import start_spectator_server
+        start_spectator_server(game, args.spectate)
+    try:
+        curses.wrapper(game.run)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if game.broadcaster:
+            game.broadcaster.close()
+        if game.prefetcher:
+            game.prefetcher.close()
+        # 写完尚未落盘的战绩
+        if game.stats_store:
+            game.stats_store.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="色块解谜游戏（终端界面）")
+    parser.add_argument('--max-guesses', type=guess_count, default=MAX_GUESSES, help="每局最多猜测次数")
+    parser.add_argument('--boards', type=int, choices=range(1, MAX_BOARDS + 1), default=1, metavar='N',
+                        help="同时破解的棋盘数量（1-8），所有棋盘共用同一串猜测")
+    puzzle_group = parser.add_mutually_exclusive_group()
+    puzzle_group.add_argument('--puzzle', type=int, metavar='N',
+                              help="玩指定编号的谜题，同一编号和配置总是同一题")
+    puzzle_group.add_argument('--daily', nargs='?', const='', metavar='YYYY-MM-DD',
+                              help="玩每日谜题（默认今天），所有玩家同一天得到同一题")
+    parser.add_argument('--spectate', metavar='[HOST:]PORT', nargs='?', const='',
+                        help="开启旁观服务（默认 127.0.0.1:7654），其他人可以用 spectate.py 实时观看对局")
+    main(parser.parse_args())
@@ -0,0 +1,33 @@
+import pytest
+
+from opening_book import OpeningBook, decode_code
+from solver import Solver
+
+# 开局树较深的节点计算量大，测试只校验前两步（完整校验用 python opening_book.py --check）
+CHECK_DEPTH = 2
+
+BOOK = OpeningBook.load()
+
+
+def walk(node, history, depth):
+    """依次产出开局树中 (历史, 开局库给出的猜测)"""
+    guess = decode_code(node['g'])
+    yield history, guess
+    if depth <= 1:
+        return
+    for outcome, child in node.get('r', {}).items():
+        yield from walk(child, history + [(guess, int(outcome))], depth - 1)
+
+
+@pytest.mark.skipif(BOOK is None, reason='没有开局库文件')
+@pytest.mark.parametrize('key', sorted(BOOK.books) if BOOK else [])
+def test_book_matches_solver(key):
+    mode, num_colors, code_length = key.split('-')[:3]
+    # 不带开局库的求解器，每一步都实时搜索
+    solver = Solver(int(num_colors), int(code_length), mode, key.endswith('-r'),
+                    strategy=BOOK.strategy, workers=0)
+    booked = Solver(int(num_colors), int(code_length), mode, key.endswith('-r'),
+                    strategy=BOOK.strategy, workers=0, book=BOOK)
+    for history, guess in walk(BOOK.books[key], [], CHECK_DEPTH):
+        assert solver.next_guess(history) == guess, history
+        assert booked.next_guess(history) == guess, history
@@ -0,0 +1,25 @@
+import threading
+import time
+
+from solver import COUNTS, Solver
+
+# 取消后允许的最长返回时间（秒），包括已经开始的分片看到停止标志的时间
+CANCEL_GRACE = 2.0
+
+
+def test_cancel_stops_parallel_search():
+    # 8 色 6 位的首次猜测需要评估两万多个猜测，不取消时要运行几分钟
+    solver = Solver(8, 6, COUNTS, workers=2)
+    cancel = threading.Event()
+    timer = threading.Timer(0.5, cancel.set)
+    try:
+        timer.start()
+        start = time.monotonic()
+        guess = solver.next_guess([], cancel=cancel)
+        elapsed = time.monotonic() - start
+    finally:
+        timer.cancel()
+        solver.close()
+    assert cancel.is_set()
+    assert elapsed < 0.5 + CANCEL_GRACE
+    assert guess in solver.codes